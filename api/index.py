@@ -2,6 +2,7 @@
 Vercel serverless function entry point
 This file is used when deploying to Vercel
 """
+import os
 import sys
 from pathlib import Path
 
@@ -9,6 +10,18 @@ from pathlib import Path
 backend_path = Path(__file__).parent.parent / "backend"
 sys.path.insert(0, str(backend_path))
 
+# Serverless instances do not share memory, so an in-process roster cache
+# would miss invalidations made by other instances
+os.environ.setdefault("ROSTER_CACHE", "off")
+
+# A frozen or recycled function would leave a background purge half done;
+# deleted employees are purged by purge_deleted.py from a scheduled job instead
+os.environ.setdefault("PURGE_IN_BACKGROUND", "false")
+
+# Cold starts must not pay for a schema check; the schema is created once by
+# init_db.py or the Supabase migrations, and the engine is built on first use
+os.environ.setdefault("DB_AUTO_CREATE", "false")
+
 # Import the FastAPI app
 from main import app
 
@@ -0,0 +1,67 @@
+"""
+Minimal in-process ASGI client for benchmarks.
+
+Calls the app directly, without sockets or an HTTP client library, so the
+numbers measure the application rather than the transport.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+
+async def call(app, method: str, path: str, params=None, body=None, headers=None):
+    """Send one request to `app` and return (status, headers, body bytes)"""
+    raw_body = b""
+    request_headers = [(b"host", b"benchmark")]
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    if body is not None:
+        raw_body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        headers.setdefault("content-type", "application/json")
+        request_headers.append((b"content-length", str(len(raw_body)).encode()))
+    for name, value in headers.items():
+        request_headers.append((name.encode(), value.encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(),
+        "root_path": "",
+        "headers": request_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+
+    received = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": raw_body, "more_body": False}
+        # Like a real client, stay connected until the response is complete;
+        # streaming responses stop as soon as they see a disconnect.
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": None, "headers": [], "body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return response["status"], response["headers"], b"".join(response["body"])
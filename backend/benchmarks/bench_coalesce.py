@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compare single attendance marks with and without group commit.
+
+Each mode runs in its own process (ATTENDANCE_COALESCE is read at import
+time) on a freshly seeded SQLite file. A burst of clients marks attendance
+through POST /api/attendance at the same moment, each client marking a few
+employees one request at a time, which is what shift start looks like.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_coalesce
+    python -m benchmarks.bench_coalesce --employees 2000 --clients 500 --marks 4
+    DB_ASYNC=true python -m benchmarks.bench_coalesce
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_async import percentile
+
+BACKEND_DIR = Path(__file__).parent.parent
+DATA_DIR = BACKEND_DIR / "benchmarks" / ".data"
+MODES = {"per-request": "false", "coalesced": "true"}
+
+
+async def child_main(args) -> dict:
+    from benchmarks import datagen
+    from benchmarks.asgi import call
+
+    datagen.generate(args.employees, 1, log=lambda message: None)
+    from sqlalchemy import event, select
+    import database
+    import models
+
+    with database.SessionLocal() as db:
+        employee_ids = list(db.scalars(select(models.Employee.id).order_by(models.Employee.employee_id)))
+    from main import app
+
+    latencies, errors, commits = [], 0, 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    engine = database.get_async_engine().sync_engine if database.DB_ASYNC else database.get_engine()
+    event.listen(engine, "commit", count_commit)
+
+    async def client(n):
+        nonlocal errors
+        for m in range(args.marks):
+            employee_id = employee_ids[(n * args.marks + m) % len(employee_ids)]
+            started = time.perf_counter()
+            status, _, _ = await call(app, "POST", "/api/attendance", body={
+                "employee_id": employee_id, "attendance_date": "2026-01-05", "status": "Present",
+            })
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "transactions": commits,
+    }
+
+
+def run_mode(coalesce: str, args) -> dict:
+    # Not /tmp, which may be tmpfs, where fsync costs nothing
+    DATA_DIR.mkdir(exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmpdir:
+        env = dict(os.environ)
+        env.update({
+            "ATTENDANCE_COALESCE": coalesce,
+            "ATTENDANCE_COALESCE_WINDOW_MS": str(args.window_ms),
+            "DATABASE_URL": f"sqlite:///{tmpdir}/bench.db",
+        })
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_coalesce", "--child",
+             "--employees", str(args.employees), "--clients", str(args.clients), "--marks", str(args.marks)],
+            cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=300, help="Clients marking at the same moment")
+    parser.add_argument("--marks", type=int, default=3, help="Sequential marks per client")
+    parser.add_argument("--window-ms", type=float, default=5, help="ATTENDANCE_COALESCE_WINDOW_MS for the coalesced run")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child_main(args))))
+        return
+
+    results = {mode: run_mode(coalesce, args) for mode, coalesce in MODES.items()}
+    print(f"{'mode':<12} {'requests':>9} {'transactions':>13} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for mode, numbers in results.items():
+        print(
+            f"{mode:<12} {numbers['requests']:>9} {numbers['transactions']:>13} {numbers['rps']:>10.1f} "
+            f"{numbers['p50_ms']:>10.2f} {numbers['p99_ms']:>10.2f} {numbers['errors']:>7}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
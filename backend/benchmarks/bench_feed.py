@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Cost of open live-feed connections.
+
+Opens many GET /api/attendance/stream subscribers in-process, then reports
+the memory they hold, the CPU they use while idle, and how long one mark
+takes to reach all of them.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_feed
+    python -m benchmarks.bench_feed --subscribers 5000 --idle-seconds 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+ATTENDANCE_DATE = "2026-01-05"
+
+
+async def open_stream(app, date: str, on_chunk, disconnect: asyncio.Event):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/attendance/stream", "raw_path": b"/api/attendance/stream", "root_path": "",
+        "query_string": f"attendance_date={date}".encode(), "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            on_chunk(message["body"])
+
+    await app(scope, receive, send)
+
+
+async def run(args) -> dict:
+    from benchmarks import datagen
+    from benchmarks.asgi import call
+
+    datagen.generate(args.employees, 1, log=lambda message: None)
+    from sqlalchemy import select
+    import database
+    import models
+    from feed import attendance_feed
+    from main import app
+
+    with database.SessionLocal() as db:
+        employee_ids = list(db.scalars(select(models.Employee.id).limit(args.marks)))
+
+    received = []
+    marked_at = [0.0]
+    disconnect = asyncio.Event()
+
+    def on_chunk(body: bytes):
+        if b"event: attendance" in body:
+            received.append(time.perf_counter() - marked_at[0])
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tasks = [
+        asyncio.create_task(open_stream(app, ATTENDANCE_DATE, on_chunk, disconnect))
+        for _ in range(args.subscribers)
+    ]
+    while attendance_feed.subscriber_count() < args.subscribers:
+        await asyncio.sleep(0.01)
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    await asyncio.sleep(args.idle_seconds)
+    idle_cpu = (time.process_time() - cpu_started) / (time.perf_counter() - wall_started)
+
+    fan_out = []
+    for employee_id in employee_ids:
+        received.clear()
+        marked_at[0] = time.perf_counter()
+        await call(app, "POST", "/api/attendance", body={
+            "employee_id": employee_id, "attendance_date": ATTENDANCE_DATE, "status": "Present",
+        })
+        while len(received) < args.subscribers:
+            await asyncio.sleep(0.001)
+        fan_out.append(max(received))
+
+    disconnect.set()
+    await asyncio.gather(*tasks)
+    return {
+        "subscribers": args.subscribers,
+        "kib_per_subscriber": held / args.subscribers / 1024,
+        "idle_cpu_percent": idle_cpu * 100,
+        "fan_out_ms": statistics.median(fan_out) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    parser.add_argument("--marks", type=int, default=5, help="Marks whose delivery to every subscriber is timed")
+    parser.add_argument("--employees", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+        results = asyncio.run(run(args))
+    print(
+        f"{results['subscribers']} subscribers: {results['kib_per_subscriber']:.1f} KiB each, "
+        f"{results['idle_cpu_percent']:.2f}% CPU while idle, "
+        f"a mark reaches all of them in {results['fan_out_ms']:.1f} ms (median)"
+    )
+
+
+if __name__ == "__main__":
+    main()
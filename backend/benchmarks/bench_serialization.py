@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Compare the list endpoints' response pipelines on large responses.
+
+- response_model: ORM objects validated through the response schema with
+  from_attributes, dumped to Python and encoded with json.dumps, which is
+  what FastAPI does for a route that returns ORM objects
+- fast path: the schema's columns as row tuples encoded with pydantic-core
+  (serialization.py), as the endpoints do now
+
+Both pipelines run the same query on a freshly seeded SQLite file and must
+produce identical bytes; the benchmark fails otherwise.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --rows 50000 --rounds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+DATA_DIR = Path(__file__).parent / ".data"
+
+
+def response_model_body(adapter, content) -> bytes:
+    from fastapi.responses import JSONResponse
+
+    validated = adapter.validate_python(content, from_attributes=True)
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def pipelines(db, rows: int, day):
+    """(name, response_model pipeline, fast pipeline) for each list response shape"""
+    from pydantic import TypeAdapter
+    from serialization import dumps, field_names, row_dicts, schema_columns
+    import models
+    import schemas
+
+    employee_fields = field_names(schemas.EmployeeResponse)
+    attendance_fields = field_names(schemas.AttendanceResponse)
+    employee_page = TypeAdapter(schemas.EmployeePage)
+    attendance_page = TypeAdapter(schemas.AttendancePage)
+    roster = TypeAdapter(List[schemas.EmployeeWithAttendance])
+    employee_order = (models.Employee.created_at.desc(), models.Employee.id.desc())
+    attendance_order = (models.Attendance.attendance_date, models.Attendance.id)
+
+    def employees_orm():
+        items = db.query(models.Employee).order_by(*employee_order).limit(rows).all()
+        return response_model_body(employee_page, {"items": items, "next_cursor": None})
+
+    def employees_fast():
+        items = db.query(*schema_columns(models.Employee, schemas.EmployeeResponse)).order_by(*employee_order).limit(rows).all()
+        return dumps({"items": row_dicts(items, employee_fields), "next_cursor": None})
+
+    def attendance_orm():
+        items = db.query(models.Attendance).order_by(*attendance_order).limit(rows).all()
+        return response_model_body(attendance_page, {"items": items, "next_cursor": None})
+
+    def attendance_fast():
+        items = db.query(*schema_columns(models.Attendance, schemas.AttendanceResponse)).order_by(*attendance_order).limit(rows).all()
+        return dumps({"items": row_dicts(items, attendance_fields), "next_cursor": None})
+
+    def roster_orm():
+        employees = db.query(models.Employee).order_by(models.Employee.full_name).all()
+        attendance = {}
+        for record in db.query(models.Attendance).filter(models.Attendance.attendance_date == day):
+            attendance.setdefault(record.employee_id, []).append(record)
+        result = [
+            {**{field: getattr(emp, field) for field in employee_fields}, "attendance": attendance.get(emp.id, [])}
+            for emp in employees
+        ]
+        return response_model_body(roster, result)
+
+    def roster_fast():
+        employees = db.query(*schema_columns(models.Employee, schemas.EmployeeResponse)).order_by(models.Employee.full_name).all()
+        attendance = {}
+        records = db.query(*schema_columns(models.Attendance, schemas.AttendanceResponse)).filter(
+            models.Attendance.attendance_date == day
+        )
+        for record in row_dicts(records, attendance_fields):
+            attendance.setdefault(record["employee_id"], []).append(record)
+        result = row_dicts(employees, employee_fields)
+        for emp in result:
+            emp["attendance"] = attendance.get(emp["id"], [])
+        return dumps(result)
+
+    return [
+        ("employees page", employees_orm, employees_fast),
+        ("attendance page", attendance_orm, attendance_fast),
+        ("roster", roster_orm, roster_fast),
+    ]
+
+
+def best_of(fn, rounds: int) -> tuple[float, bytes]:
+    body = fn()
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Employees seeded, and rows per response")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed runs per pipeline; the fastest is reported")
+    args = parser.parse_args()
+
+    DATA_DIR.mkdir(exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmpdir:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/serialization.db"
+        from benchmarks import datagen
+        from database import SessionLocal, engine
+
+        # A week of weekdays: enough attendance rows for a full page
+        datagen.generate(args.rows, 7, log=lambda message: None)
+        day = datagen.workdays(7)[-1]
+        print(f"{'response':<18} {'bytes':>12} {'response_model ms':>18} {'fast path ms':>13} {'speedup':>8}")
+        with SessionLocal() as db:
+            for name, slow, fast in pipelines(db, args.rows, day):
+                slow_ms, slow_body = best_of(slow, args.rounds)
+                fast_ms, fast_body = best_of(fast, args.rounds)
+                if slow_body != fast_body:
+                    raise SystemExit(f"{name}: the fast path produced different bytes")
+                print(f"{name:<18} {len(fast_body):>12,} {slow_ms:>18.1f} {fast_ms:>13.1f} {slow_ms / fast_ms:>7.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
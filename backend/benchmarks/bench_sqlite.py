@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compare concurrent read/write throughput of the legacy and tuned SQLite profiles.
+
+Each profile runs in its own process (SQLITE_PROFILE is read at import time)
+on a freshly seeded SQLite file. Reader clients page through attendance and
+fetch employees while writer clients mark attendance, all at the same time
+for a fixed duration, which is what the morning attendance burst looks like.
+The requests are kept light so the database, not serialization, is what the
+clients wait on.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_sqlite
+    python -m benchmarks.bench_sqlite --employees 2000 --readers 24 --writers 8 --seconds 20
+    DB_ASYNC=true python -m benchmarks.bench_sqlite
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_async import percentile
+
+BACKEND_DIR = Path(__file__).parent.parent
+DATA_DIR = BACKEND_DIR / "benchmarks" / ".data"
+PROFILES = ["legacy", "tuned"]
+
+
+async def child_main(args) -> dict:
+    from benchmarks import datagen
+    from benchmarks.asgi import call
+
+    datagen.generate(args.employees, args.days, log=lambda message: None)
+    from database import SessionLocal
+    from sqlalchemy import select
+    import models
+
+    with SessionLocal() as db:
+        employee_ids = list(db.scalars(select(models.Employee.id)))
+    dates = [day.isoformat() for day in datagen.workdays(args.days)]
+    from main import app
+
+    stats = {kind: {"latencies": [], "errors": 0} for kind in ("read", "write")}
+    deadline = time.perf_counter() + args.seconds
+
+    def read_request(rng):
+        choice = rng.random()
+        if choice < 0.4:
+            return "GET", "/api/attendance", {"attendance_date": rng.choice(dates), "limit": 20}, None
+        if choice < 0.7:
+            return "GET", "/api/attendance", {"employee_id": rng.choice(employee_ids), "limit": 20}, None
+        return "GET", f"/api/employees/{rng.choice(employee_ids)}", None, None
+
+    def write_request(rng):
+        return "POST", "/api/attendance", None, {
+            "employee_id": rng.choice(employee_ids),
+            "attendance_date": rng.choice(dates),
+            "status": rng.choice(["Present", "Absent"]),
+        }
+
+    async def client(kind, make_request, seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            method, path, params, body = make_request(rng)
+            started = time.perf_counter()
+            status, _, _ = await call(app, method, path, params=params, body=body)
+            stats[kind]["latencies"].append(time.perf_counter() - started)
+            if status >= 400:
+                stats[kind]["errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client("read", read_request, i) for i in range(args.readers)),
+        *(client("write", write_request, 1000 + i) for i in range(args.writers)),
+    )
+    elapsed = time.perf_counter() - started
+
+    result = {}
+    for kind, data in stats.items():
+        latencies = data["latencies"] or [0.0]
+        result[kind] = {
+            "requests": len(data["latencies"]),
+            "errors": data["errors"],
+            "rps": len(data["latencies"]) / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return result
+
+
+def run_profile(profile: str, args) -> dict:
+    # Not /tmp, which may be tmpfs, where fsync costs nothing
+    DATA_DIR.mkdir(exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmpdir:
+        env = dict(os.environ)
+        env.update({
+            "SQLITE_PROFILE": profile,
+            "DATABASE_URL": f"sqlite:///{tmpdir}/bench.db",
+        })
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite", "--child",
+             "--employees", str(args.employees), "--days", str(args.days),
+             "--readers", str(args.readers), "--writers", str(args.writers),
+             "--seconds", str(args.seconds)],
+            cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60, help="Days of seeded attendance history")
+    parser.add_argument("--readers", type=int, default=24, help="Concurrent reading clients")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writing clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child_main(args))))
+        return
+
+    results = {profile: run_profile(profile, args) for profile in PROFILES}
+    print(f"{'profile':<8} {'kind':<6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for profile, result in results.items():
+        for kind, numbers in result.items():
+            print(
+                f"{profile:<8} {kind:<6} {numbers['rps']:>10.1f} {numbers['p50_ms']:>10.2f} "
+                f"{numbers['p99_ms']:>10.2f} {numbers['errors']:>7}"
+            )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Throughput of serve.py from 1 to N workers.
+
+Seeds a SQLite database (or uses DATABASE_URL), then for each worker count
+starts `python serve.py --workers N` on a local port and drives one
+endpoint over keep-alive HTTP connections from separate load-generating
+processes, reporting requests per second and median latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --connections 64 --seconds 10
+
+The load generators run on the same machine and compete with the workers
+for CPU; on a host with few cores the numbers understate the scaling.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from serve import cpu_count
+
+BACKEND = Path(__file__).resolve().parent.parent
+CONTENT_LENGTH = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+
+
+async def _connection(port: int, path: str, deadline: float, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: benchmark\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            await reader.readexactly(int(CONTENT_LENGTH.search(head).group(1)))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+def _generate_load(port: int, path: str, connections: int, seconds: float) -> list:
+    """One load-generating process: its connections' request latencies"""
+    async def run():
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(_connection(port, path, deadline, latencies) for _ in range(connections)))
+        return latencies
+    return asyncio.run(run())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port: int, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("serve.py exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                sock.sendall(b"GET /health HTTP/1.1\r\nHost: benchmark\r\n\r\n")
+                if sock.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("serve.py did not start")
+
+
+def measure(workers: int, args, env: dict) -> dict:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(port, server)
+        # Warm every worker's engine and caches
+        _generate_load(port, args.path, args.connections, 1)
+        per_process = max(1, args.connections // args.load_processes)
+        with multiprocessing.get_context("spawn").Pool(args.load_processes) as pool:
+            runs = pool.starmap(_generate_load, [(port, args.path, per_process, args.seconds)] * args.load_processes)
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = [latency for run in runs for latency in run]
+    return {
+        "workers": workers,
+        "requests_per_second": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, cpu_count()}))
+    parser.add_argument("--path", default="/api/employees?limit=100")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--load-processes", type=int, default=max(1, cpu_count() // 2))
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--employees", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmpdir}/bench.db")
+        from benchmarks import datagen
+        datagen.generate(args.employees, 30, log=lambda message: None)
+        env = {
+            **os.environ, "DB_AUTO_CREATE": "false", "ROSTER_CACHE_PATH": f"{tmpdir}/cache.db",
+            "FEED_PATH": f"{tmpdir}/feed.db", "IDEMPOTENCY_PATH": f"{tmpdir}/idempotency.db",
+        }
+
+        print(f"{cpu_count()} CPUs, GET {args.path}, {args.connections} connections")
+        baseline = None
+        for workers in args.workers:
+            result = measure(workers, args, env)
+            baseline = baseline or result["requests_per_second"]
+            print(
+                f"{workers:>3} workers: {result['requests_per_second']:8.0f} req/s "
+                f"({result['requests_per_second'] / baseline:.2f}x), p50 {result['p50_ms']:.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
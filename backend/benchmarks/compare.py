@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark suite result files and flag regressions.
+
+A scenario regresses when its p50 or p95 latency or its peak memory grows,
+or its throughput drops, by more than the threshold (and by more than a
+small absolute amount, so sub-millisecond noise is ignored), or when it
+starts returning errors. Exits with status 1 if anything regressed.
+
+Usage (from the backend directory):
+    python -m benchmarks.compare results/main.json results/branch.json
+    python -m benchmarks.compare results/main.json results/branch.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# (metric, higher is better, minimum absolute change worth flagging)
+METRICS = [
+    ("p50_ms", False, 0.5),
+    ("p95_ms", False, 1.0),
+    ("rps", True, 1.0),
+    ("peak_memory_kb", False, 64.0),
+]
+
+# Dataset and environment fields that must match for a fair comparison
+COMPARABLE_META = ["preset", "requests", "concurrency", "rounds", "dialect", "db_async", "roster_cache"]
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.20) -> list[dict]:
+    """One row per scenario present in both runs, with relative changes and regressions"""
+    for key in COMPARABLE_META:
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(
+                f"warning: {key} differs ({baseline['meta'].get(key)!r} vs {current['meta'].get(key)!r}); "
+                "results may not be comparable"
+            )
+    if baseline["meta"].get("dataset", {}).get("employees") != current["meta"].get("dataset", {}).get("employees"):
+        print("warning: the runs used datasets of different sizes")
+
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        row = {"scenario": result["scenario"], "changes": {}, "regressions": []}
+        for metric, higher_is_better, min_delta in METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            row["changes"][metric] = change
+            worse = -change if higher_is_better else change
+            if worse > threshold and abs(new - old) >= min_delta:
+                row["regressions"].append(metric)
+        if result["errors"] > before["errors"]:
+            row["regressions"].append("errors")
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows: list[dict]) -> bool:
+    """Print the comparison table; returns True when any scenario regressed"""
+    print(f"{'scenario':<32} " + " ".join(f"{metric:>15}" for metric, _, _ in METRICS) + "  status")
+    regressed = False
+    for row in rows:
+        cells = []
+        for metric, _, _ in METRICS:
+            change = row["changes"].get(metric)
+            cells.append(f"{change:>+15.1%}" if change is not None else f"{'-':>15}")
+        status = "REGRESSION (" + ", ".join(row["regressions"]) + ")" if row["regressions"] else "ok"
+        regressed = regressed or bool(row["regressions"])
+        print(f"{row['scenario']:<32} " + " ".join(cells) + f"  {status}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    rows = compare(
+        json.loads(Path(args.baseline).read_text()),
+        json.loads(Path(args.current).read_text()),
+        args.threshold,
+    )
+    if print_comparison(rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+Bitmap attendance storage (ATTENDANCE_STORAGE=bitmap).
+
+Instead of one attendance row per employee per day, attendance_bitmaps holds
+one row per employee per month with two masks: `marked_mask` has bit n set
+when day n + 1 was marked at all, and `present_mask` when it was marked
+Present. A year of history is 12 small rows per employee instead of ~250
+rows of UUIDs, strings and timestamps plus their index entries.
+
+The API contracts stay the same: reads expand masks back into attendance
+records, writes OR bits into the month's row, and summaries count bits.
+Records served from bitmaps have IDs derived from (employee, date), and
+their timestamps are those of the month row.
+"""
+import hashlib
+import os
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterator, NamedTuple, Optional
+
+from sqlalchemy import Date, case, delete, extract, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import Grouping
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from purge import not_deleted
+from rollups import month_end, month_expression, month_start, summary_rows
+import models
+
+# "rows" (default) keeps one attendance row per employee per day
+ATTENDANCE_STORAGE = os.getenv("ATTENDANCE_STORAGE", "rows").lower()
+ENABLED = ATTENDANCE_STORAGE == "bitmap"
+
+ID_NAMESPACE = uuid.UUID("5d0c5c8e-8f4b-4a5e-9d43-0f6b3c2a7e11")
+
+
+class AttendanceRecord(NamedTuple):
+    id: str
+    employee_id: str
+    attendance_date: date
+    status: str
+    created_at: object
+    updated_at: object
+
+
+class ExportRow(NamedTuple):
+    attendance_date: date
+    employee_id: str
+    full_name: str
+    department: str
+    status: str
+
+
+def day_bit(day: date) -> int:
+    return 1 << (day.day - 1)
+
+
+def range_mask(first: date, last: date) -> int:
+    """Mask of the days first..last, which must fall in the same month"""
+    return ((1 << (last.day - first.day + 1)) - 1) << (first.day - 1)
+
+
+def _bitwise(left, operator: str, right):
+    # Parenthesized explicitly: SQLite and Postgres rank these operators differently
+    return Grouping(left.op(operator)(right))
+
+
+def popcount(mask):
+    """SQL expression counting the set bits of a 31-bit integer, in plain arithmetic both dialects run"""
+    pairs = Grouping(mask - _bitwise(_bitwise(mask, ">>", 1), "&", 0x55555555))
+    nibbles = Grouping(_bitwise(pairs, "&", 0x33333333) + _bitwise(_bitwise(pairs, ">>", 2), "&", 0x33333333))
+    octets = _bitwise(Grouping(nibbles + _bitwise(nibbles, ">>", 4)), "&", 0x0F0F0F0F)
+    # The sum of the bytes, which is at most 31
+    return octets % 255
+
+
+def next_month(month: date) -> date:
+    return month_end(month) + timedelta(days=1)
+
+
+def attendance_id(employee_id: str, day: date) -> str:
+    """
+    Stable ID for a bitmap-stored record: str(uuid.uuid5(ID_NAMESPACE, ...)),
+    computed without building UUID objects since reads derive one per record.
+    """
+    digest = bytearray(hashlib.sha1(ID_NAMESPACE.bytes + f"{employee_id}/{day.isoformat()}".encode()).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50
+    digest[8] = (digest[8] & 0x3F) | 0x80
+    hexed = digest.hex()
+    return f"{hexed[:8]}-{hexed[8:12]}-{hexed[12:16]}-{hexed[16:20]}-{hexed[20:]}"
+
+
+def expand(bitmap, first: Optional[date] = None, last: Optional[date] = None) -> Iterator[AttendanceRecord]:
+    """Attendance records of one bitmap row, optionally only for days first..last"""
+    first_day = first.day if first else 1
+    last_day = last.day if last else month_end(bitmap.month).day
+    for day in range(first_day, last_day + 1):
+        bit = 1 << (day - 1)
+        if bitmap.marked_mask & bit:
+            attendance_date = bitmap.month.replace(day=day)
+            yield AttendanceRecord(
+                id=attendance_id(bitmap.employee_id, attendance_date),
+                employee_id=bitmap.employee_id,
+                attendance_date=attendance_date,
+                status="Present" if bitmap.present_mask & bit else "Absent",
+                created_at=bitmap.created_at,
+                updated_at=bitmap.updated_at,
+            )
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def write(db: Session, records: list) -> dict:
+    """
+    Set the status of (employee_id, attendance_date) records with one upsert
+    per chunk, without committing. Each record must be for a distinct
+    (employee, date). Returns {(employee_id, attendance_date): AttendanceRecord}.
+    """
+    masks = defaultdict(lambda: [0, 0])
+    for record in records:
+        bit = day_bit(record.attendance_date)
+        month_masks = masks[(record.employee_id, month_start(record.attendance_date))]
+        month_masks[0] |= bit
+        if record.status == "Present":
+            month_masks[1] |= bit
+    if not masks:
+        return {}
+
+    table = models.AttendanceBitmap.__table__
+    stmt = _dialect_insert(db)(table).values([
+        {"employee_id": employee_id, "month": month, "marked_mask": marked, "present_mask": present}
+        for (employee_id, month), (marked, present) in masks.items()
+    ])
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.month],
+        set_={
+            "marked_mask": _bitwise(table.c.marked_mask, "|", excluded.marked_mask),
+            # Clear the written days, then set the ones written as Present
+            "present_mask": _bitwise(
+                Grouping(_bitwise(table.c.present_mask, "|", excluded.marked_mask) - excluded.marked_mask),
+                "|",
+                excluded.present_mask,
+            ),
+            "updated_at": func.now(),
+        },
+    ).returning(*table.c)
+    bitmaps = {(row.employee_id, row.month): row for row in db.execute(stmt)}
+
+    written = {}
+    for record in records:
+        bitmap = bitmaps[(record.employee_id, month_start(record.attendance_date))]
+        written[(record.employee_id, record.attendance_date)] = next(
+            expand(bitmap, record.attendance_date, record.attendance_date)
+        )
+    return written
+
+
+def mark_all(db: Session, conditions: list, attendance_date: date, status: str) -> int:
+    """
+    Set status on attendance_date for every employee matching conditions with
+    one INSERT ... SELECT, without committing. Returns the number of
+    employee-months whose bitmap changed.
+    """
+    employee = models.Employee
+    bit = day_bit(attendance_date)
+    table = models.AttendanceBitmap.__table__
+    stmt = _dialect_insert(db)(table).from_select(
+        ["employee_id", "month", "marked_mask", "present_mask"],
+        select(
+            employee.id,
+            literal(month_start(attendance_date), Date),
+            literal(bit),
+            literal(bit if status == "Present" else 0),
+        ).where(*conditions),
+    )
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.month],
+        set_={
+            "marked_mask": _bitwise(table.c.marked_mask, "|", excluded.marked_mask),
+            "present_mask": _bitwise(
+                Grouping(_bitwise(table.c.present_mask, "|", excluded.marked_mask) - excluded.marked_mask),
+                "|",
+                excluded.present_mask,
+            ),
+            "updated_at": func.now(),
+        },
+        # Days already marked with this status are left alone, and not counted
+        where=or_(
+            _bitwise(table.c.marked_mask, "&", bit) == 0,
+            _bitwise(table.c.present_mask, "&", bit) != excluded.present_mask,
+        ),
+    )
+    return db.execute(stmt).rowcount
+
+
+def _filtered(stmt, employee_id: Optional[str], department: Optional[str]):
+    bitmap = models.AttendanceBitmap
+    stmt = stmt.where(not_deleted(bitmap.employee_id))
+    if employee_id:
+        stmt = stmt.where(bitmap.employee_id == employee_id)
+    if department:
+        stmt = stmt.join(models.Employee, models.Employee.id == bitmap.employee_id).where(
+            models.Employee.department == department
+        )
+    return stmt
+
+
+def page(
+    db: Session,
+    attendance_date: Optional[date] = None,
+    employee_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    department: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> tuple[list[AttendanceRecord], Optional[str]]:
+    """
+    One page of attendance records in date order, and by employee UUID
+    within a date. Each date is one LIMITed scan of
+    idx_attendance_bitmaps_month_employee with the day's bit tested in SQL;
+    months without bitmaps are skipped, and one employee's history is a
+    single query. The cursor holds the last (date, employee UUID).
+    """
+    first, last = start_date, end_date
+    if attendance_date:
+        first = max(first, attendance_date) if first else attendance_date
+        last = min(last, attendance_date) if last else attendance_date
+    after = None
+    if cursor:
+        value, after_employee = decode_cursor(cursor, "attendance_date")
+        try:
+            after = (date.fromisoformat(value), after_employee)
+        except (TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor")
+        first = max(first, after[0]) if first else after[0]
+    if first and last and first > last:
+        return [], None
+
+    bitmap = models.AttendanceBitmap
+    records = []
+    if employee_id:
+        # At most one bitmap per month: read them all in one query
+        query = _filtered(select(bitmap.__table__), employee_id, department).order_by(bitmap.month)
+        if first:
+            query = query.where(bitmap.month >= month_start(first))
+        if last:
+            query = query.where(bitmap.month <= month_start(last))
+        for row in db.execute(query):
+            row_first = max(first, row.month) if first else None
+            row_last = min(last, month_end(row.month)) if last else None
+            records.extend(
+                record for record in expand(row, row_first, row_last)
+                if not after or (record.attendance_date, record.employee_id) > after
+            )
+            if len(records) > limit:
+                break
+    else:
+        month = month_start(first) if first else None
+        while len(records) <= limit:
+            next_query = _filtered(select(func.min(bitmap.month)), None, department)
+            if month:
+                next_query = next_query.where(bitmap.month >= month)
+            if last:
+                next_query = next_query.where(bitmap.month <= month_start(last))
+            month = db.scalar(next_query)
+            if month is None:
+                break
+            month_first = max(first, month) if first else month
+            month_last = min(last, month_end(month)) if last else month_end(month)
+            for day_number in range(month_first.day, month_last.day + 1):
+                day = month.replace(day=day_number)
+                query = _filtered(select(bitmap.__table__), None, department).where(
+                    bitmap.month == month,
+                    _bitwise(bitmap.marked_mask, "&", day_bit(day)) != 0,
+                )
+                if after and day == after[0]:
+                    query = query.where(bitmap.employee_id > after[1])
+                rows = db.execute(query.order_by(bitmap.employee_id).limit(limit + 1 - len(records)))
+                records.extend(record for row in rows for record in expand(row, day, day))
+                if len(records) > limit:
+                    break
+            month = next_month(month)
+
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    return records, encode_cursor("attendance_date", records[-1].attendance_date, records[-1].employee_id)
+
+
+def records_on(db: Session, attendance_date: date) -> dict[str, list[AttendanceRecord]]:
+    """Attendance records on one date, keyed by employee UUID"""
+    bitmap = models.AttendanceBitmap
+    rows = db.execute(select(bitmap.__table__).where(
+        bitmap.month == month_start(attendance_date),
+        _bitwise(bitmap.marked_mask, "&", day_bit(attendance_date)) != 0,
+    ))
+    return {row.employee_id: list(expand(row, attendance_date, attendance_date)) for row in rows}
+
+
+def summarize(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    group_by: str = "employee",
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+) -> list[dict]:
+    """
+    Same result as rollups.summarize, counted in SQL from bitmaps: set bits
+    are counted with popcount(), after masking partial months to the period.
+    """
+    employee = models.Employee
+    bitmap = models.AttendanceBitmap
+    if group_by == "department":
+        keys = [employee.department]
+    else:
+        keys = [employee.id, employee.employee_id, employee.full_name, employee.department]
+
+    # Whole months are counted as they are; each partial month gets its own
+    # query with the period's days masked in
+    whole, partial = [], []
+    for month, first, last in months(start_date, end_date):
+        if first.day == 1 and last == month_end(month):
+            whole.append(month)
+        else:
+            partial.append((month, range_mask(first, last)))
+    selections = [(bitmap.month == month, mask) for month, mask in partial]
+    if whole:
+        selections.append((bitmap.month.between(whole[0], whole[-1]), None))
+
+    totals = {}
+    for where, mask in selections:
+        present_mask, marked_mask = bitmap.present_mask, bitmap.marked_mask
+        if mask is not None:
+            present_mask, marked_mask = _bitwise(present_mask, "&", mask), _bitwise(marked_mask, "&", mask)
+        query = (
+            select(*keys, func.sum(popcount(present_mask)), func.sum(popcount(marked_mask)))
+            .join(bitmap, bitmap.employee_id == employee.id)
+            .where(where, employee.deleted_at.is_(None))
+        )
+        if department:
+            query = query.where(employee.department == department)
+        if employee_id:
+            query = query.where(employee.id == employee_id)
+        for row in db.execute(query.group_by(*keys)):
+            key = tuple(row[:len(keys)])
+            present, absent = totals.get(key, (0, 0))
+            totals[key] = (present + (row[-2] or 0), absent + (row[-1] or 0) - (row[-2] or 0))
+    return summary_rows(keys, totals, group_by)
+
+
+def export_month(
+    db: Session,
+    month: date,
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+) -> list:
+    """The month's bitmaps with the employee's export columns, in employee_id order"""
+    employee = models.Employee
+    bitmap = models.AttendanceBitmap
+    query = (
+        select(employee.employee_id, employee.full_name, employee.department, bitmap.marked_mask, bitmap.present_mask)
+        .join(bitmap, bitmap.employee_id == employee.id)
+        .where(bitmap.month == month, employee.deleted_at.is_(None))
+        .order_by(employee.employee_id)
+    )
+    if department:
+        query = query.where(employee.department == department)
+    if employee_id:
+        query = query.where(employee.id == employee_id)
+    return db.execute(query).all()
+
+
+def export_rows(bitmaps: list, first: date, last: date) -> Iterator[ExportRow]:
+    """Expand one month of export_month() rows into export rows for days first..last, in date order"""
+    for day in range(first.day, last.day + 1):
+        bit = 1 << (day - 1)
+        attendance_date = first.replace(day=day)
+        for row in bitmaps:
+            if row.marked_mask & bit:
+                yield ExportRow(
+                    attendance_date,
+                    row.employee_id,
+                    row.full_name,
+                    row.department,
+                    "Present" if row.present_mask & bit else "Absent",
+                )
+
+
+def months(start_date: date, end_date: date) -> Iterator[tuple[date, date, date]]:
+    """(month, first day in range, last day in range) for each month of a period"""
+    month = month_start(start_date)
+    while month <= end_date:
+        yield month, max(start_date, month), min(end_date, month_end(month))
+        month = next_month(month)
+
+
+def _day_of_month(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return extract("day", column).cast(models.AttendanceBitmap.marked_mask.type)
+    return func.cast(func.strftime("%d", column), models.AttendanceBitmap.marked_mask.type)
+
+
+def rebuild_from_rows(db: Session) -> int:
+    """
+    Replace every bitmap with one computed from the attendance table, in a
+    single INSERT ... SELECT. Does not commit. Returns the number of bitmap rows.
+    """
+    attendance = models.Attendance
+    month = month_expression(db, attendance.attendance_date)
+    bit = _bitwise(literal(1), "<<", Grouping(_day_of_month(db, attendance.attendance_date) - 1))
+    # (employee_id, attendance_date) is unique, so summing distinct bits ORs them
+    source = select(
+        attendance.employee_id,
+        month.label("month"),
+        func.sum(bit),
+        func.sum(case((attendance.status == "Present", bit), else_=0)),
+    ).group_by(attendance.employee_id, month)
+
+    db.execute(delete(models.AttendanceBitmap))
+    result = db.execute(insert(models.AttendanceBitmap).from_select(
+        ["employee_id", "month", "marked_mask", "present_mask"], source
+    ))
+    return result.rowcount
+
+
+def rebuild_rows(db: Session) -> int:
+    """
+    Replace the attendance table with the records expanded from bitmaps, one
+    month at a time. Does not commit or touch the rollups. Returns the number
+    of attendance rows written.
+    """
+    bitmap = models.AttendanceBitmap
+    db.execute(delete(models.Attendance))
+    count = 0
+    for month in db.scalars(select(bitmap.month).distinct().order_by(bitmap.month)).all():
+        values = [
+            record._asdict()
+            for row in db.execute(select(bitmap.__table__).where(bitmap.month == month))
+            for record in expand(row)
+        ]
+        for start in range(0, len(values), 5000):
+            db.execute(insert(models.Attendance), values[start:start + 5000])
+        count += len(values)
+    return count
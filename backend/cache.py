@@ -0,0 +1,230 @@
+"""
+Bounded LRU caches for serialized API responses.
+
+Two interchangeable backends share one interface:
+- MemoryCache: in-process, for a single worker
+- SQLiteCache: a local SQLite file shared by every worker on the host
+
+Writers invalidate keys after they commit. Readers take a token before they
+query the database and pass it to set(); if the key was invalidated in the
+meantime the stale value is dropped instead of being cached.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._cleared_at = 0
+        # key -> counter value of its last invalidation, bounded like the entries
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._invalidated_floor = 0
+
+    def token(self) -> int:
+        with self._lock:
+            return self._counter
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, token: int) -> bool:
+        with self._lock:
+            if token < max(self._cleared_at, self._invalidated_floor, self._invalidated.get(key, 0)):
+                return False
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._counter += 1
+            self._entries.pop(key, None)
+            self._invalidated[key] = self._counter
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries * 4:
+                _, counter = self._invalidated.popitem(last=False)
+                self._invalidated_floor = max(self._invalidated_floor, counter)
+
+    def clear(self):
+        with self._lock:
+            self._counter += 1
+            self._entries.clear()
+            self._invalidated.clear()
+            self._cleared_at = self._counter
+
+
+class SQLiteCache:
+    """LRU cache stored in a local SQLite file, shared across worker processes"""
+
+    def __init__(self, path: str, max_entries: int = 64):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache_entries(last_used);
+                CREATE TABLE IF NOT EXISTS cache_invalidations (
+                    key TEXT PRIMARY KEY, counter INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    name TEXT PRIMARY KEY, value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO cache_meta
+                VALUES ('counter', 0), ('cleared_at', 0), ('invalidated_floor', 0);
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, conn, name: str) -> int:
+        return conn.execute("SELECT value FROM cache_meta WHERE name = ?", (name,)).fetchone()[0]
+
+    def token(self) -> int:
+        return self._meta(self._connect(), "counter")
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def set(self, key: str, value: bytes, token: int) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            invalidated = conn.execute(
+                "SELECT counter FROM cache_invalidations WHERE key = ?", (key,)
+            ).fetchone()
+            floor = max(self._meta(conn, "cleared_at"), self._meta(conn, "invalidated_floor"))
+            if token < max(floor, invalidated[0] if invalidated else 0):
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?)", (key, value, time.time())
+            )
+            conn.execute(
+                """
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM cache_entries ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, key: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE cache_meta SET value = value + 1 WHERE name = 'counter'")
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_invalidations "
+                "SELECT ?, value FROM cache_meta WHERE name = 'counter'",
+                (key,),
+            )
+            # Keep the invalidation log bounded; anything pruned raises the floor
+            conn.execute(
+                """
+                UPDATE cache_meta SET value = max(value, coalesce((
+                    SELECT max(counter) FROM (
+                        SELECT counter FROM cache_invalidations
+                        ORDER BY counter DESC LIMIT -1 OFFSET ?
+                    )
+                ), 0)) WHERE name = 'invalidated_floor'
+                """,
+                (self.max_entries * 4,),
+            )
+            conn.execute(
+                """
+                DELETE FROM cache_invalidations WHERE key IN (
+                    SELECT key FROM cache_invalidations ORDER BY counter DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries * 4,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE cache_meta SET value = value + 1 WHERE name = 'counter'")
+            conn.execute(
+                "UPDATE cache_meta SET value = (SELECT value FROM cache_meta WHERE name = 'counter') "
+                "WHERE name = 'cleared_at'"
+            )
+            conn.execute("DELETE FROM cache_entries")
+            conn.execute("DELETE FROM cache_invalidations")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def create_cache(backend: str, max_entries: int, path: str):
+    """Build a cache from configuration; returns None when caching is off"""
+    backend = backend.lower()
+    if backend in ("off", "none", "false", "0", ""):
+        return None
+    if backend == "memory":
+        return MemoryCache(max_entries)
+    if backend == "sqlite":
+        return SQLiteCache(path, max_entries)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+# Per-date cache of the serialized employees-with-attendance roster.
+# Use "memory" for a single worker and "sqlite" when several workers share a host.
+roster_cache = create_cache(
+    os.getenv("ROSTER_CACHE", "memory"),
+    int(os.getenv("ROSTER_CACHE_SIZE", "64")),
+    os.getenv("ROSTER_CACHE_PATH", "./hrms_cache.db"),
+)
+
+
+def invalidate_roster(*attendance_dates):
+    """Drop cached rosters for the given dates, or every date when none are given"""
+    if roster_cache is None:
+        return
+    if not attendance_dates:
+        roster_cache.clear()
+        return
+    for attendance_date in set(attendance_dates):
+        roster_cache.invalidate(attendance_date.isoformat())
@@ -0,0 +1,72 @@
+"""
+Group commit for small concurrent writes.
+
+A WriteCoalescer collects the items submitted within a short window (or
+until max_batch are waiting) and hands them to one write_batch(db, items)
+call in a session of its own, so a burst of N single writes costs one
+transaction and one commit instead of N. write_batch returns one outcome per
+item, either a result or an exception, and every submitter gets its own.
+
+Used for POST /api/attendance when ATTENDANCE_COALESCE is on.
+"""
+import asyncio
+import contextvars
+import os
+
+from database import run_in_session
+import metrics
+
+ATTENDANCE_COALESCE = os.getenv("ATTENDANCE_COALESCE", "false").lower() in ("1", "true", "yes")
+ATTENDANCE_COALESCE_WINDOW_MS = float(os.getenv("ATTENDANCE_COALESCE_WINDOW_MS", "5"))
+ATTENDANCE_COALESCE_MAX_BATCH = int(os.getenv("ATTENDANCE_COALESCE_MAX_BATCH", "200"))
+
+
+class WriteCoalescer:
+    def __init__(self, name: str, write_batch, window_ms: float, max_batch: int):
+        self.name = name
+        self.write_batch = write_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer = None
+        # Batches being written; referenced so they are not garbage collected mid-write
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        """Queue item for the next batch and wait for its own outcome"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # In a fresh context, so the batch's SQL statements are not counted
+        # against whichever request happened to fill or time out the batch
+        task = contextvars.Context().run(asyncio.ensure_future, self._write(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch: list):
+        metrics.WRITE_BATCH_SIZE.observe(len(batch), self.name)
+        try:
+            outcomes = await run_in_session(self.write_batch, [item for item, _ in batch])
+        except Exception as e:
+            outcomes = [e] * len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            if future.done():
+                # The caller gave up (client disconnected); the write still happened
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
@@ -0,0 +1,130 @@
+"""
+Response compression, negotiated from Accept-Encoding.
+
+Brotli when the client accepts it and the optional brotli package is
+installed, otherwise gzip. Bodies under COMPRESSION_MIN_BYTES are sent as
+they are, since compressing them costs more than it saves. Streamed
+responses (exports) are compressed chunk by chunk, flushing each chunk so
+the stream keeps flowing. Server-Sent Events are never compressed: the
+compressor's buffering would hold events back.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+GZIP_LEVEL = 6
+# Close to gzip's speed at its default level, with smaller output
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson")
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        compressed = self._compressor.process(data)
+        return compressed + (self._compressor.finish() if final else self._compressor.flush())
+
+
+COMPRESSORS = {"br": BrotliCompressor, "gzip": GzipCompressor} if brotli else {"gzip": GzipCompressor}
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The preferred encoding the client accepts, or None for the identity"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in COMPRESSORS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def _compressible(start: dict, headers: MutableHeaders) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        200 <= start["status"] < 300 and start["status"] != 204
+        and "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith("text/event-stream")
+    )
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware, so streamed responses are compressed as they stream"""
+
+    def __init__(self, app, min_bytes: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first chunk shows whether the body is worth compressing
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                await send({**message, "body": compressor.compress(body, not more_body)})
+                return
+
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if not _compressible(start, headers) or (not more_body and len(body) < self.min_bytes):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            compressor = COMPRESSORS[encoding]()
+            body = compressor.compress(body, not more_body)
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
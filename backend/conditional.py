@@ -0,0 +1,102 @@
+"""
+Conditional GET for the polling endpoints.
+
+The employee list and the attendance roster send an ETag and Last-Modified
+computed in the database rather than from the body: for each table the
+response reads, max(updated_at) and the count of the rows it covers. An
+insert or update stamps a later updated_at and a delete changes the count,
+so while both are unchanged the response is too. A request whose
+If-None-Match (or If-Modified-Since) still matches is answered 304 after
+one aggregate query per table, without loading a row or encoding a body.
+
+updated_at is stamped when the statement runs (on PostgreSQL, when the
+transaction starts), with second resolution on SQLite, so a write can land
+with a stamp no later than the current maximum. As with delta sync,
+validators are only sent once the newest row is SYNC_SETTLE_SECONDS old;
+a response that changed more recently goes out without them and the client
+simply fetches it again in full.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, status
+from fastapi.responses import Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from sync import settled_before, sortable
+
+
+class Validators:
+    """The ETag and Last-Modified of one response, or neither while it may still change"""
+
+    def __init__(self, etag: Optional[str] = None, last_modified: Optional[datetime] = None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def headers(self) -> dict:
+        if self.etag is None:
+            return {}
+        # Clients may keep the response but must revalidate it before every use
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """Whether the client's copy is current; If-None-Match takes precedence, as in RFC 9110"""
+        if self.etag is None:
+            return False
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds
+        return self.last_modified.replace(microsecond=0) <= since
+
+    def not_modified(self) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers)
+
+
+def _as_utc(value) -> datetime:
+    # SQLite returns the stored text, PostgreSQL an aware datetime
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def validators(request: Request, db: Session, *parts) -> Validators:
+    """
+    Validators for the response to request. Each part is an updated_at
+    column followed by the conditions selecting the rows the response reads
+    from that table.
+    """
+    upper = settled_before(db)
+    state = [request.url.path, request.url.query]
+    newest = None
+    for column, *conditions in parts:
+        timestamp = sortable(db, column)
+        latest, count = db.execute(
+            select(func.max(timestamp), func.count()).select_from(column.class_).where(*conditions)
+        ).one()
+        if latest is not None:
+            if latest >= upper:
+                return Validators()
+            latest = _as_utc(latest)
+            newest = latest if newest is None else max(newest, latest)
+        state += [latest and latest.isoformat(), count]
+    digest = hashlib.blake2b(repr(state).encode(), digest_size=12).hexdigest()
+    # Weak: the same data may be sent compressed or not (see compression.py)
+    return Validators(f'W/"{digest}"', newest)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Convert attendance between row storage and bitmap storage, and report the
+storage and query-time difference between the two.
+
+    python convert_attendance.py --to bitmap            # fill attendance_bitmaps from attendance
+    python convert_attendance.py --to bitmap --drop-rows
+    python convert_attendance.py --to rows              # rebuild attendance (and rollups) from bitmaps
+    python convert_attendance.py --report               # compare both, when both are populated
+
+Converting leaves the source in place unless --drop-rows (with --to bitmap)
+or --drop-bitmaps (with --to rows) is given, so switching ATTENDANCE_STORAGE
+back stays possible. The source is only dropped once both storages are
+checked to hold the same marks. Stop writes (or the API) while converting;
+attendance written in the meantime is not carried over. Records converted
+to bitmaps get new, derived IDs.
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import case, delete, func, select, text
+from sqlalchemy.exc import DBAPIError
+
+from database import Base, SessionLocal, engine
+import bitmaps
+import models
+import rollups
+
+ROW_TABLES = ["attendance", "attendance_monthly_rollups"]
+BITMAP_TABLES = ["attendance_bitmaps"]
+
+
+def convert_to_bitmaps():
+    print("Converting attendance rows to bitmaps...")
+    with SessionLocal() as db:
+        count = bitmaps.rebuild_from_rows(db)
+        db.commit()
+    print(f"Wrote {count} bitmap rows.")
+
+
+def convert_to_rows():
+    print("Converting attendance bitmaps to rows...")
+    with SessionLocal() as db:
+        count = bitmaps.rebuild_rows(db)
+        rollups.rebuild(db)
+        db.commit()
+    print(f"Wrote {count} attendance rows and rebuilt the rollups.")
+
+
+def drop_storage(storage: str):
+    """Delete every row of the given storage's tables"""
+    with SessionLocal() as db:
+        if storage == "rows":
+            db.execute(delete(models.Attendance))
+            db.execute(delete(models.AttendanceMonthlyRollup))
+        else:
+            db.execute(delete(models.AttendanceBitmap))
+        db.commit()
+    print(f"Deleted the {storage} storage (run VACUUM on SQLite to return the space to the OS).")
+
+
+def marks(db) -> dict[str, tuple[int, int]]:
+    """(marks, Present marks) held by each storage"""
+    attendance = models.Attendance
+    bitmap = models.AttendanceBitmap
+    rows = db.execute(select(
+        func.count(), func.sum(case((attendance.status == "Present", 1), else_=0)),
+    ).select_from(attendance)).one()
+    bits = db.execute(select(
+        func.sum(bitmaps.popcount(bitmap.marked_mask)), func.sum(bitmaps.popcount(bitmap.present_mask)),
+    )).one()
+    return {"rows": (rows[0], rows[1] or 0), "bitmap": (bits[0] or 0, bits[1] or 0)}
+
+
+def verify_conversion():
+    """Exit, before anything is dropped, unless both storages hold the same marks"""
+    with SessionLocal() as db:
+        counts = marks(db)
+    if counts["rows"] != counts["bitmap"]:
+        raise SystemExit(
+            f"Conversion check failed: rows hold {counts['rows'][0]} marks ({counts['rows'][1]} Present), "
+            f"bitmaps {counts['bitmap'][0]} ({counts['bitmap'][1]} Present). Nothing was dropped."
+        )
+    print(f"Checked: both storages hold {counts['rows'][0]} marks ({counts['rows'][1]} Present).")
+
+
+def table_bytes(db, table: str):
+    """On-disk size of a table and its indexes, or None when the database cannot tell"""
+    if db.get_bind().dialect.name == "postgresql":
+        return db.scalar(text("SELECT pg_total_relation_size(:table)"), {"table": table})
+    try:
+        return db.scalar(
+            text(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = :table)"
+            ),
+            {"table": table},
+        ) or 0
+    except DBAPIError:
+        # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        db.rollback()
+        return None
+
+
+def timed(fn, runs: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def report(runs: int = 5):
+    db = SessionLocal()
+    try:
+        attendance_rows = db.scalar(select(func.count()).select_from(models.Attendance))
+        bitmap_rows = db.scalar(select(func.count()).select_from(models.AttendanceBitmap))
+        print(f"attendance rows: {attendance_rows:,}   bitmap rows: {bitmap_rows:,}")
+
+        print(f"\n{'storage':<10} {'table':<30} {'bytes':>15}")
+        totals = {}
+        for storage, tables in (("rows", ROW_TABLES), ("bitmap", BITMAP_TABLES)):
+            sizes = [table_bytes(db, table) for table in tables]
+            for table, size in zip(tables, sizes):
+                print(f"{storage:<10} {table:<30} {f'{size:,}' if size is not None else 'n/a':>15}")
+            if None not in sizes:
+                totals[storage] = sum(sizes)
+        if totals.get("rows") and totals.get("bitmap"):
+            print(f"bitmap storage is {totals['bitmap'] / totals['rows']:.1%} of row storage")
+
+        if not attendance_rows or not bitmap_rows:
+            print("\nQuery times need both storages populated; run --to bitmap without --drop-rows first.")
+            return
+
+        first_day = db.scalar(select(func.min(models.Attendance.attendance_date)))
+        last_day = db.scalar(select(func.max(models.Attendance.attendance_date)))
+        employee_id = db.scalar(select(models.Attendance.employee_id).limit(1))
+        rows_history = (
+            select(models.Attendance)
+            .where(models.Attendance.employee_id == employee_id)
+            .order_by(models.Attendance.attendance_date, models.Attendance.id)
+            .limit(1000)
+        )
+        rows_range = (
+            select(models.Attendance)
+            .where(models.Attendance.attendance_date >= last_day.replace(day=1))
+            .order_by(models.Attendance.attendance_date, models.Attendance.id)
+            .limit(1000)
+        )
+        queries = [
+            (
+                "summary, whole period",
+                lambda: rollups.summarize(db, first_day, last_day),
+                lambda: bitmaps.summarize(db, first_day, last_day),
+            ),
+            (
+                "summary, mid-month to mid-month",
+                lambda: rollups.summarize(db, first_day.replace(day=15), last_day.replace(day=14)),
+                lambda: bitmaps.summarize(db, first_day.replace(day=15), last_day.replace(day=14)),
+            ),
+            (
+                "summary by department",
+                lambda: rollups.summarize(db, first_day, last_day, "department"),
+                lambda: bitmaps.summarize(db, first_day, last_day, "department"),
+            ),
+            (
+                "one date (roster)",
+                lambda: db.scalars(select(models.Attendance).where(models.Attendance.attendance_date == last_day)).all(),
+                lambda: bitmaps.records_on(db, last_day),
+            ),
+            (
+                "one employee, 1000 records",
+                lambda: db.scalars(rows_history).all(),
+                lambda: bitmaps.page(db, employee_id=employee_id, limit=1000),
+            ),
+            (
+                "last month, 1000 records",
+                lambda: db.scalars(rows_range).all(),
+                lambda: bitmaps.page(db, start_date=last_day.replace(day=1), limit=1000),
+            ),
+        ]
+        print(f"\n{'query':<34} {'rows ms':>10} {'bitmap ms':>10} {'speedup':>8}")
+        for name, rows_query, bitmap_query in queries:
+            rows_ms = timed(rows_query, runs)
+            bitmap_ms = timed(bitmap_query, runs)
+            print(f"{name:<34} {rows_ms:>10.2f} {bitmap_ms:>10.2f} {rows_ms / bitmap_ms:>7.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert attendance between row and bitmap storage")
+    parser.add_argument("--to", choices=["bitmap", "rows"], help="Storage to convert to")
+    parser.add_argument("--drop-rows", action="store_true", help="With --to bitmap: delete the attendance rows and rollups once converted")
+    parser.add_argument("--drop-bitmaps", action="store_true", help="With --to rows: delete the bitmaps once converted")
+    parser.add_argument("--report", action="store_true", help="Print storage sizes and query times for both storages")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per query in the report")
+    args = parser.parse_args()
+    if not (args.to or args.report):
+        parser.error("nothing to do; pass --to and/or --report")
+    # Dropping is only the last step of a conversion away from that storage
+    if args.drop_rows and args.to != "bitmap":
+        parser.error("--drop-rows needs --to bitmap")
+    if args.drop_bitmaps and args.to != "rows":
+        parser.error("--drop-bitmaps needs --to rows")
+
+    Base.metadata.create_all(bind=engine)
+    if args.to == "bitmap":
+        convert_to_bitmaps()
+    elif args.to == "rows":
+        convert_to_rows()
+    if args.report:
+        report(args.runs)
+    if args.drop_rows or args.drop_bitmaps:
+        verify_conversion()
+    if args.drop_rows:
+        drop_storage("rows")
+    if args.drop_bitmaps:
+        drop_storage("bitmap")
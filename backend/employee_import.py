@@ -0,0 +1,281 @@
+"""
+Streaming bulk employee import from CSV or NDJSON.
+
+ImportParser turns arbitrary text chunks into records as soon as they are
+complete, so an upload is never held in memory as a whole. EmployeeImporter
+validates and normalizes each record exactly like create_employee, rejects
+duplicates within the file and against the database with one lookup per
+column per batch, and inserts each batch with a single executemany.
+"""
+import codecs
+import csv
+import json
+import uuid
+from collections import deque
+from typing import Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from cache import invalidate_roster
+import models
+import schemas
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+
+FIELDS = ("employee_id", "full_name", "email", "department")
+
+
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+def format_from_filename(filename: str) -> Optional[str]:
+    suffix = filename.rsplit(".", 1)[-1].lower()
+    if suffix == "csv":
+        return "csv"
+    if suffix in ("ndjson", "jsonl"):
+        return "ndjson"
+    return None
+
+
+class _NeedMore(Exception):
+    """The buffered lines end inside a CSV record"""
+
+
+class _Lines:
+    """
+    Lines for csv.reader, buffered as the upload arrives. Running dry before
+    the upload ends raises _NeedMore, and rewind() puts back the lines of the
+    unfinished record so the reader starts it over once more have arrived.
+    """
+
+    def __init__(self):
+        self.buffer: deque[str] = deque()
+        self.taken: list[str] = []
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.buffer:
+            if self.closed:
+                raise StopIteration
+            raise _NeedMore
+        line = self.buffer.popleft()
+        self.taken.append(line)
+        return line
+
+    def rewind(self):
+        self.buffer.extendleft(reversed(self.taken))
+        self.taken = []
+
+
+class ImportParser:
+    """Incrementally parse CSV or NDJSON text into (row, record) pairs"""
+
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.fmt = fmt
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.partial_line = ""
+        # The csv module decides where records end (quoted fields may hold
+        # newlines); strict turns malformed quoting into an error for that record
+        self.lines = _Lines()
+        self.reader = csv.reader(self.lines, strict=True)
+        self.header: Optional[list[str]] = None
+        self.row = 0
+
+    def feed(self, chunk: bytes) -> list[tuple[int, object]]:
+        text = self.partial_line + self.decoder.decode(chunk)
+        lines = text.split("\n")
+        self.partial_line = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self) -> list[tuple[int, object]]:
+        text = self.partial_line + self.decoder.decode(b"", final=True)
+        self.partial_line = ""
+        return self._parse_lines([text] if text else [], final=True)
+
+    def _parse_lines(self, lines: list[str], final: bool = False) -> list[tuple[int, object]]:
+        if self.fmt == "csv":
+            self.lines.buffer.extend(line + "\n" for line in lines)
+            self.lines.closed = final
+            return self._csv_records()
+
+        records = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.row += 1
+            try:
+                records.append((self.row, json.loads(line)))
+            except ValueError as e:
+                records.append((self.row, ValueError(f"Invalid JSON: {e}")))
+        return records
+
+    def _csv_records(self) -> list[tuple[int, object]]:
+        records = []
+        while True:
+            try:
+                values = next(self.reader)
+            except _NeedMore:
+                self.lines.rewind()
+                return records
+            except StopIteration:
+                return records
+            except csv.Error as e:
+                # Only this record's lines are lost; the next record starts on the following line
+                self.lines.taken = []
+                self.row += 1
+                records.append((self.row, ValueError(f"Invalid CSV: {e}")))
+                continue
+            self.lines.taken = []
+            if not any(value.strip() for value in values):
+                continue
+            if self.header is None:
+                self.header = [name.strip() for name in values]
+                continue
+            self.row += 1
+            if len(values) != len(self.header):
+                records.append((self.row, ValueError(
+                    f"Expected {len(self.header)} columns, found {len(values)}"
+                )))
+            else:
+                records.append((self.row, dict(zip(self.header, values))))
+
+
+class EmployeeImporter:
+    """Validate, de-duplicate and insert employees in batches"""
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.batch: list[tuple[int, dict]] = []
+        self.seen_employee_ids: dict[str, int] = {}
+        self.seen_emails: dict[str, int] = {}
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[schemas.EmployeeImportError] = []
+
+    def _error(self, row: int, message: str, employee_id: Optional[str] = None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.EmployeeImportError(row=row, employee_id=employee_id, error=message))
+
+    def add(self, row: int, record) -> bool:
+        """Queue one parsed record; returns True when a batch is ready to flush"""
+        if isinstance(record, Exception):
+            self._error(row, str(record))
+            return False
+        if not isinstance(record, dict):
+            self._error(row, "Expected an object with employee_id, full_name, email and department")
+            return False
+
+        raw_id = record.get("employee_id")
+        try:
+            values = schemas.EmployeeCreate(**{field: record.get(field) for field in FIELDS}).normalized()
+        except ValidationError as e:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            self._error(row, problems, raw_id if isinstance(raw_id, str) else None)
+            return False
+
+        first_row = self.seen_employee_ids.get(values["employee_id"])
+        if first_row is not None:
+            self._error(row, f"Duplicate Employee ID in file (first seen in row {first_row})", values["employee_id"])
+            return False
+        first_row = self.seen_emails.get(values["email"])
+        if first_row is not None:
+            self._error(row, f"Duplicate email in file (first seen in row {first_row})", values["employee_id"])
+            return False
+        self.seen_employee_ids[values["employee_id"]] = row
+        self.seen_emails[values["email"]] = row
+
+        self.batch.append((row, values))
+        return len(self.batch) >= self.batch_size
+
+    def flush(self, db: Session):
+        """Insert the queued batch, skipping employees that already exist, and commit"""
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+
+        existing_ids = set(db.scalars(
+            select(models.Employee.employee_id).where(
+                models.Employee.employee_id.in_([values["employee_id"] for _, values in batch]),
+                models.Employee.deleted_at.is_(None),
+            )
+        ))
+        existing_emails = set(db.scalars(
+            select(models.Employee.email).where(
+                models.Employee.email.in_([values["email"] for _, values in batch]),
+                models.Employee.deleted_at.is_(None),
+            )
+        ))
+
+        rows = []
+        for row, values in batch:
+            if values["employee_id"] in existing_ids:
+                self._error(row, "An employee with this Employee ID already exists", values["employee_id"])
+            elif values["email"] in existing_emails:
+                self._error(row, "An employee with this email already exists", values["employee_id"])
+            else:
+                rows.append({"id": str(uuid.uuid4()), **values})
+
+        if not rows:
+            return
+        try:
+            db.execute(insert(models.Employee), rows)
+            db.commit()
+            self.inserted += len(rows)
+        except IntegrityError:
+            # A concurrent writer created one of these employees after the
+            # lookup; fall back to row-by-row inserts to isolate it.
+            db.rollback()
+            self._insert_individually(db, rows, {values["employee_id"]: row for row, values in batch})
+        except Exception:
+            db.rollback()
+            raise
+        invalidate_roster()
+
+    def _insert_individually(self, db: Session, rows: list[dict], row_numbers: dict[str, int]):
+        for values in rows:
+            try:
+                db.execute(insert(models.Employee), [values])
+                db.commit()
+                self.inserted += 1
+            except IntegrityError:
+                db.rollback()
+                self._error(
+                    row_numbers[values["employee_id"]],
+                    "An employee with this Employee ID or email already exists",
+                    values["employee_id"],
+                )
+
+    def report(self) -> schemas.EmployeeImportReport:
+        return schemas.EmployeeImportReport(
+            inserted=self.inserted,
+            failed=self.failed,
+            errors=sorted(self.errors, key=lambda error: error.row),
+            errors_truncated=self.failed > len(self.errors),
+        )
@@ -0,0 +1,190 @@
+"""
+Streaming attendance export.
+
+Rows are read from a server-side cursor (yield_per) and encoded in chunks,
+so memory stays constant no matter how long the requested date range is.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from sqlalchemy import select
+
+import bitmaps
+import database
+import models
+
+# Rows fetched per round-trip from the server-side cursor and encoded per chunk
+YIELD_PER = 1000
+
+EXPORT_COLUMNS = ["attendance_date", "employee_id", "full_name", "department", "status"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_statement(
+    start_date: date,
+    end_date: date,
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+):
+    """Attendance joined with the employee's user-facing ID and name, in date order"""
+    stmt = (
+        select(
+            models.Attendance.attendance_date,
+            models.Employee.employee_id,
+            models.Employee.full_name,
+            models.Employee.department,
+            models.Attendance.status,
+        )
+        .join(models.Employee, models.Employee.id == models.Attendance.employee_id)
+        .where(
+            models.Attendance.attendance_date >= start_date,
+            models.Attendance.attendance_date <= end_date,
+            models.Employee.deleted_at.is_(None),
+        )
+        .order_by(models.Attendance.attendance_date, models.Employee.employee_id)
+    )
+    if department:
+        stmt = stmt.where(models.Employee.department == department)
+    if employee_id:
+        stmt = stmt.where(models.Attendance.employee_id == employee_id)
+    return stmt
+
+
+class ChunkEncoder:
+    """Encode rows as NDJSON or CSV into bytes chunks"""
+
+    def __init__(self, fmt: str):
+        self.buffer = io.StringIO()
+        self.writer = None
+        if fmt == "csv":
+            self.writer = csv.writer(self.buffer)
+            self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, row):
+        if self.writer:
+            self.writer.writerow([row.attendance_date.isoformat(), *row[1:]])
+        else:
+            record = dict(zip(EXPORT_COLUMNS, row))
+            record["attendance_date"] = row.attendance_date.isoformat()
+            self.buffer.write(json.dumps(record, separators=(",", ":")))
+            self.buffer.write("\n")
+
+    def flush(self) -> bytes:
+        chunk = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return chunk
+
+
+def encode_chunks(rows: Iterable, fmt: str) -> Iterator[bytes]:
+    """Encode rows as NDJSON or CSV, yielding one bytes chunk per YIELD_PER rows"""
+    encoder = ChunkEncoder(fmt)
+    pending = 0
+    for row in rows:
+        encoder.write(row)
+        pending += 1
+        if pending >= YIELD_PER:
+            yield encoder.flush()
+            pending = 0
+
+    chunk = encoder.flush()
+    if chunk:
+        yield chunk
+
+
+def stream_export(stmt, fmt: str, session_factory=None):
+    """
+    Stream the export on whichever session mode the app is configured for.
+    session_factory (a replica's, say) defaults to the primary's.
+    """
+    if database.DB_ASYNC:
+        return astream_export(stmt, fmt, session_factory or database.get_async_sessionmaker())
+    return _stream_export(stmt, fmt, session_factory or database.get_sessionmaker())
+
+
+def _stream_export(stmt, fmt: str, session_factory) -> Iterator[bytes]:
+    """
+    Run `stmt` on a dedicated session and stream the encoded result.
+
+    The request's session is closed before a StreamingResponse starts
+    iterating, so the export owns its session for the lifetime of the stream.
+    """
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=YIELD_PER))
+        yield from encode_chunks(result, fmt)
+    finally:
+        db.close()
+
+
+async def astream_export(stmt, fmt: str, session_factory) -> AsyncIterator[bytes]:
+    """Async-mode counterpart of stream_export, reading through AsyncSession.stream"""
+    async with session_factory() as db:
+        result = await db.stream(stmt.execution_options(yield_per=YIELD_PER))
+        encoder = ChunkEncoder(fmt)
+        async for partition in result.partitions():
+            for row in partition:
+                encoder.write(row)
+            yield encoder.flush()
+        chunk = encoder.flush()
+        if chunk:
+            yield chunk
+
+
+def stream_bitmap_export(
+    start_date: date,
+    end_date: date,
+    department: Optional[str],
+    employee_id: Optional[str],
+    fmt: str,
+    session_factory=None,
+):
+    """The export for bitmap storage, read one month of bitmaps at a time"""
+    if database.DB_ASYNC:
+        return _astream_bitmap_export(
+            start_date, end_date, department, employee_id, fmt,
+            session_factory or database.get_async_sessionmaker(),
+        )
+    return _stream_bitmap_export(
+        start_date, end_date, department, employee_id, fmt,
+        session_factory or database.get_sessionmaker(),
+    )
+
+
+def _stream_bitmap_export(start_date, end_date, department, employee_id, fmt, session_factory) -> Iterator[bytes]:
+    db = session_factory()
+    try:
+        rows = (
+            row
+            for month, first, last in bitmaps.months(start_date, end_date)
+            for row in bitmaps.export_rows(bitmaps.export_month(db, month, department, employee_id), first, last)
+        )
+        yield from encode_chunks(rows, fmt)
+    finally:
+        db.close()
+
+
+async def _astream_bitmap_export(start_date, end_date, department, employee_id, fmt, session_factory) -> AsyncIterator[bytes]:
+    async with session_factory() as db:
+        encoder = ChunkEncoder(fmt)
+        pending = 0
+        for month, first, last in bitmaps.months(start_date, end_date):
+            month_bitmaps = await db.run_sync(
+                lambda session: bitmaps.export_month(session, month, department, employee_id)
+            )
+            for row in bitmaps.export_rows(month_bitmaps, first, last):
+                encoder.write(row)
+                pending += 1
+                if pending >= YIELD_PER:
+                    yield encoder.flush()
+                    pending = 0
+        chunk = encoder.flush()
+        if chunk:
+            yield chunk
@@ -0,0 +1,277 @@
+"""
+Live attendance feed over Server-Sent Events.
+
+GET /api/attendance/stream?attendance_date=... keeps a connection open and
+pushes the changes to that date's roster as writers commit them, so the
+attendance screen no longer re-fetches the whole roster to notice them:
+
+- ready: sent once on connect; load the roster now, changes after it arrive as events
+- attendance: {"records": [...]}, the stored marks, each replacing that employee's attendance
+- employee_added: {"employee": {...}}, a new employee with no attendance yet
+- employee_deleted: {"id": "..."}, drop the employee (and their attendance)
+- resync: too much changed (a bulk import, or this client fell behind); reload the roster
+
+One Broadcaster per process fans each event out to its subscribers. An
+event is encoded once and shared by every subscriber, and an idle
+subscriber is a coroutine waiting on an asyncio.Event, with a comment line
+every FEED_KEEPALIVE_SECONDS to keep proxies from closing the connection.
+
+With FEED_BACKEND=memory subscribers only hear about writes made in the same
+worker process. With FEED_BACKEND=sqlite every write is appended to a local
+SQLite file (SQLiteRelay) and each worker with subscribers reads it every
+FEED_POLL_SECONDS, so all workers on a host see every write.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from datetime import date
+from typing import Optional
+
+from serialization import dumps
+
+FEED_KEEPALIVE_SECONDS = float(os.getenv("FEED_KEEPALIVE_SECONDS", "15"))
+# Events buffered for a subscriber that is not reading; beyond this it gets a resync
+FEED_QUEUE_LIMIT = int(os.getenv("FEED_QUEUE_LIMIT", "256"))
+FEED_POLL_SECONDS = float(os.getenv("FEED_POLL_SECONDS", "0.2"))
+
+RETRY_MS = 3000
+KEEPALIVE = b": keepalive\n\n"
+# Events kept in the relay file; a worker that falls further behind resyncs its subscribers
+RELAY_KEEP_EVENTS = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def encode_event(event_id: int, event: str, data) -> bytes:
+    return encode_payload(event_id, event, dumps(data))
+
+
+def encode_payload(event_id: int, event: str, payload: bytes) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), payload)
+
+
+class SQLiteRelay:
+    """Events appended to a local SQLite file, read back by every worker process on the host"""
+
+    def __init__(self, path: str, poll_seconds: float):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS feed_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, event TEXT NOT NULL, payload BLOB NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, key: Optional[str], event: str, payload: bytes):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            event_id = conn.execute(
+                "INSERT INTO feed_events (key, event, payload) VALUES (?, ?, ?)", (key, event, payload)
+            ).lastrowid
+            conn.execute("DELETE FROM feed_events WHERE id <= ?", (event_id - RELAY_KEEP_EVENTS,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def last_id(self) -> int:
+        return self._connect().execute("SELECT coalesce(max(id), 0) FROM feed_events").fetchone()[0]
+
+    def read_after(self, last_id: int) -> tuple[list[tuple], bool]:
+        """Events appended after last_id, and whether some were pruned before they were read"""
+        rows = self._connect().execute(
+            "SELECT id, key, event, payload FROM feed_events WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        return rows, bool(rows) and rows[0][0] > last_id + 1
+
+
+class Subscription:
+    __slots__ = ("key", "messages", "ready", "overflowed")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.messages: deque[bytes] = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, message: bytes):
+        if len(self.messages) >= FEED_QUEUE_LIMIT:
+            self.messages.clear()
+            self.overflowed = True
+        else:
+            self.messages.append(message)
+        self.ready.set()
+
+
+class Broadcaster:
+    """
+    Subscribers by key, living on the event loop. publish() may be called
+    from any thread (sync route bodies run in the threadpool) and costs a
+    dict lookup while nobody is subscribed.
+    """
+
+    def __init__(self, relay: Optional[SQLiteRelay] = None):
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self.relay = relay
+        self._poller: Optional[asyncio.Future] = None
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribe(self, key: str) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(key)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        if self.relay is not None and self._poller is None:
+            # Start from the events appended so far; the client loads the roster after this
+            self._poller = asyncio.ensure_future(self._poll(self.relay.last_id()))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.key]
+
+    def publish(self, key: Optional[str], event: str, data):
+        """Send event to the subscribers of key, or of every key when key is None"""
+        if self.relay is not None:
+            # Every worker's poller delivers it, this one's included
+            try:
+                self.relay.append(key, event, dumps(data))
+            except sqlite3.Error:
+                # The write itself has committed; its subscribers miss one event
+                logger.exception("Appending to the feed relay failed")
+            return
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        message = encode_event(next(self._ids), event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(key, message)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, key, message)
+        except RuntimeError:
+            # The loop that served the subscribers is gone
+            pass
+
+    def _deliver(self, key: Optional[str], message: bytes):
+        if key is None:
+            targets = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+        else:
+            targets = list(self._subscribers.get(key, ()))
+        for subscription in targets:
+            subscription.push(message)
+
+    async def _poll(self, last_id: int):
+        """Deliver the events in the relay to this worker's subscribers, while it has any"""
+        try:
+            while self._subscribers:
+                await asyncio.sleep(self.relay.poll_seconds)
+                try:
+                    rows, missed = self.relay.read_after(last_id)
+                except sqlite3.Error:
+                    logger.exception("Reading the feed relay failed")
+                    continue
+                if missed:
+                    self._deliver(None, encode_event(next(self._ids), "resync", {}))
+                for event_id, key, event, payload in rows:
+                    self._deliver(key, encode_payload(next(self._ids), event, payload))
+                    last_id = event_id
+        finally:
+            self._poller = None
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+
+    async def stream(self, key: str):
+        """The SSE body for one subscriber; unsubscribes when the client disconnects"""
+        subscription = self.subscribe(key)
+        try:
+            yield b"retry: %d\n" % RETRY_MS + encode_event(next(self._ids), "ready", {"attendance_date": key})
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                subscription.ready.clear()
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield encode_event(next(self._ids), "resync", {})
+                chunk = b"".join(subscription.messages)
+                subscription.messages.clear()
+                if chunk:
+                    yield chunk
+        finally:
+            self.unsubscribe(subscription)
+
+
+def create_relay(backend: str, path: str) -> Optional[SQLiteRelay]:
+    """Build the cross-process relay from configuration; None keeps events in process"""
+    backend = backend.lower()
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SQLiteRelay(path, FEED_POLL_SECONDS)
+    raise ValueError(f"Unknown feed backend: {backend}")
+
+
+# Use "memory" for a single worker and "sqlite" when several workers share a host
+attendance_feed = Broadcaster(create_relay(
+    os.getenv("FEED_BACKEND", "memory"),
+    os.getenv("FEED_PATH", "./hrms_feed.db"),
+))
+
+
+def publish_attendance(records: list[dict]):
+    """Publish stored attendance records (as dicts), one event per date"""
+    by_date: dict[date, list[dict]] = {}
+    for record in records:
+        by_date.setdefault(record["attendance_date"], []).append(record)
+    for attendance_date, date_records in by_date.items():
+        attendance_feed.publish(attendance_date.isoformat(), "attendance", {"records": date_records})
+
+
+def publish_employee_added(employee: dict):
+    attendance_feed.publish(None, "employee_added", {"employee": {**employee, "attendance": []}})
+
+
+def publish_employee_deleted(employee_id: str):
+    attendance_feed.publish(None, "employee_deleted", {"id": employee_id})
+
+
+def publish_resync(attendance_date: Optional[date] = None):
+    """Tell subscribers to reload: those of one date, or all of them"""
+    attendance_feed.publish(attendance_date.isoformat() if attendance_date else None, "resync", {})
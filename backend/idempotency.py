@@ -0,0 +1,246 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a request (timeout, dropped connection) sends the same
+Idempotency-Key header again, and gets the first response back instead of
+the work being done twice:
+
+- same key and body, first request finished: its response is replayed with
+  an Idempotent-Replayed: true header (errors below 500 are replayed too)
+- same key while the first request is still running: 409 Conflict
+- same key with a different body: 422
+
+Server errors are not remembered, so retrying after one runs the request
+again. Keys are bounded in number and age, and kept by one of two
+interchangeable stores:
+- IdempotencyStore: in process memory, for a single worker
+- SQLiteIdempotencyStore: a local SQLite file shared by every worker on the
+  host, so a retry that reaches another worker is still replayed
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# A key claimed this long ago without an outcome belongs to a worker that died mid-request
+IDEMPOTENCY_PENDING_SECONDS = float(os.getenv("IDEMPOTENCY_PENDING_SECONDS", "300"))
+
+
+def _replay(
+    fingerprint: str, stored_fingerprint: str,
+    response: Optional[tuple[int, bytes]], error: Optional[HTTPException],
+) -> Response:
+    """The outcome of an earlier request with the same key, or the error a retry gets instead"""
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if error is not None:
+        raise error
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+    status_code, content = response
+    return Response(
+        content=content,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "response", "error")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.response: Optional[tuple[int, bytes]] = None
+        self.error: Optional[HTTPException] = None
+
+
+class IdempotencyStore:
+    """Responses by idempotency key; used from the event loop only, so no locking"""
+
+    def __init__(self, ttl_seconds: float, max_keys: int):
+        self.ttl = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
+
+    async def run(self, key: Optional[str], scope: str, body: bytes, handler) -> Response:
+        """
+        Return await handler() (a Response), or the stored outcome of an
+        earlier request with the same key. scope keeps keys of different
+        endpoints apart; body is the request payload the key is bound to.
+        """
+        if key is None:
+            return await handler()
+        now = time.monotonic()
+        self._expire(now)
+        key = f"{scope} {key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            return _replay(fingerprint, entry.fingerprint, entry.response, entry.error)
+
+        entry = _Entry(fingerprint, now + self.ttl)
+        self._entries[key] = entry
+        try:
+            response = await handler()
+        except HTTPException as e:
+            if e.status_code < 500:
+                entry.error = e
+            else:
+                self._entries.pop(key, None)
+            raise
+        except BaseException:
+            self._entries.pop(key, None)
+            raise
+        entry.response = (response.status_code, bytes(response.body))
+        return response
+
+
+class SQLiteIdempotencyStore:
+    """Responses by idempotency key in a local SQLite file, shared across worker processes"""
+
+    def __init__(self, path: str, ttl_seconds: float, max_keys: int, pending_seconds: float):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_keys = max_keys
+        self.pending = pending_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL,
+                    started_at REAL NOT NULL, expires_at REAL NOT NULL,
+                    status_code INTEGER, body BLOB, error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_idempotency_expires_at ON idempotency_keys(expires_at);
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self, key: str, fingerprint: str) -> Optional[tuple]:
+        """Claim key for this request; returns the stored row instead when it is taken"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE expires_at <= ? "
+                "OR (status_code IS NULL AND error IS NULL AND started_at <= ?)",
+                (now, now - self.pending),
+            )
+            row = conn.execute(
+                "SELECT fingerprint, status_code, body, error FROM idempotency_keys WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO idempotency_keys (key, fingerprint, started_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, now, now + self.ttl),
+                )
+                conn.execute(
+                    """
+                    DELETE FROM idempotency_keys WHERE key IN (
+                        SELECT key FROM idempotency_keys ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_keys,),
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish(self, key: str, status_code: int, body: bytes):
+        self._connect().execute(
+            "UPDATE idempotency_keys SET status_code = ?, body = ? WHERE key = ?", (status_code, body, key)
+        )
+
+    def _fail(self, key: str, error: HTTPException):
+        stored = json.dumps({"status_code": error.status_code, "detail": error.detail, "headers": error.headers})
+        self._connect().execute("UPDATE idempotency_keys SET error = ? WHERE key = ?", (stored, key))
+
+    def _release(self, key: str):
+        self._connect().execute("DELETE FROM idempotency_keys WHERE key = ?", (key,))
+
+    async def run(self, key: Optional[str], scope: str, body: bytes, handler) -> Response:
+        """Same contract as IdempotencyStore.run"""
+        if key is None:
+            return await handler()
+        key = f"{scope} {key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        # Another worker may hold the write lock; wait for it off the event loop
+        row = await run_in_threadpool(self._claim, key, fingerprint)
+        if row is not None:
+            stored_fingerprint, status_code, content, error = row
+            return _replay(
+                fingerprint, stored_fingerprint,
+                (status_code, content) if status_code is not None else None,
+                HTTPException(**json.loads(error)) if error is not None else None,
+            )
+
+        try:
+            response = await handler()
+        except HTTPException as e:
+            if e.status_code < 500:
+                await run_in_threadpool(self._fail, key, e)
+            else:
+                await run_in_threadpool(self._release, key)
+            raise
+        except BaseException:
+            # Possibly a cancellation, so no awaiting here
+            self._release(key)
+            raise
+        await run_in_threadpool(self._finish, key, response.status_code, bytes(response.body))
+        return response
+
+
+def create_store(backend: str, path: str):
+    """Build an idempotency store from configuration"""
+    backend = backend.lower()
+    if backend == "memory":
+        return IdempotencyStore(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS)
+    if backend == "sqlite":
+        return SQLiteIdempotencyStore(path, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_PENDING_SECONDS)
+    raise ValueError(f"Unknown idempotency store: {backend}")
+
+
+# Use "memory" for a single worker and "sqlite" when several workers share a host
+idempotency_store = create_store(
+    os.getenv("IDEMPOTENCY_STORE", "memory"),
+    os.getenv("IDEMPOTENCY_PATH", "./hrms_idempotency.db"),
+)
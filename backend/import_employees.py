@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Import employees from a CSV or NDJSON file.
+CSV files need a header row with employee_id, full_name, email and department;
+NDJSON files hold one JSON object with those keys per line.
+
+    python import_employees.py employees.csv
+    python import_employees.py employees.ndjson --batch-size 5000
+"""
+import argparse
+import sys
+
+from database import SessionLocal
+from employee_import import DEFAULT_BATCH_SIZE, EmployeeImporter, ImportParser, format_from_filename
+
+READ_SIZE = 1024 * 1024
+
+
+def import_file(path: str, fmt: str, batch_size: int):
+    """Stream the file through the importer and return its report"""
+    parser = ImportParser(fmt)
+    importer = EmployeeImporter(batch_size)
+    db = SessionLocal()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(READ_SIZE):
+                for row, record in parser.feed(chunk):
+                    if importer.add(row, record):
+                        importer.flush(db)
+        for row, record in parser.close():
+            importer.add(row, record)
+        importer.flush(db)
+    finally:
+        db.close()
+    return importer.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import employees from CSV or NDJSON")
+    parser.add_argument("path", help="File to import")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or format_from_filename(args.path)
+    if fmt is None:
+        sys.exit("Cannot tell the format from the file name; pass --format csv or --format ndjson")
+
+    report = import_file(args.path, fmt, args.batch_size)
+    print(f"Inserted {report.inserted} employees, {report.failed} rows failed.")
+    for error in report.errors:
+        print(f"  row {error.row}: {error.error}")
+    if report.errors_truncated:
+        print(f"  ... and {report.failed - len(report.errors)} more")
@@ -1,17 +1,62 @@
 #!/usr/bin/env python3
 """
 Initialize the database by creating all tables.
-Run this script once to set up the database schema.
+Run this script once to set up the database schema, and again after
+upgrading to add any columns and indexes introduced since the tables were
+created.
 """
+from sqlalchemy import inspect, text
 from database import engine, Base
 import models
 
+# Indexes superseded by newer ones; dropped when present
+OBSOLETE_INDEXES = [
+    "ix_attendance_attendance_date",  # covered by idx_attendance_date_employee
+    "idx_attendance_date",            # same, as named by the Supabase migration
+    "ix_employees_employee_id",       # unique over deleted employees too; see uq_employees_employee_id_live
+    "ix_employees_email",             # same; see uq_employees_email_live
+]
+
+# Postgres constraints superseded by newer indexes; dropped when present
+OBSOLETE_CONSTRAINTS = [
+    ("employees", "employees_employee_id_key"),  # inline UNIQUE of the Supabase migration
+    ("employees", "employees_email_key"),
+]
+
+
+def ensure_columns():
+    """Add columns introduced since the tables were created (all of them nullable)"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def ensure_indexes():
+    """Create indexes missing from existing tables and drop superseded ones"""
+    # New indexes may be on new columns
+    ensure_columns()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if conn.dialect.name == "postgresql":
+            for table, name in OBSOLETE_CONSTRAINTS:
+                conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}"))
+
+
 def init_database():
     """Create all database tables"""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    ensure_indexes()
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
     init_database()
-
@@ -1,23 +1,42 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routers import employees, attendance
+from fastapi.responses import PlainTextResponse
+from routers import employees, attendance, sync
+import compression
+import database
+import feed
+import metrics
+import partitions
+import replicas
+
+# Tables are created by init_db.py, or on first database use when
+# DB_AUTO_CREATE is on (see database.py); importing the app never connects.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Upcoming attendance partitions, when attendance is partitioned (see partitions.py)
+    partitions.maintain_in_background()
+    yield
+    await partitions.maintainer.stop()
+    await feed.attendance_feed.stop()
+    # Close pooled connections cleanly on graceful shutdown (see serve.py)
+    await database.dispose_engines()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="HRMS Lite API",
     description="Human Resource Management System API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Rendering JSON bodies counts toward each route's serialization time (see metrics.py)
+    default_response_class=metrics.TimedJSONResponse,
 )
+metrics.instrument_serialization()
 
 # Configure CORS
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
 # Get allowed origins from environment or use defaults
 allowed_origins = os.getenv(
     "ALLOWED_ORIGINS",
@@ -30,11 +49,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by clients that echo it instead of keeping the read-your-writes cookie
+    expose_headers=[replicas.RECENT_WRITE_HEADER],
 )
 
+# Reads go to the primary for a few seconds after a client's own write
+if replicas.REPLICA_URLS:
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+
+# gzip/brotli for large bodies; never for the live feed (see compression.py)
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Outermost, so CORS and every route are included in request timings
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(employees.router, prefix="/api", tags=["employees"])
 app.include_router(attendance.router, prefix="/api", tags=["attendance"])
+app.include_router(sync.router, prefix="/api", tags=["sync"])
 
 
 @app.get("/")
@@ -46,3 +79,7 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,351 @@
+"""
+Request and database instrumentation exposed in Prometheus text format.
+
+MetricsMiddleware times every request and attributes to it the SQL
+statements executed on its behalf, counted by cursor event hooks on the
+engines, and the time spent turning its result into the JSON body (FastAPI's
+response_model validation and encoding, or serialization.json_response).
+Connection pool checkout waits are timed by the pool classes below and pool
+occupancy is read when /metrics is scraped.
+
+Set SLOW_REQUEST_MS to log requests slower than that, together with the SQL
+statements they executed.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import fastapi.routing
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger("hrms.slow_requests")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 50
+MAX_STATEMENT_LENGTH = 500
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._values.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter(
+    "hrms_http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "hrms_http_request_duration_seconds", "Time to serve a request, including the response body",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "hrms_http_request_db_seconds", "Time a request spent executing SQL statements",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+REQUEST_SERIALIZATION_SECONDS = Histogram(
+    "hrms_http_request_serialization_seconds", "Time a request spent validating and encoding its JSON response",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+REQUEST_QUERIES = Histogram(
+    "hrms_http_request_queries", "SQL statements executed per request",
+    COUNT_BUCKETS, ("method", "route"),
+)
+QUERY_SECONDS = Histogram(
+    "hrms_db_query_duration_seconds", "Execution time of individual SQL statements",
+    QUERY_BUCKETS, ("engine",),
+)
+POOL_WAIT_SECONDS = Histogram(
+    "hrms_db_pool_checkout_wait_seconds", "Time spent waiting for a connection from the pool",
+    WAIT_BUCKETS, ("engine",),
+)
+WRITE_BATCH_SIZE = Histogram(
+    "hrms_coalesced_write_batch_size", "Writes committed together by a group-commit coalescer",
+    COUNT_BUCKETS, ("writer",),
+)
+
+# name -> Engine, for pool occupancy at scrape time
+_engines: dict = {}
+
+
+class RequestStats:
+    """SQL activity attributed to the request being served"""
+
+    __slots__ = ("queries", "db_seconds", "serialization_seconds", "statements", "statements_dropped")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.statements: list[tuple[float, str]] = []
+        self.statements_dropped = 0
+
+
+# The threadpool and AsyncSession.run_sync both run with a copy of the
+# request's context, so the hooks below see the same RequestStats object.
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "hrms_current_request", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("hrms_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["hrms_query_started"].pop()
+    QUERY_SECONDS.observe(elapsed, conn.engine.hrms_metrics_name)
+    stats = _current_request.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += elapsed
+    if SLOW_REQUEST_MS:
+        if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((elapsed, statement[:MAX_STATEMENT_LENGTH]))
+        else:
+            stats.statements_dropped += 1
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement
+    started = exception_context.connection.info.get("hrms_query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine, name: str):
+    """Attach the SQL hooks to a sync Engine (use AsyncEngine.sync_engine for async engines)"""
+    engine.hrms_metrics_name = name
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "engine_disposed", _label_pool)
+    _engines[name] = engine
+    _label_pool(engine)
+
+
+def _label_pool(engine):
+    # dispose() replaces the pool, so the label is reapplied to the new one
+    engine.pool.hrms_metrics_name = engine.hrms_metrics_name
+
+
+def add_serialization_time(seconds: float):
+    """Attribute time spent encoding a response to the request being served"""
+    stats = _current_request.get()
+    if stats is not None:
+        stats.serialization_seconds += seconds
+
+
+class TimedJSONResponse(JSONResponse):
+    """The app's default response class; rendering the body counts as serialization"""
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            add_serialization_time(time.perf_counter() - started)
+
+
+def instrument_serialization():
+    """Time FastAPI's response_model validation and jsonable_encoder pass, which
+    get_request_handler calls as the module-level serialize_response"""
+    original = fastapi.routing.serialize_response
+    if getattr(original, "hrms_timed", False):
+        return
+
+    async def serialize_response(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            add_serialization_time(time.perf_counter() - started)
+
+    serialize_response.hrms_timed = True
+    fastapi.routing.serialize_response = serialize_response
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started, getattr(self, "hrms_metrics_name", ""))
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_lines() -> list[str]:
+    gauges = {
+        "hrms_db_pool_size": ("Configured number of pooled connections", []),
+        "hrms_db_pool_checked_out": ("Connections currently checked out of the pool", []),
+        "hrms_db_pool_idle": ("Connections idle in the pool", []),
+        "hrms_db_pool_overflow": ("Connections open beyond the pool size", []),
+    }
+    for name, engine in sorted(_engines.items()):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = _format_labels(("engine",), (name,))
+        gauges["hrms_db_pool_size"][1].append(f"hrms_db_pool_size{labels} {pool.size()}")
+        gauges["hrms_db_pool_checked_out"][1].append(f"hrms_db_pool_checked_out{labels} {pool.checkedout()}")
+        gauges["hrms_db_pool_idle"][1].append(f"hrms_db_pool_idle{labels} {pool.checkedin()}")
+        gauges["hrms_db_pool_overflow"][1].append(f"hrms_db_pool_overflow{labels} {max(pool.overflow(), 0)}")
+    lines = []
+    for metric, (documentation, samples) in gauges.items():
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} gauge", *samples]
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in (
+        REQUESTS, REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_SERIALIZATION_SECONDS, REQUEST_QUERIES,
+        QUERY_SECONDS, POOL_WAIT_SECONDS, WRITE_BATCH_SIZE,
+    ):
+        lines += metric.render()
+    lines += _pool_lines()
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed until their last chunk"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            # Label by route template, not the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.inc(method, route, status)
+            REQUEST_SECONDS.observe(elapsed, method, route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method, route)
+            REQUEST_SERIALIZATION_SECONDS.observe(stats.serialization_seconds, method, route)
+            REQUEST_QUERIES.observe(stats.queries, method, route)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status, elapsed, stats)
+
+
+def _log_slow_request(scope, status: int, elapsed: float, stats: RequestStats):
+    path = scope["path"]
+    if scope.get("query_string"):
+        path += "?" + scope["query_string"].decode("latin-1")
+    lines = [
+        f"Slow request: {scope['method']} {path} -> {status} in {elapsed * 1000:.1f} ms "
+        f"({stats.queries} queries, {stats.db_seconds * 1000:.1f} ms in the database, "
+        f"{stats.serialization_seconds * 1000:.1f} ms serializing)"
+    ]
+    for seconds, statement in stats.statements:
+        lines.append(f"  [{seconds * 1000:.2f} ms] {' '.join(statement.split())}")
+    if stats.statements_dropped:
+        lines.append(f"  ... {stats.statements_dropped} more statements")
+    logger.warning("\n".join(lines))
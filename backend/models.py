@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Date, ForeignKey, CheckConstraint, UniqueConstraint
-from sqlalchemy.sql import func
+from sqlalchemy import event, Column, String, Date, Integer, ForeignKey, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy.sql import func, text
 from sqlalchemy.types import DateTime
 from database import Base
 import uuid
@@ -9,12 +9,34 @@ class Employee(Base):
     __tablename__ = "employees"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    employee_id = Column(String, unique=True, nullable=False, index=True)
+    employee_id = Column(String, nullable=False)
     full_name = Column(String, nullable=False)
-    email = Column(String, unique=True, nullable=False, index=True)
+    email = Column(String, nullable=False)
     department = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Set by a deletion; the row is removed once purge.py has cleared its attendance
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Delta sync (sync.py) reads changes in (updated_at, id) order
+        Index("idx_employees_updated_at", "updated_at", "id"),
+        # Only the few employees awaiting their purge are indexed
+        Index(
+            "idx_employees_deleted_at", "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"), sqlite_where=text("deleted_at IS NOT NULL"),
+        ),
+        # Unique among live employees only, so a deleted employee's Employee ID
+        # and email can be reused before the purge removes their row
+        Index(
+            "uq_employees_employee_id_live", "employee_id", unique=True,
+            postgresql_where=text("deleted_at IS NULL"), sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "uq_employees_email_live", "email", unique=True,
+            postgresql_where=text("deleted_at IS NULL"), sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
 
 
 class Attendance(Base):
@@ -22,7 +44,7 @@ class Attendance(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     employee_id = Column(String, ForeignKey("employees.id", ondelete="CASCADE"), nullable=False, index=True)
-    attendance_date = Column(Date, nullable=False, index=True)
+    attendance_date = Column(Date, nullable=False)
     status = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -30,5 +52,61 @@ class Attendance(Base):
     __table_args__ = (
         CheckConstraint("status IN ('Present', 'Absent')", name="check_status"),
         UniqueConstraint("employee_id", "attendance_date", name="unique_employee_date"),
+        # Serves date and date-range scans; on Postgres INCLUDE (status) makes them index-only
+        Index("idx_attendance_date_employee", "attendance_date", "employee_id", postgresql_include=["status"]),
+        Index("idx_attendance_updated_at", "updated_at", "id"),
     )
 
+
+class DeletedRecord(Base):
+    """Tombstone of a deleted row, so delta sync can tell clients to drop their copy"""
+    __tablename__ = "deleted_records"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    table_name = Column(String, nullable=False)
+    record_id = Column(String, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_deleted_records_deleted_at", "deleted_at", "id"),
+    )
+
+
+class AttendanceMonthlyRollup(Base):
+    """Present/absent counts per employee per month, maintained by attendance writes"""
+    __tablename__ = "attendance_monthly_rollups"
+
+    employee_id = Column(String, ForeignKey("employees.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    present_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_rollup_month", "month"),
+    )
+
+
+class AttendanceBitmap(Base):
+    """One employee-month of attendance as bitmasks, used when ATTENDANCE_STORAGE=bitmap"""
+    __tablename__ = "attendance_bitmaps"
+
+    employee_id = Column(String, ForeignKey("employees.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    # Bit n (1 << n) stands for day n + 1 of the month
+    marked_mask = Column(Integer, nullable=False, default=0)
+    present_mask = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Serves per-date scans in employee order (paging, rosters)
+        Index("idx_attendance_bitmaps_month_employee", "month", "employee_id"),
+        Index("idx_attendance_bitmaps_updated_at", "updated_at", "employee_id", "month"),
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    """The employee search index is dialect-specific DDL; see search.py"""
+    import search
+    search.create_index(connection)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Partition the attendance table by month and archive old months
+(PostgreSQL only; see partitions.py).
+
+    python partition_attendance.py convert                # once; stop writes while it runs
+    python partition_attendance.py maintain               # create upcoming partitions (cron)
+    python partition_attendance.py archive --retention-months 24 --dir /var/backups/attendance
+    python partition_attendance.py restore /var/backups/attendance/attendance_p2023_01.csv.gz
+    python partition_attendance.py status
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from database import SessionLocal, is_postgres
+import partitions
+
+
+def run(step, *args, **kwargs):
+    """Run step(db, ...) in one session, committing on success"""
+    db = SessionLocal()
+    try:
+        result = step(db, *args, **kwargs)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def status(db):
+    print(f"{'partition':<24} {'rows (estimate)':>16} {'bytes':>15}")
+    months = sorted(partitions.partitions(db).items())
+    for name in [name for _, name in months] + [partitions.DEFAULT_PARTITION]:
+        rows, size = db.execute(text(
+            "SELECT CAST(reltuples AS bigint), pg_total_relation_size(oid) FROM pg_class WHERE oid = to_regclass(:name)"
+        ), {"name": name}).one()
+        print(f"{name:<24} {max(rows, 0):>16,} {size:>15,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Rebuild attendance as a table partitioned by month")
+    convert.add_argument("--keep-old", action="store_true", help=f"Keep the old table as {partitions.OLD_TABLE}")
+    convert.add_argument("--months-ahead", type=int, default=partitions.PARTITION_MONTHS_AHEAD)
+    maintain = commands.add_parser("maintain", help="Create the partitions of the coming months")
+    maintain.add_argument("--months-ahead", type=int, default=partitions.PARTITION_MONTHS_AHEAD)
+    archive = commands.add_parser("archive", help="Export old months to gzip CSV files and drop them")
+    archive.add_argument("--retention-months", type=int, default=partitions.ARCHIVE_RETENTION_MONTHS)
+    archive.add_argument("--dir", default=partitions.ARCHIVE_DIR, help="Directory for the archive files")
+    archive.add_argument("--keep-detached", action="store_true", help="Detach archived partitions without dropping them")
+    restore = commands.add_parser("restore", help="Load archive files back as partitions")
+    restore.add_argument("files", nargs="+")
+    commands.add_parser("status", help="List the partitions with their sizes")
+    args = parser.parse_args()
+
+    if not is_postgres():
+        sys.exit("Partitioning needs PostgreSQL; DATABASE_URL points elsewhere.")
+    if args.command != "convert" and not run(partitions.is_partitioned):
+        sys.exit("attendance is not partitioned; run `python partition_attendance.py convert` first.")
+
+    if args.command == "convert":
+        print("Converting attendance to a partitioned table...")
+        copied = run(partitions.convert, args.months_ahead, args.keep_old)
+        print(f"Copied {copied} rows into monthly partitions.")
+    elif args.command == "maintain":
+        created = run(partitions.maintain, args.months_ahead)
+        print(f"Created {', '.join(created)}." if created else "All partitions exist.")
+    elif args.command == "archive":
+        archived = run(partitions.archive, args.dir, args.retention_months, args.keep_detached)
+        for name, rows in archived:
+            print(f"Archived {name}: {rows} rows to {partitions.archive_path(args.dir, name)}")
+        if not archived:
+            print(f"Nothing older than {args.retention_months} months to archive.")
+    elif args.command == "restore":
+        for path in args.files:
+            print(f"Restored {run(partitions.restore, path)} rows from {path}.")
+    else:
+        run(status)
+
+
+if __name__ == "__main__":
+    main()
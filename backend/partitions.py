@@ -0,0 +1,345 @@
+"""
+Monthly range partitioning and cold archival of attendance (PostgreSQL only).
+
+`python partition_attendance.py convert` rebuilds the attendance table as
+one partitioned by attendance_date: a partition per month
+(attendance_pYYYY_MM) and attendance_default for dates outside them. A
+query filtered on a date or a date range then reads only the partitions
+covering it, and every month's indexes stay the size of one month, so
+vacuum and index bloat no longer grow with the table's history.
+
+maintain() creates the partitions up to PARTITION_MONTHS_AHEAD months
+ahead, moving rows that landed in the default partition into their new
+month. The API runs it at startup and every PARTITION_CHECK_HOURS
+(PARTITION_MAINTENANCE); `python partition_attendance.py maintain` does the
+same from cron.
+
+archive() exports every month older than ARCHIVE_RETENTION_MONTHS to a
+gzip CSV file in ARCHIVE_DIR, checks the file's row count, then detaches
+and drops the partition. The monthly rollups are kept, so summaries of
+whole archived months are unchanged; restore() loads a file back.
+
+On SQLite, or while attendance is not partitioned, all of this does nothing.
+"""
+import asyncio
+import contextvars
+import gzip
+import logging
+import os
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import is_postgres, run_in_session
+from rollups import month_end, month_start
+import models
+
+PARTITION_MAINTENANCE = os.getenv("PARTITION_MAINTENANCE", "true").lower() in ("1", "true", "yes")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_CHECK_HOURS = float(os.getenv("PARTITION_CHECK_HOURS", "24"))
+ARCHIVE_RETENTION_MONTHS = int(os.getenv("ARCHIVE_RETENTION_MONTHS", "24"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+
+TABLE = "attendance"
+DEFAULT_PARTITION = "attendance_default"
+# The table left behind by convert(), kept with keep_old=True
+OLD_TABLE = "attendance_unpartitioned"
+
+PARTITION_NAME = re.compile(r"attendance_p(\d{4})_(\d{2})")
+BOUNDS = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+# Serializes maintain(), archive() and restore() across workers and cron
+LOCK = text("SELECT pg_advisory_xact_lock(hashtext('attendance_partitions'))")
+
+logger = logging.getLogger(__name__)
+
+
+def next_month(month: date) -> date:
+    return month_end(month) + timedelta(days=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"attendance_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": TABLE}))
+
+
+def partitions(db: Session) -> dict[date, str]:
+    """Monthly partitions of attendance by their first day; the default partition is left out"""
+    rows = db.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+        "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": TABLE})
+    found = {}
+    for name, bound in rows:
+        match = BOUNDS.search(bound)
+        if match:
+            found[date.fromisoformat(match.group(1))] = name
+    return found
+
+
+def create_partition(db: Session, month: date) -> int:
+    """
+    Create and attach month's partition, moving its rows out of the default
+    partition. Does not commit. Returns the number of rows moved.
+    """
+    name = partition_name(month)
+    bounds = {"start": month, "end": next_month(month)}
+    db.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = db.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE attendance_date >= :start AND attendance_date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds).rowcount
+    # Attaching builds the partition's share of every index, key and foreign key
+    db.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    return moved
+
+
+def maintain(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD, today: Optional[date] = None) -> list[str]:
+    """Create the partitions missing from this month to months_ahead; does not commit. Returns their names."""
+    if not is_partitioned(db):
+        return []
+    db.execute(LOCK)
+    existing = partitions(db)
+    month = month_start(today or date.today())
+    created = []
+    for _ in range(months_ahead + 1):
+        if month not in existing:
+            moved = create_partition(db, month)
+            created.append(partition_name(month))
+            logger.info("Created partition %s (%d rows moved from %s)", partition_name(month), moved, DEFAULT_PARTITION)
+        month = next_month(month)
+    return created
+
+
+def _copy_access(db: Session, source: str, target: str):
+    """Give target the row-level security, policies and grants of source (Supabase's anon access)"""
+    if db.scalar(text("SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(:table)"), {"table": source}):
+        db.execute(text(f"ALTER TABLE {target} ENABLE ROW LEVEL SECURITY"))
+    policies = db.execute(text(
+        "SELECT quote_ident(policyname), permissive, cmd, qual, with_check, "
+        "array_to_string(ARRAY(SELECT CASE WHEN role = 'public' THEN role ELSE quote_ident(role) END "
+        "FROM unnest(CAST(roles AS text[])) AS role), ', ') "
+        "FROM pg_policies WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": source})
+    for name, permissive, command, using, check, roles in policies:
+        db.execute(text(
+            f"CREATE POLICY {name} ON {target} AS {permissive} FOR {command} TO {roles}"
+            + (f" USING ({using})" if using else "")
+            + (f" WITH CHECK ({check})" if check else "")
+        ))
+    grants = db.execute(text(
+        "SELECT CASE WHEN grantee = 'PUBLIC' THEN grantee ELSE quote_ident(grantee) END, "
+        "string_agg(privilege_type, ', ') "
+        "FROM information_schema.role_table_grants "
+        "WHERE table_schema = current_schema() AND table_name = :table AND grantee <> current_user "
+        "GROUP BY grantee"
+    ), {"table": source})
+    for grantee, privileges in grants:
+        db.execute(text(f"GRANT {privileges} ON {target} TO {grantee}"))
+
+
+def convert(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD, keep_old: bool = False) -> int:
+    """
+    Rebuild attendance as a partitioned table holding the same rows; does
+    not commit. The old table is renamed to attendance_unpartitioned (its
+    indexes get the same suffix) and dropped unless keep_old. Returns the
+    number of rows copied.
+    """
+    if is_partitioned(db):
+        raise ValueError("attendance is already partitioned")
+    indexes = list(db.scalars(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": TABLE}))
+    db.execute(text(f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE"))
+    db.execute(text(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}"))
+    for index in indexes:
+        # Free the names for the new table's indexes
+        db.execute(text(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned"))
+
+    db.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (attendance_date)"
+    ))
+    db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    first, last = db.execute(text(f"SELECT min(attendance_date), max(attendance_date) FROM {OLD_TABLE}")).one()
+    month = month_start(first or date.today())
+    last = max(month_start(last or date.today()), add_months(month_start(date.today()), months_ahead))
+    while month <= last:
+        db.execute(text(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+        ))
+        month = next_month(month)
+    copied = db.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")).rowcount
+
+    # Keys and indexes are built once the rows are in; unique keys must include the partition key
+    db.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT attendance_pkey PRIMARY KEY (id, attendance_date)"))
+    db.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT unique_employee_date UNIQUE (employee_id, attendance_date)"))
+    db.execute(text(
+        f"ALTER TABLE {TABLE} ADD FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE"
+    ))
+    for index in models.Attendance.__table__.indexes:
+        index.create(bind=db.connection())
+    _copy_access(db, OLD_TABLE, TABLE)
+    if not keep_old:
+        db.execute(text(f"DROP TABLE {OLD_TABLE}"))
+    return copied
+
+
+def archive_path(directory, name: str) -> Path:
+    return Path(directory) / f"{name}.csv.gz"
+
+
+def _count_lines(path: Path) -> int:
+    with gzip.open(path, "rb") as archived:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: archived.read(1 << 20), b""))
+
+
+def archive_partition(db: Session, name: str, directory, keep_detached: bool = False) -> int:
+    """
+    Export one partition to a gzip CSV file in directory, then detach it and
+    (unless keep_detached) drop it. Commits; returns the number of rows archived.
+    """
+    path = archive_path(directory, name)
+    partial = path.with_name(path.name + ".partial")
+    # Writes to the month wait until it is gone, so none are lost between export and detach
+    db.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+    count = db.scalar(text(f"SELECT count(*) FROM {name}"))
+    cursor = db.connection().connection.cursor()
+    try:
+        with open(partial, "wb") as raw, gzip.open(raw, "wb") as archived:
+            cursor.copy_expert(
+                f"COPY (SELECT * FROM {name} ORDER BY attendance_date, employee_id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                archived,
+            )
+            archived.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+    finally:
+        cursor.close()
+    lines = _count_lines(partial)
+    if lines != count + 1:
+        partial.unlink()
+        raise RuntimeError(f"{partial} has {lines - 1} rows, {name} has {count}; {name} was left in place")
+    partial.replace(path)
+
+    db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+    if not keep_detached:
+        db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+    return count
+
+
+def archive(
+    db: Session,
+    directory=ARCHIVE_DIR,
+    retention_months: int = ARCHIVE_RETENTION_MONTHS,
+    keep_detached: bool = False,
+    today: Optional[date] = None,
+) -> list[tuple[str, int]]:
+    """
+    Archive every monthly partition that ended more than retention_months
+    months ago, oldest first, one transaction each. Returns (partition, rows) pairs.
+    """
+    if not is_partitioned(db):
+        return []
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    archived = []
+    for month, name in sorted(partitions(db).items()):
+        if next_month(month) > cutoff:
+            break
+        db.execute(LOCK)
+        archived.append((name, archive_partition(db, name, directory, keep_detached)))
+    return archived
+
+
+def restore(db: Session, path) -> int:
+    """
+    Load an archive file written by archive() back as its month's partition.
+    Does not commit. Returns the number of rows restored.
+    """
+    path = Path(path)
+    match = PARTITION_NAME.fullmatch(path.name.removesuffix(".csv.gz"))
+    if not match:
+        raise ValueError(f"{path.name} is not an attendance partition archive")
+    month = date(int(match.group(1)), int(match.group(2)), 1)
+    db.execute(LOCK)
+    if month in partitions(db):
+        raise ValueError(f"{partition_name(month)} already exists")
+    create_partition(db, month)
+    cursor = db.connection().connection.cursor()
+    try:
+        with gzip.open(path, "rt") as archived:
+            columns = archived.readline().strip()
+            cursor.copy_expert(
+                f"COPY {partition_name(month)} ({columns}) FROM STDIN WITH (FORMAT csv)", archived
+            )
+            return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _maintain(db: Session) -> list[str]:
+    created = maintain(db)
+    db.commit()
+    return created
+
+
+class PartitionMaintainer:
+    """Runs maintain() in the background of the event loop every PARTITION_CHECK_HOURS"""
+
+    def __init__(self, interval_hours: float):
+        self.interval = interval_hours * 3600
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            # In a fresh context, so its SQL is not counted against a request
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_session(_maintain)
+            except Exception:
+                # Tried again at the next check; the default partition takes the rows meanwhile
+                logger.exception("Creating attendance partitions failed")
+            await asyncio.sleep(self.interval)
+
+
+maintainer = PartitionMaintainer(PARTITION_CHECK_HOURS)
+
+
+def maintain_in_background() -> bool:
+    """Start the maintainer when the database is PostgreSQL; connects only from the task"""
+    if not (PARTITION_MAINTENANCE and is_postgres()):
+        return False
+    maintainer.start()
+    return True
@@ -0,0 +1,141 @@
+"""
+Soft deletion of employees, and the purge that follows.
+
+Deleting an employee only stamps employees.deleted_at (and leaves a sync
+tombstone), which is one row however long their history. Reads skip
+stamped employees and their attendance from then on. A purger then deletes
+the employee's attendance, rollups and bitmaps PURGE_BATCH_SIZE rows per
+transaction, pausing PURGE_PAUSE_MS between batches so concurrent writers
+are never held up for long, and deletes the employee row last.
+
+The purger runs in the API process after every deletion
+(PURGE_IN_BACKGROUND), and `python purge_deleted.py` does the same from a
+cron job, for deployments without long-lived processes or to finish purges
+interrupted by a restart.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+import models
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PURGE_PAUSE_MS = float(os.getenv("PURGE_PAUSE_MS", "20"))
+PURGE_IN_BACKGROUND = os.getenv("PURGE_IN_BACKGROUND", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+
+def not_deleted(employee_id_column):
+    """
+    Condition keeping rows whose employee is not soft-deleted. The subquery
+    reads the few stamped employees off idx_employees_deleted_at, so tables
+    keyed by employee need no join for it.
+    """
+    employee = models.Employee
+    return employee_id_column.not_in(select(employee.id).where(employee.deleted_at.is_not(None)))
+
+
+def soft_delete(db: Session, *conditions) -> list[str]:
+    """
+    Stamp the active employees matching conditions as deleted and leave a
+    tombstone for each; returns their ids. Does not commit.
+    """
+    employee = models.Employee
+    ids = list(db.scalars(
+        update(employee)
+        .where(employee.deleted_at.is_(None), *conditions)
+        .values(deleted_at=func.now(), updated_at=func.now())
+        .returning(employee.id)
+        .execution_options(synchronize_session=False)
+    ))
+    if ids:
+        db.execute(insert(models.DeletedRecord), [
+            {"table_name": "employees", "record_id": employee_id} for employee_id in ids
+        ])
+    return ids
+
+
+def pending(db: Session) -> list[str]:
+    """Soft-deleted employees still waiting to be purged"""
+    employee = models.Employee
+    return list(db.scalars(select(employee.id).where(employee.deleted_at.is_not(None)).order_by(employee.deleted_at)))
+
+
+def purge_step(db: Session, employee_id: str, batch_size: int = PURGE_BATCH_SIZE) -> bool:
+    """
+    One bounded transaction of a soft-deleted employee's purge: up to
+    batch_size of their rows, or the employee row once nothing refers to
+    it. Returns False when the employee is gone.
+    """
+    employee = models.Employee
+    if db.scalar(select(employee.deleted_at).where(employee.id == employee_id)) is None:
+        # Purged already (or never deleted): nothing of theirs may be removed
+        db.rollback()
+        return False
+    attendance = models.Attendance
+    batches = [
+        delete(attendance).where(attendance.id.in_(
+            select(attendance.id).where(attendance.employee_id == employee_id).limit(batch_size)
+        )),
+    ]
+    for model in (models.AttendanceMonthlyRollup, models.AttendanceBitmap):
+        batches.append(delete(model).where(model.employee_id == employee_id, model.month.in_(
+            select(model.month).where(model.employee_id == employee_id).limit(batch_size)
+        )))
+    for batch in batches:
+        if db.execute(batch).rowcount:
+            db.commit()
+            return True
+    db.execute(delete(employee).where(employee.id == employee_id, employee.deleted_at.is_not(None)))
+    db.commit()
+    return False
+
+
+def purge_deleted(db: Session, batch_size: int = PURGE_BATCH_SIZE, pause_seconds: float = PURGE_PAUSE_MS / 1000) -> int:
+    """Purge every soft-deleted employee; returns how many were purged"""
+    employee_ids = pending(db)
+    for employee_id in employee_ids:
+        while purge_step(db, employee_id, batch_size):
+            time.sleep(pause_seconds)
+    return len(employee_ids)
+
+
+class Purger:
+    """Runs purge_deleted in the background of the event loop, one run at a time"""
+
+    def __init__(self, batch_size: int, pause_ms: float):
+        self.batch_size = batch_size
+        self.pause = pause_ms / 1000
+        self._task = None
+        self._rerun = False
+
+    def wake(self):
+        """Start a purge, or have the running one look for new deletions when it finishes"""
+        if self._task is not None and not self._task.done():
+            self._rerun = True
+            return
+        # In a fresh context, so the purge's SQL is not counted against the deleting request
+        self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                self._rerun = False
+                for employee_id in await run_in_session(pending):
+                    while await run_in_session(purge_step, employee_id, self.batch_size):
+                        await asyncio.sleep(self.pause)
+                if not self._rerun:
+                    return
+        except Exception:
+            # Left for the next deletion or purge_deleted.py to pick up
+            logger.exception("Purging deleted employees failed")
+
+
+purger = Purger(PURGE_BATCH_SIZE, PURGE_PAUSE_MS)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Purge soft-deleted employees: their attendance, rollups and bitmaps in
+small batches, then the employee rows. The API does this in the background
+after each deletion; run this from cron where the API process does not
+live on (serverless), or to finish purges interrupted by a restart:
+
+    python purge_deleted.py
+    python purge_deleted.py --batch-size 5000 --pause-ms 0
+"""
+import argparse
+
+from database import SessionLocal
+import purge
+
+
+def purge_deleted(batch_size: int, pause_ms: float):
+    """Purge every soft-deleted employee"""
+    print("Purging deleted employees...")
+    db = SessionLocal()
+    try:
+        count = purge.purge_deleted(db, batch_size, pause_ms / 1000)
+    finally:
+        db.close()
+    print(f"Purged {count} employees.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge soft-deleted employees")
+    parser.add_argument("--batch-size", type=int, default=purge.PURGE_BATCH_SIZE, help="Rows deleted per transaction")
+    parser.add_argument("--pause-ms", type=float, default=purge.PURGE_PAUSE_MS, help="Pause between transactions")
+    args = parser.parse_args()
+    purge_deleted(args.batch_size, args.pause_ms)
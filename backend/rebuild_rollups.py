@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Rebuild the monthly attendance rollups from the attendance table.
+Run after upgrading to backfill rollups for existing attendance, or to
+repair them. Optionally limit the rebuild to a range of months:
+
+    python rebuild_rollups.py
+    python rebuild_rollups.py --start 2024-01 --end 2024-06
+"""
+import argparse
+from datetime import date
+
+from database import SessionLocal
+import rollups
+
+
+def parse_month(value: str) -> date:
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+
+def rebuild_rollups(start_month=None, end_month=None):
+    """Recompute rollups for the given months (all months when omitted)"""
+    print("Rebuilding attendance rollups...")
+    db = SessionLocal()
+    try:
+        count = rollups.rebuild(db, start_month, end_month)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    print(f"Rebuilt {count} rollup rows.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild monthly attendance rollups")
+    parser.add_argument("--start", type=parse_month, help="First month to rebuild (YYYY-MM)")
+    parser.add_argument("--end", type=parse_month, help="Last month to rebuild (YYYY-MM)")
+    args = parser.parse_args()
+    rebuild_rollups(args.start, args.end)
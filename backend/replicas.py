@@ -0,0 +1,237 @@
+"""
+Read replicas.
+
+With DATABASE_REPLICA_URLS set (comma separated, same URL format as
+DATABASE_URL), GET routes read through get_read_db, which hands out sessions
+on the replicas in round-robin order; every write keeps using get_db and the
+primary. Without it get_read_db is a primary session, exactly like get_db.
+
+A replica is probed (SELECT 1, and on PostgreSQL its replay lag) before it
+serves reads, and again once every REPLICA_CHECK_INTERVAL_SECONDS. One that
+fails the probe, lags more than REPLICA_MAX_LAG_SECONDS, or drops a
+connection sits out until the next interval; with none left, reads go to
+the primary.
+
+Read-your-writes: a successful write response sets a short-lived cookie
+(READ_YOUR_WRITES_SECONDS), and reads carrying it go to the primary, so a
+client sees its own change even while the replicas are catching up. Writes
+from another site get a SameSite=None; Secure cookie, which browsers send on
+cross-site fetches with credentials. The response also carries an
+X-Recent-Write header (when the window ends, in Unix seconds); clients that
+cannot keep cookies echo it on their reads instead.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from fastapi import Depends, Request
+from starlette.datastructures import Headers
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+import metrics
+
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "10"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+RECENT_WRITE_COOKIE = "hrms_recent_write"
+RECENT_WRITE_HEADER = "X-Recent-Write"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Seconds since the last replayed transaction, or 0 when the replica has
+# replayed everything it received (an idle primary sends nothing new)
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """One replica URL with its lazily created engines and health state"""
+
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        self._lock = threading.Lock()
+        self._engine = None
+        self._async_engine = None
+        self._session_factory = None
+        # Monotonic times; a replica is probed before it serves its first read
+        self.checked_at = float("-inf")
+        self.down_until = 0.0
+        self.lag_seconds: Optional[float] = None
+
+    def _instrument(self, engine, name: str):
+        metrics.instrument_engine(engine, name)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def get_engine(self):
+        with self._lock:
+            if self._engine is None:
+                engine = database.build_engine(self.url)
+                self._instrument(engine, self.name)
+                self._engine = engine
+        return self._engine
+
+    def get_async_engine(self):
+        with self._lock:
+            if self._async_engine is None:
+                engine = database.build_async_engine(self.url)
+                self._instrument(engine.sync_engine, f"{self.name}-async")
+                self._async_engine = engine
+        return self._async_engine
+
+    def session_factory(self):
+        """A sessionmaker for this replica in the app's session mode"""
+        if self._session_factory is None:
+            if database.DB_ASYNC:
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+                self._session_factory = async_sessionmaker(
+                    self.get_async_engine(), autoflush=False, expire_on_commit=False
+                )
+            else:
+                self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.get_engine())
+        return self._session_factory
+
+    def available(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def due_for_check(self, now: float) -> bool:
+        return now - self.checked_at >= REPLICA_CHECK_INTERVAL_SECONDS
+
+    def mark_down(self):
+        now = time.monotonic()
+        self.checked_at = now
+        self.down_until = now + REPLICA_CHECK_INTERVAL_SECONDS
+
+    def _record(self, lag) -> bool:
+        self.lag_seconds = float(lag or 0)
+        if self.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+            self.mark_down()
+            return False
+        self.checked_at = time.monotonic()
+        return True
+
+    def check(self) -> bool:
+        """Probe the replica; False (and marked down) if it is unreachable or too far behind"""
+        try:
+            with self.get_engine().connect() as conn:
+                conn.execute(text("SELECT 1"))
+                lag = conn.scalar(POSTGRES_LAG_QUERY) if conn.dialect.name == "postgresql" else 0
+        except Exception:
+            self.mark_down()
+            return False
+        return self._record(lag)
+
+    async def acheck(self) -> bool:
+        """check() on the async engine"""
+        try:
+            async with self.get_async_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                lag = await conn.scalar(POSTGRES_LAG_QUERY) if conn.dialect.name == "postgresql" else 0
+        except Exception:
+            self.mark_down()
+            return False
+        return self._record(lag)
+
+    def _on_error(self, context):
+        # A dropped connection, or no connection at all: stop routing reads here
+        if context.is_disconnect or context.connection is None:
+            self.mark_down()
+
+
+replicas = [Replica(url, f"replica{n}") for n, url in enumerate(REPLICA_URLS, 1)]
+_next = itertools.count()
+
+
+def _rotation(now: float) -> list[Replica]:
+    """The available replicas, starting one further along on every call"""
+    start = next(_next)
+    rotated = [replicas[(start + n) % len(replicas)] for n in range(len(replicas))]
+    return [replica for replica in rotated if replica.available(now)]
+
+
+def wrote_recently(request: Request) -> bool:
+    if RECENT_WRITE_COOKIE in request.cookies:
+        return True
+    try:
+        return float(request.headers.get(RECENT_WRITE_HEADER, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+def _cross_site(headers: Headers) -> bool:
+    """Whether the request comes from a page on another host (another port is the same site)"""
+    origin = headers.get("origin")
+    if not origin:
+        return False
+    host = urlsplit(f"//{headers.get('host', '')}").hostname
+    return urlsplit(origin).hostname != host
+
+
+if database.DB_ASYNC:
+    async def read_sessionmaker(request: Request):
+        """Dependency: the session factory reads should use (a replica, or the primary)"""
+        if replicas and not wrote_recently(request):
+            now = time.monotonic()
+            for replica in _rotation(now):
+                if not replica.due_for_check(now) or await replica.acheck():
+                    return replica.session_factory()
+        return database.get_async_sessionmaker()
+
+    async def get_read_db(session_factory=Depends(read_sessionmaker)):
+        """Dependency to get an async database session for reads"""
+        async with session_factory() as db:
+            yield db
+else:
+    def read_sessionmaker(request: Request):
+        """Dependency: the session factory reads should use (a replica, or the primary)"""
+        if replicas and not wrote_recently(request):
+            now = time.monotonic()
+            for replica in _rotation(now):
+                if not replica.due_for_check(now) or replica.check():
+                    return replica.session_factory()
+        return database.get_sessionmaker()
+
+    def get_read_db(session_factory=Depends(read_sessionmaker)):
+        """Dependency to get a database session for reads"""
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+class ReadYourWritesMiddleware:
+    """Set the recent-write cookie and header on successful write responses"""
+
+    def __init__(self, app):
+        self.app = app
+        cookie = f"{RECENT_WRITE_COOKIE}=1; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly"
+        self.same_site_cookie = f"{cookie}; SameSite=Lax".encode("latin-1")
+        # Lax cookies are not sent on cross-site fetches; None requires Secure
+        self.cross_site_cookie = f"{cookie}; SameSite=None; Secure".encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        cookie = self.cross_site_cookie if _cross_site(Headers(scope=scope)) else self.same_site_cookie
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = str(int(time.time()) + READ_YOUR_WRITES_SECONDS).encode("latin-1")
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie),
+                    (RECENT_WRITE_HEADER.lower().encode("latin-1"), until),
+                ]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
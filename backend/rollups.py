@@ -0,0 +1,294 @@
+"""
+Monthly attendance rollups.
+
+attendance_monthly_rollups holds one row per employee per month with the
+present and absent counts for that month. Attendance writes adjust it in the
+same transaction, so a summary over a year reads at most 12 rollup rows per
+employee; only the partial months at either end of the period are counted
+from raw attendance rows.
+
+A write first locks the rollup rows of the employee-months it touches
+(lock()), then reads the previous statuses and applies the difference, so
+two transactions marking the same new day cannot both count it.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, and_, case, delete, func, insert, literal, or_, select, tuple_
+from sqlalchemy.sql.selectable import CTE
+from sqlalchemy.orm import Session
+
+import models
+
+STATUS_COLUMNS = {"Present": "present_count", "Absent": "absent_count"}
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def month_end(day: date) -> date:
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def month_expression(db: Session, column):
+    """SQL expression truncating a date column to the first day of its month"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("month", column).cast(models.Attendance.attendance_date.type)
+    return func.date(column, "start of month")
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def _lock_upsert(db: Session, stmt):
+    """Finish an insert of zero-count rollup rows so it locks the rows it hits, new or existing"""
+    table = models.AttendanceMonthlyRollup.__table__
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.month],
+        set_={"present_count": table.c.present_count},
+    ))
+
+
+def lock(db: Session, keys: list[tuple[str, date]]):
+    """
+    Lock the rollup rows of the (employee_id, attendance_date) keys' months,
+    creating missing ones, in key order. Run before previous_statuses: a
+    concurrent writer of the same employee and month waits here until this
+    transaction ends, so it reads the statuses this one writes, even for days
+    that had no row (which FOR UPDATE cannot lock). On SQLite this is the
+    transaction's first write, which takes the database's write lock.
+    """
+    months = sorted({(employee_id, month_start(attendance_date)) for employee_id, attendance_date in keys})
+    if not months:
+        return
+    table = models.AttendanceMonthlyRollup.__table__
+    _lock_upsert(db, _dialect_insert(db)(table).values([
+        {"employee_id": employee_id, "month": month, "present_count": 0, "absent_count": 0}
+        for employee_id, month in months
+    ]))
+
+
+def lock_mark_all(db: Session, conditions: list, attendance_date: date):
+    """lock() for every employee matching conditions, with one statement"""
+    employee = models.Employee
+    table = models.AttendanceMonthlyRollup.__table__
+    _lock_upsert(db, _dialect_insert(db)(table).from_select(
+        ["employee_id", "month", *STATUS_COLUMNS.values()],
+        select(employee.id, literal(month_start(attendance_date), Date), literal(0), literal(0))
+        .where(*conditions).order_by(employee.id),
+    ))
+
+
+def previous_statuses(db: Session, keys: list[tuple[str, date]]) -> dict[tuple[str, date], str]:
+    """Current status of each existing (employee_id, attendance_date), locked for update; call lock() first"""
+    if not keys:
+        return {}
+    rows = db.execute(
+        select(models.Attendance.employee_id, models.Attendance.attendance_date, models.Attendance.status)
+        .where(tuple_(models.Attendance.employee_id, models.Attendance.attendance_date).in_(keys))
+        .with_for_update()
+    )
+    return {(row.employee_id, row.attendance_date): row.status for row in rows}
+
+
+def apply_changes(db: Session, changes: list[tuple[str, date, Optional[str], str]]):
+    """
+    Adjust rollups for (employee_id, attendance_date, old_status, new_status)
+    changes with one upsert. Must run in the transaction that writes them.
+    """
+    deltas = defaultdict(lambda: {"present_count": 0, "absent_count": 0})
+    for employee_id, attendance_date, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        delta = deltas[(employee_id, month_start(attendance_date))]
+        if old_status:
+            delta[STATUS_COLUMNS[old_status]] -= 1
+        delta[STATUS_COLUMNS[new_status]] += 1
+    if not deltas:
+        return
+
+    table = models.AttendanceMonthlyRollup.__table__
+    stmt = _dialect_insert(db)(table).values([
+        {"employee_id": employee_id, "month": month, **delta}
+        for (employee_id, month), delta in deltas.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.month],
+        set_={
+            "present_count": table.c.present_count + stmt.excluded.present_count,
+            "absent_count": table.c.absent_count + stmt.excluded.absent_count,
+        },
+    ))
+
+
+def _add(db: Session, source):
+    """Add the (employee_id, month, present delta, absent delta) rows of source to the rollups"""
+    table = models.AttendanceMonthlyRollup.__table__
+    stmt = _dialect_insert(db)(table).from_select(["employee_id", "month", *STATUS_COLUMNS.values()], source)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.month],
+        set_={
+            "present_count": table.c.present_count + stmt.excluded.present_count,
+            "absent_count": table.c.absent_count + stmt.excluded.absent_count,
+        },
+    )
+
+
+def apply_mark_all(db: Session, conditions: list, attendance_date: date, status: str):
+    """
+    Adjust rollups for marking every employee matching conditions with status
+    on attendance_date, with one upsert whatever the number of employees. Must
+    run after lock_mark_all and before the marks are written, in their transaction.
+    """
+    employee = models.Employee
+    attendance = models.Attendance
+    # New status counted, previous status (if any) taken back; marks already at status are skipped
+    source = select(
+        employee.id,
+        literal(month_start(attendance_date), Date),
+        *(
+            int(status == name) - case((attendance.status == name, 1), else_=0)
+            for name in STATUS_COLUMNS
+        ),
+    ).select_from(employee).outerjoin(attendance, and_(
+        attendance.employee_id == employee.id, attendance.attendance_date == attendance_date,
+    )).where(*conditions, or_(attendance.status.is_(None), attendance.status != status))
+    db.execute(_add(db, source))
+
+
+def add_written(db: Session, written: CTE, attendance_date: date, status: str):
+    """
+    Rollup upsert counting marks of status on attendance_date, from a CTE of
+    the (employee_id, inserted) rows an attendance upsert returned; PostgreSQL
+    only. Only changed marks are returned, so a mark that was not inserted
+    had the other status, the only other one.
+    """
+    source = select(
+        written.c.employee_id,
+        literal(month_start(attendance_date), Date),
+        *(
+            literal(1) if name == status else case((written.c.inserted, 0), else_=-1)
+            for name in STATUS_COLUMNS
+        ),
+    )
+    return _add(db, source).add_cte(written)
+
+
+def rebuild(db: Session, start_month: Optional[date] = None, end_month: Optional[date] = None) -> int:
+    """
+    Recompute rollups from attendance rows, optionally only for months in
+    [start_month, end_month]. Does not commit. Returns the number of rollup rows written.
+    """
+    rollup = models.AttendanceMonthlyRollup
+    attendance = models.Attendance
+    month = month_expression(db, attendance.attendance_date)
+
+    clear = delete(rollup)
+    source = select(
+        attendance.employee_id,
+        month.label("month"),
+        func.sum(case((attendance.status == "Present", 1), else_=0)),
+        func.sum(case((attendance.status == "Absent", 1), else_=0)),
+    ).group_by(attendance.employee_id, month)
+    if start_month:
+        clear = clear.where(rollup.month >= month_start(start_month))
+        source = source.where(attendance.attendance_date >= month_start(start_month))
+    if end_month:
+        clear = clear.where(rollup.month <= month_start(end_month))
+        source = source.where(attendance.attendance_date <= month_end(end_month))
+
+    db.execute(clear)
+    result = db.execute(insert(rollup).from_select(
+        ["employee_id", "month", "present_count", "absent_count"], source
+    ))
+    return result.rowcount
+
+
+def _split_period(start_date: date, end_date: date):
+    """Split a period into raw-row date ranges and one range of whole months"""
+    first_full = start_date if start_date.day == 1 else month_end(start_date) + timedelta(days=1)
+    last_full = end_date if end_date == month_end(end_date) else month_start(end_date) - timedelta(days=1)
+    if first_full > last_full:
+        return [(start_date, end_date)], None
+    raw_ranges = []
+    if start_date < first_full:
+        raw_ranges.append((start_date, first_full - timedelta(days=1)))
+    if last_full < end_date:
+        raw_ranges.append((last_full + timedelta(days=1), end_date))
+    return raw_ranges, (month_start(first_full), month_start(last_full))
+
+
+def summarize(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    group_by: str = "employee",
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+) -> list[dict]:
+    """Present/absent counts per employee or per department over [start_date, end_date]"""
+    employee = models.Employee
+    if group_by == "department":
+        keys = [employee.department]
+    else:
+        keys = [employee.id, employee.employee_id, employee.full_name, employee.department]
+
+    raw_ranges, months = _split_period(start_date, end_date)
+    queries = []
+    if months:
+        rollup = models.AttendanceMonthlyRollup
+        queries.append(
+            select(*keys, func.sum(rollup.present_count), func.sum(rollup.absent_count))
+            .join(rollup, rollup.employee_id == employee.id)
+            .where(rollup.month >= months[0], rollup.month <= months[1])
+        )
+    attendance = models.Attendance
+    for range_start, range_end in raw_ranges:
+        queries.append(
+            select(
+                *keys,
+                func.sum(case((attendance.status == "Present", 1), else_=0)),
+                func.sum(case((attendance.status == "Absent", 1), else_=0)),
+            )
+            .join(attendance, attendance.employee_id == employee.id)
+            .where(attendance.attendance_date >= range_start, attendance.attendance_date <= range_end)
+        )
+
+    totals = {}
+    for query in queries:
+        query = query.where(employee.deleted_at.is_(None))
+        if department:
+            query = query.where(employee.department == department)
+        if employee_id:
+            query = query.where(employee.id == employee_id)
+        for row in db.execute(query.group_by(*keys)):
+            key = tuple(row[:len(keys)])
+            present, absent = totals.get(key, (0, 0))
+            totals[key] = (present + (row[-2] or 0), absent + (row[-1] or 0))
+
+    return summary_rows(keys, totals, group_by)
+
+
+def summary_rows(keys: list, totals: dict, group_by: str) -> list[dict]:
+    """Format {key values: (present, absent)} totals as sorted summary rows"""
+    rows = []
+    for key, (present, absent) in totals.items():
+        if not present and not absent:
+            continue
+        row = dict(zip([column.key for column in keys], key))
+        row.update(
+            present=present,
+            absent=absent,
+            attendance_rate=round(present / (present + absent), 4),
+        )
+        rows.append(row)
+    sort_key = "department" if group_by == "department" else "full_name"
+    return sorted(rows, key=lambda r: r[sort_key])
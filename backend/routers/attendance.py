@@ -1,30 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import date
-import sys
-from pathlib import Path
 
-# Add parent directory to path for imports
-sys.path.append(str(Path(__file__).parent.parent))
-
-from database import get_db
+from cache import invalidate_roster, roster_cache
+from coalesce import ATTENDANCE_COALESCE, ATTENDANCE_COALESCE_MAX_BATCH, ATTENDANCE_COALESCE_WINDOW_MS, WriteCoalescer
+from database import db_route, get_db, run_db
+from export import MEDIA_TYPES, export_statement, stream_bitmap_export, stream_export
+from feed import attendance_feed, publish_attendance, publish_resync
+from idempotency import idempotency_store
+from pagination import InvalidCursor, apply_keyset, paginate
+from purge import not_deleted
+from replicas import get_read_db, read_sessionmaker
+from serialization import dumps, field_names, json_response, object_dicts, row_dicts, schema_columns
+from upsert import SKIP_EMPLOYEE_NOT_FOUND, mark_all, upsert_attendance
+import bitmaps
+import conditional
 import models
+import rollups
 import schemas
 
 router = APIRouter()
 
+EMPLOYEE_FIELDS = field_names(schemas.EmployeeResponse)
+ATTENDANCE_FIELDS = field_names(schemas.AttendanceResponse)
+
 
-@router.get("/attendance", response_model=List[schemas.AttendanceResponse])
+@router.get("/attendance", response_model=schemas.AttendancePage)
+@db_route
 def get_attendance(
     attendance_date: Optional[date] = Query(None, description="Filter by attendance date"),
     employee_id: Optional[str] = Query(None, description="Filter by employee ID"),
-    db: Session = Depends(get_db)
+    start_date: Optional[date] = Query(None, description="Only records on or after this date"),
+    end_date: Optional[date] = Query(None, description="Only records on or before this date"),
+    department: Optional[str] = Query(None, description="Filter by the employee's department"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of records to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: Session = Depends(get_read_db)
 ):
-    """Get attendance records with optional filters"""
+    """Get attendance records with optional filters, ordered by date, one page at a time"""
     try:
-        query = db.query(models.Attendance)
+        if bitmaps.ENABLED:
+            attendance_records, next_cursor = bitmaps.page(
+                db, attendance_date, employee_id, start_date, end_date, department, limit, cursor
+            )
+            return json_response({"items": object_dicts(attendance_records, ATTENDANCE_FIELDS), "next_cursor": next_cursor})
+
+        query = db.query(*schema_columns(models.Attendance, schemas.AttendanceResponse)).filter(
+            not_deleted(models.Attendance.employee_id)
+        )
         
         if attendance_date:
             query = query.filter(models.Attendance.attendance_date == attendance_date)
@@ -32,8 +58,33 @@ def get_attendance(
         if employee_id:
             query = query.filter(models.Attendance.employee_id == employee_id)
         
-        attendance_records = query.all()
-        return attendance_records
+        # Range scans are served by idx_attendance_date_employee
+        if start_date:
+            query = query.filter(models.Attendance.attendance_date >= start_date)
+        
+        if end_date:
+            query = query.filter(models.Attendance.attendance_date <= end_date)
+        
+        if department:
+            query = query.join(models.Employee, models.Employee.id == models.Attendance.employee_id).filter(
+                models.Employee.department == department
+            )
+        
+        query = apply_keyset(
+            query,
+            models.Attendance,
+            models.Attendance.attendance_date,
+            descending=False,
+            cursor=cursor,
+            key="attendance_date",
+        )
+        attendance_records, next_cursor = paginate(query, "attendance_date", limit)
+        return json_response({"items": row_dicts(attendance_records, ATTENDANCE_FIELDS), "next_cursor": next_cursor})
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -41,47 +92,168 @@ def get_attendance(
         )
 
 
+@router.get("/attendance/export")
+def export_attendance(
+    start_date: date = Query(..., description="First date to export (inclusive)"),
+    end_date: date = Query(..., description="Last date to export (inclusive)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    department: Optional[str] = Query(None, description="Filter by department"),
+    employee_id: Optional[str] = Query(None, description="Filter by employee UUID"),
+    session_factory=Depends(read_sessionmaker),
+):
+    """
+    Stream attendance for a date range as NDJSON or CSV.
+    Each row carries the employee's user-facing employee_id, full_name and department.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+
+    if bitmaps.ENABLED:
+        content = stream_bitmap_export(start_date, end_date, department, employee_id, format, session_factory)
+    else:
+        content = stream_export(
+            export_statement(start_date, end_date, department, employee_id), format, session_factory
+        )
+    filename = f"attendance_{start_date.isoformat()}_{end_date.isoformat()}.{format}"
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/attendance/stream")
+async def stream_attendance(
+    attendance_date: date = Query(..., description="Date whose roster changes to receive"),
+):
+    """
+    Server-Sent Events with the changes to the roster of one date (see feed.py).
+    Load the roster after the ready event; later marks, new and deleted
+    employees arrive as events instead of re-fetching the roster.
+    """
+    return StreamingResponse(
+        attendance_feed.stream(attendance_date.isoformat()),
+        media_type="text/event-stream",
+        # No caching, and no buffering in nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/attendance/summary", response_model=schemas.AttendanceSummary, response_model_exclude_none=True)
+@db_route
+def get_attendance_summary(
+    start_date: date = Query(..., description="First date of the period (inclusive)"),
+    end_date: date = Query(..., description="Last date of the period (inclusive)"),
+    group_by: str = Query("employee", pattern="^(employee|department)$", description="employee or department"),
+    department: Optional[str] = Query(None, description="Filter by department"),
+    employee_id: Optional[str] = Query(None, description="Filter by employee UUID"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Present/absent counts and attendance rate per employee or department over a period.
+    Whole months are read from the monthly rollups; only partial months touch raw rows.
+    With bitmap storage every month is one bitmap row per employee.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    try:
+        summarize = bitmaps.summarize if bitmaps.ENABLED else rollups.summarize
+        rows = summarize(db, start_date, end_date, group_by, department, employee_id)
+        return {"start_date": start_date, "end_date": end_date, "group_by": group_by, "rows": rows}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to summarize attendance: {str(e)}"
+        )
+
+
+def _roster_parts(attendance_date: date) -> list[tuple]:
+    """What the roster for attendance_date reads, for conditional.validators"""
+    employees = (models.Employee.updated_at, models.Employee.deleted_at.is_(None))
+    if bitmaps.ENABLED:
+        bitmap = models.AttendanceBitmap
+        return [employees, (bitmap.updated_at, bitmap.month == rollups.month_start(attendance_date))]
+    attendance = models.Attendance
+    return [employees, (attendance.updated_at, attendance.attendance_date == attendance_date)]
+
+
 @router.get("/attendance/employees-with-attendance", response_model=List[schemas.EmployeeWithAttendance])
+@db_route
 def get_employees_with_attendance(
+    request: Request,
     attendance_date: date = Query(..., description="Date to get attendance for"),
-    db: Session = Depends(get_db)
+    # Cached rosters are read from the primary, so a lagging replica is never cached
+    db: Session = Depends(get_db if roster_cache is not None else get_read_db)
 ):
     """
     Get all employees with their attendance status for a specific date.
     This matches the frontend's requirement for the attendance management page.
+    The serialized roster is cached per date until an employee or attendance write,
+    and answers 304 when the client's ETag is still current (see conditional.py).
     """
+    try:
+        validators = conditional.validators(request, db, *_roster_parts(attendance_date))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch employees with attendance: {str(e)}"
+        )
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = attendance_date.isoformat()
+    if roster_cache is not None:
+        cached = roster_cache.get(cache_key)
+        if cached is not None:
+            return Response(
+                content=cached, media_type="application/json", headers={**validators.headers, "X-Cache": "HIT"}
+            )
+        token = roster_cache.token()
+
     try:
         # Get all employees
-        employees = db.query(models.Employee).order_by(models.Employee.full_name.asc()).all()
-        
-        # Get attendance for the specified date
-        attendance_records = db.query(models.Attendance).filter(
-            models.Attendance.attendance_date == attendance_date
+        employees = db.query(*schema_columns(models.Employee, schemas.EmployeeResponse)).filter(
+            models.Employee.deleted_at.is_(None)
+        ).order_by(
+            models.Employee.full_name.asc()
         ).all()
         
-        # Create a map of employee_id -> attendance records
-        attendance_map = {}
-        for att in attendance_records:
-            if att.employee_id not in attendance_map:
-                attendance_map[att.employee_id] = []
-            attendance_map[att.employee_id].append(att)
+        # Get attendance for the specified date
+        if bitmaps.ENABLED:
+            attendance_map = {
+                employee_id: object_dicts(records, ATTENDANCE_FIELDS)
+                for employee_id, records in bitmaps.records_on(db, attendance_date).items()
+            }
+        else:
+            attendance_records = db.query(*schema_columns(models.Attendance, schemas.AttendanceResponse)).filter(
+                models.Attendance.attendance_date == attendance_date
+            ).all()
+            
+            # Create a map of employee_id -> attendance records
+            attendance_map = {}
+            for att in row_dicts(attendance_records, ATTENDANCE_FIELDS):
+                if att["employee_id"] not in attendance_map:
+                    attendance_map[att["employee_id"]] = []
+                attendance_map[att["employee_id"]].append(att)
         
         # Combine employees with their attendance
-        result = []
-        for emp in employees:
-            emp_dict = {
-                "id": emp.id,
-                "employee_id": emp.employee_id,
-                "full_name": emp.full_name,
-                "email": emp.email,
-                "department": emp.department,
-                "created_at": emp.created_at,
-                "updated_at": emp.updated_at,
-                "attendance": attendance_map.get(emp.id, [])
-            }
-            result.append(emp_dict)
+        result = row_dicts(employees, EMPLOYEE_FIELDS)
+        for emp in result:
+            emp["attendance"] = attendance_map.get(emp["id"], [])
         
-        return result
+        content = dumps(result)
+        if roster_cache is None:
+            return Response(content=content, media_type="application/json", headers=validators.headers)
+        roster_cache.set(cache_key, content, token)
+        return Response(
+            content=content, media_type="application/json", headers={**validators.headers, "X-Cache": "MISS"}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -89,42 +261,22 @@ def get_employees_with_attendance(
         )
 
 
-@router.post("/attendance", response_model=List[schemas.AttendanceResponse], status_code=status.HTTP_201_CREATED)
-def create_attendance(attendance: schemas.AttendanceCreate, db: Session = Depends(get_db)):
-    """Create a single attendance record"""
+def _mark_attendance(db: Session, attendance: schemas.AttendanceCreate) -> dict:
+    """Write one attendance mark in its own transaction; returns the stored record"""
     try:
-        # Verify employee exists
-        employee = db.query(models.Employee).filter(models.Employee.id == attendance.employee_id).first()
-        if not employee:
+        records, skipped = upsert_attendance(db, [attendance])
+        if skipped:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Employee not found"
             )
-        
-        # Check if attendance already exists for this employee and date
-        existing = db.query(models.Attendance).filter(
-            models.Attendance.employee_id == attendance.employee_id,
-            models.Attendance.attendance_date == attendance.attendance_date
-        ).first()
-        
-        if existing:
-            # Update existing record
-            existing.status = attendance.status
-            db.commit()
-            db.refresh(existing)
-            return [existing]
-        else:
-            # Create new record
-            db_attendance = models.Attendance(
-                employee_id=attendance.employee_id,
-                attendance_date=attendance.attendance_date,
-                status=attendance.status
-            )
-            db.add(db_attendance)
-            db.commit()
-            db.refresh(db_attendance)
-            return [db_attendance]
+        db.commit()
+        invalidate_roster(attendance.attendance_date)
+        stored = object_dicts(records, ATTENDANCE_FIELDS)
+        publish_attendance(stored)
+        return stored[0]
     except HTTPException:
+        db.rollback()
         raise
     except IntegrityError as e:
         db.rollback()
@@ -140,11 +292,86 @@ def create_attendance(attendance: schemas.AttendanceCreate, db: Session = Depend
         )
 
 
-@router.post("/attendance/bulk", response_model=List[schemas.AttendanceResponse], status_code=status.HTTP_201_CREATED)
+def _mark_attendance_batch(db: Session, marks: list) -> list:
+    """
+    Write coalesced single marks in one transaction. Returns each mark's
+    stored record, or the HTTPException its caller gets. When the
+    transaction fails, every mark is retried on its own, so one bad mark
+    fails only its own caller.
+    """
+    try:
+        records, skipped = upsert_attendance(db, marks)
+        db.commit()
+    except Exception:
+        db.rollback()
+        outcomes = []
+        for mark in marks:
+            try:
+                outcomes.append(_mark_attendance(db, mark))
+            except HTTPException as e:
+                outcomes.append(e)
+        return outcomes
+    invalidate_roster(*(mark.attendance_date for mark in marks))
+    publish_attendance(object_dicts(records, ATTENDANCE_FIELDS))
+
+    stored = {(record.employee_id, record.attendance_date): record for record in records}
+    missing = {skip.index for skip in skipped if skip.reason == SKIP_EMPLOYEE_NOT_FOUND}
+    outcomes = []
+    for index, mark in enumerate(marks):
+        if index in missing:
+            outcomes.append(HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found"))
+            continue
+        record = object_dicts([stored[(mark.employee_id, mark.attendance_date)]], ATTENDANCE_FIELDS)[0]
+        # A mark superseded by a later one in the batch answers as if it had
+        # been written just before it
+        record["status"] = mark.status
+        outcomes.append(record)
+    return outcomes
+
+
+attendance_writer = WriteCoalescer(
+    "attendance", _mark_attendance_batch, ATTENDANCE_COALESCE_WINDOW_MS, ATTENDANCE_COALESCE_MAX_BATCH,
+) if ATTENDANCE_COALESCE else None
+
+
+@router.post("/attendance", response_model=List[schemas.AttendanceResponse], status_code=status.HTTP_201_CREATED)
+async def create_attendance(
+    attendance: schemas.AttendanceCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="Retries with the same key get the first response back"),
+    db: Session = Depends(get_db)
+):
+    """
+    Create or update a single attendance record.
+    With ATTENDANCE_COALESCE on, marks arriving together are written in one
+    transaction (see coalesce.py); each caller still gets its own record or error.
+    """
+    async def mark():
+        try:
+            if attendance_writer is not None:
+                record = await attendance_writer.submit(attendance)
+            else:
+                record = await run_db(db, _mark_attendance, attendance)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to create attendance: {str(e)}"
+            )
+        return json_response([record], status_code=status.HTTP_201_CREATED)
+
+    return await idempotency_store.run(
+        idempotency_key, "POST /api/attendance", attendance.model_dump_json().encode(), mark
+    )
+
+
+@router.post("/attendance/bulk", response_model=schemas.AttendanceBulkResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def bulk_create_attendance(attendance_data: schemas.AttendanceBulkCreate, db: Session = Depends(get_db)):
     """
     Create or update multiple attendance records (upsert).
     This matches the frontend's requirement for bulk marking attendance.
+    Records that cannot be written are returned in `skipped` with a reason.
     """
     if not attendance_data.records:
         raise HTTPException(
@@ -153,41 +380,11 @@ def bulk_create_attendance(attendance_data: schemas.AttendanceBulkCreate, db: Se
         )
     
     try:
-        created_records = []
-        
-        for record in attendance_data.records:
-            # Verify employee exists
-            employee = db.query(models.Employee).filter(models.Employee.id == record.employee_id).first()
-            if not employee:
-                continue  # Skip invalid employee IDs
-            
-            # Check if attendance already exists
-            existing = db.query(models.Attendance).filter(
-                models.Attendance.employee_id == record.employee_id,
-                models.Attendance.attendance_date == record.attendance_date
-            ).first()
-            
-            if existing:
-                # Update existing record
-                existing.status = record.status
-                created_records.append(existing)
-            else:
-                # Create new record
-                db_attendance = models.Attendance(
-                    employee_id=record.employee_id,
-                    attendance_date=record.attendance_date,
-                    status=record.status
-                )
-                db.add(db_attendance)
-                created_records.append(db_attendance)
-        
+        records, skipped = upsert_attendance(db, attendance_data.records)
         db.commit()
-        
-        # Refresh all records
-        for record in created_records:
-            db.refresh(record)
-        
-        return created_records
+        invalidate_roster(*(record.attendance_date for record in records))
+        publish_attendance(object_dicts(records, ATTENDANCE_FIELDS))
+        return {"records": records, "skipped": skipped}
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -195,3 +392,27 @@ def bulk_create_attendance(attendance_data: schemas.AttendanceBulkCreate, db: Se
             detail=f"Failed to create attendance records: {str(e)}"
         )
 
+
+@router.post("/attendance/mark-all", response_model=schemas.AttendanceMarkAllResponse)
+@db_route
+def mark_all_attendance(attendance_data: schemas.AttendanceMarkAll, db: Session = Depends(get_db)):
+    """
+    Mark every employee (or every employee of one department) with one
+    status on one date, except the employees listed in except_ids.
+    The server selects the employees itself: the payload stays the same size
+    whatever the roster's.
+    """
+    try:
+        marked = mark_all(db, attendance_data.attendance_date, attendance_data.status, attendance_data.department, attendance_data.except_ids)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mark attendance: {str(e)}"
+        )
+    invalidate_roster(attendance_data.attendance_date)
+    if marked:
+        # Subscribers reload the day rather than receive every changed record
+        publish_resync(attendance_data.attendance_date)
+    return json_response({"attendance_date": attendance_data.attendance_date, "status": attendance_data.status, "marked": marked})
@@ -1,38 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy import insert, or_, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
-import sys
-from pathlib import Path
+from typing import List, Optional
 
-# Add parent directory to path for imports
-sys.path.append(str(Path(__file__).parent.parent))
-
-from database import get_db
+from cache import invalidate_roster
+from database import db_route, get_db, run_db
+from employee_import import DEFAULT_BATCH_SIZE, EmployeeImporter, ImportParser, format_from_content_type
+from feed import publish_employee_added, publish_employee_deleted, publish_resync
+from pagination import InvalidCursor, apply_keyset, paginate
+from purge import PURGE_IN_BACKGROUND, purger, soft_delete
+from replicas import get_read_db
+from serialization import field_names, json_response, row_dicts, schema_columns
+import conditional
 import models
 import schemas
+import search
 
 router = APIRouter()
 
+EMPLOYEE_FIELDS = field_names(schemas.EmployeeResponse)
+
+# Sort keys for listing; each is non-null, and ties are broken by id
+ORDER_COLUMNS = {
+    "created_at": models.Employee.created_at,
+    "full_name": models.Employee.full_name,
+    "employee_id": models.Employee.employee_id,
+}
 
-@router.get("/employees", response_model=List[schemas.EmployeeResponse])
+
+@router.get("/employees", response_model=schemas.EmployeePage)
+@db_route
 def get_employees(
-    order_by: str = "created_at",
+    request: Request,
+    order_by: str = Query("created_at", pattern="^(created_at|full_name|employee_id)$", description="created_at, full_name or employee_id"),
     order: str = "desc",
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of employees to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Get all employees with optional ordering.
+    Get employees with optional ordering, one page at a time.
     - order_by: Field to order by (created_at, full_name, employee_id)
     - order: asc or desc
+    - limit / cursor: keyset pagination; follow next_cursor until it is null
+    Rows are selected as tuples and encoded directly (see serialization.py).
+    Answers 304 when the client's ETag is still current (see conditional.py).
     """
     try:
-        order_column = getattr(models.Employee, order_by, models.Employee.created_at)
-        if order.lower() == "asc":
-            employees = db.query(models.Employee).order_by(order_column.asc()).all()
-        else:
-            employees = db.query(models.Employee).order_by(order_column.desc()).all()
-        return employees
+        validators = conditional.validators(
+            request, db, (models.Employee.updated_at, models.Employee.deleted_at.is_(None))
+        )
+        if validators.matches(request):
+            return validators.not_modified()
+        order_column = ORDER_COLUMNS[order_by]
+        query = apply_keyset(
+            db.query(*schema_columns(models.Employee, schemas.EmployeeResponse)).filter(
+                models.Employee.deleted_at.is_(None)
+            ),
+            models.Employee,
+            order_column,
+            descending=order.lower() != "asc",
+            cursor=cursor,
+            key=order_column.key,
+        )
+        employees, next_cursor = paginate(query, order_column.key, limit)
+        return json_response(
+            {"items": row_dicts(employees, EMPLOYEE_FIELDS), "next_cursor": next_cursor},
+            headers=validators.headers,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -40,10 +81,38 @@ def get_employees(
         )
 
 
+@router.get("/employees/search", response_model=List[schemas.EmployeeResponse])
+@db_route
+def search_employees(
+    q: str = Query(..., min_length=1, max_length=100, description="Text to find in employee ID, name, email or department"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of employees to return"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search employees by prefix or substring of employee ID, name, email or department.
+    Best matches first: exact employee ID or email, then prefixes, then a word
+    of the name, then department, then any substring (see search.py).
+    """
+    query = q.strip()
+    if not query:
+        return json_response([])
+    try:
+        employees = search.search(db, query, schema_columns(models.Employee, schemas.EmployeeResponse), limit)
+        return json_response(row_dicts(employees, EMPLOYEE_FIELDS))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search employees: {str(e)}"
+        )
+
+
 @router.get("/employees/{employee_id}", response_model=schemas.EmployeeResponse)
-def get_employee(employee_id: str, db: Session = Depends(get_db)):
+@db_route
+def get_employee(employee_id: str, db: Session = Depends(get_read_db)):
     """Get a single employee by ID"""
-    employee = db.query(models.Employee).filter(models.Employee.id == employee_id).first()
+    employee = db.query(models.Employee).filter(
+        models.Employee.id == employee_id, models.Employee.deleted_at.is_(None)
+    ).first()
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,39 +122,41 @@ def get_employee(employee_id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/employees", response_model=schemas.EmployeeResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
-    """Create a new employee"""
+    """Create a new employee: one SELECT for both uniqueness checks, then INSERT ... RETURNING"""
     try:
-        # Check for duplicate employee_id
-        existing_employee_id = db.query(models.Employee).filter(
-            models.Employee.employee_id == employee.employee_id.strip()
-        ).first()
-        if existing_employee_id:
+        values = employee.normalized()
+
+        # Check for a live duplicate employee_id or email in one query; a
+        # deleted employee awaiting the purge does not hold either
+        existing = db.execute(
+            select(models.Employee.employee_id, models.Employee.email).where(or_(
+                models.Employee.employee_id == values["employee_id"],
+                models.Employee.email == values["email"],
+            ), models.Employee.deleted_at.is_(None)).limit(2)
+        ).all()
+        if any(row.employee_id == values["employee_id"] for row in existing):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="An employee with this Employee ID already exists"
             )
-
-        # Check for duplicate email
-        existing_email = db.query(models.Employee).filter(
-            models.Employee.email == employee.email.lower().strip()
-        ).first()
-        if existing_email:
+        if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="An employee with this email already exists"
             )
 
-        db_employee = models.Employee(
-            employee_id=employee.employee_id.strip(),
-            full_name=employee.full_name.strip(),
-            email=employee.email.lower().strip(),
-            department=employee.department.strip()
-        )
-        db.add(db_employee)
+        # RETURNING hands back the server-side timestamps without a refresh
+        created = row_dicts(db.execute(
+            insert(models.Employee).values(**values).returning(
+                *schema_columns(models.Employee, schemas.EmployeeResponse)
+            )
+        ), EMPLOYEE_FIELDS)[0]
         db.commit()
-        db.refresh(db_employee)
-        return db_employee
+        invalidate_roster()
+        publish_employee_added(created)
+        return json_response(created, status_code=status.HTTP_201_CREATED)
     except HTTPException:
         raise
     except IntegrityError as e:
@@ -113,24 +184,93 @@ def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_
         )
 
 
-@router.delete("/employees/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_employee(employee_id: str, db: Session = Depends(get_db)):
-    """Delete an employee (cascades to attendance records)"""
-    employee = db.query(models.Employee).filter(models.Employee.id == employee_id).first()
-    if not employee:
+@router.post("/employees/import", response_model=schemas.EmployeeImportReport)
+async def import_employees(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="csv or ndjson; defaults from Content-Type"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Employees inserted per batch"),
+    db: Session = Depends(get_db)
+):
+    """
+    Import employees from a CSV or NDJSON request body.
+    The body is parsed as it streams in and inserted in batches; every rejected
+    row is reported with its record number and the reason.
+    """
+    fmt = format or format_from_content_type(request.headers.get("content-type"))
+    if fmt is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Employee not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass format=csv or format=ndjson, or send Content-Type text/csv or application/x-ndjson"
         )
-    
+
+    parser = ImportParser(fmt)
+    importer = EmployeeImporter(batch_size)
+    try:
+        async for chunk in request.stream():
+            for row, record in parser.feed(chunk):
+                if importer.add(row, record):
+                    await run_db(db, importer.flush)
+        for row, record in parser.close():
+            importer.add(row, record)
+        await run_db(db, importer.flush)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Import stopped after {importer.inserted} employees: {str(e)}"
+        )
+    finally:
+        if importer.inserted:
+            publish_resync()
+    return importer.report()
+
+
+def _delete_employees(db: Session, *conditions) -> list[str]:
+    """Soft-delete the matching employees and commit; returns their ids"""
     try:
-        db.delete(employee)
+        employee_ids = soft_delete(db, *conditions)
         db.commit()
-        return None
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete employee: {str(e)}"
+            detail=f"Failed to delete employees: {str(e)}"
         )
+    if employee_ids:
+        invalidate_roster()
+    return employee_ids
+
 
+@router.delete("/employees/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_employee(employee_id: str, db: Session = Depends(get_db)):
+    """
+    Delete an employee. They disappear from every endpoint at once; their
+    attendance records are purged in the background (see purge.py).
+    """
+    if not await run_db(db, _delete_employees, models.Employee.id == employee_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Employee not found"
+        )
+    publish_employee_deleted(employee_id)
+    if PURGE_IN_BACKGROUND:
+        purger.wake()
+    return None
+
+
+@router.post("/employees/bulk-delete", response_model=schemas.EmployeeBulkDeleteResponse)
+async def bulk_delete_employees(selection: schemas.EmployeeBulkDelete, db: Session = Depends(get_db)):
+    """
+    Delete every employee of a department and/or a list of employees by UUID
+    in one transaction, like DELETE /employees/{id} for each of them.
+    """
+    conditions = []
+    if selection.department is not None:
+        conditions.append(models.Employee.department == selection.department)
+    if selection.ids is not None:
+        conditions.append(models.Employee.id.in_(selection.ids))
+    employee_ids = await run_db(db, _delete_employees, *conditions)
+    if employee_ids:
+        publish_resync()
+        if PURGE_IN_BACKGROUND:
+            purger.wake()
+    return {"deleted": len(employee_ids), "ids": employee_ids}
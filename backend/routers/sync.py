@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from database import db_route, get_db
+from serialization import json_response
+from sync import InvalidToken, changes
+import schemas
+
+router = APIRouter()
+
+
+@router.get("/sync", response_model=schemas.SyncChanges)
+@db_route
+def sync_changes(
+    token: Optional[str] = Query(None, description="next_token from the previous sync; omit to start from scratch"),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of changes per kind to return"),
+    # Always the primary: a replica lagging past the settle window would let the token skip rows
+    db: Session = Depends(get_db)
+):
+    """
+    Employees and attendance changed since token, and tombstones for
+    employees deleted since (their attendance is gone with them).
+    Repeat with next_token while has_more is true; see sync.py.
+    """
+    try:
+        return json_response(changes(db, token, limit))
+    except InvalidToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read changes: {str(e)}"
+        )
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Simple script to run the FastAPI server
+Simple script to run the FastAPI server with auto-reload, for development.
+For production, use serve.py.
 """
 import uvicorn
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from typing import Optional
 from datetime import date, datetime
 
@@ -12,7 +12,14 @@ class EmployeeBase(BaseModel):
 
 
 class EmployeeCreate(EmployeeBase):
-    pass
+    def normalized(self) -> dict:
+        """Field values as stored: trimmed, with the email lower-cased"""
+        return {
+            "employee_id": self.employee_id.strip(),
+            "full_name": self.full_name.strip(),
+            "email": self.email.lower().strip(),
+            "department": self.department.strip(),
+        }
 
 
 class EmployeeUpdate(BaseModel):
@@ -22,6 +29,19 @@ class EmployeeUpdate(BaseModel):
     department: Optional[str] = Field(None, min_length=1)
 
 
+class EmployeeImportError(BaseModel):
+    row: int = Field(..., description="1-based record number in the file, not counting the CSV header")
+    employee_id: Optional[str] = None
+    error: str
+
+
+class EmployeeImportReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[EmployeeImportError]
+    errors_truncated: bool = Field(False, description="True when more errors occurred than are listed")
+
+
 class EmployeeResponse(EmployeeBase):
     id: str
     created_at: datetime
@@ -62,6 +82,95 @@ class AttendanceResponse(AttendanceBase):
         from_attributes = True
 
 
+class EmployeePage(BaseModel):
+    items: list[EmployeeResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; null on the last page")
+
+
+class AttendancePage(BaseModel):
+    items: list[AttendanceResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; null on the last page")
+
+
+class EmployeeBulkDelete(BaseModel):
+    department: Optional[str] = Field(None, min_length=1, description="Delete every employee of this department")
+    ids: Optional[list[str]] = Field(None, min_length=1, max_length=10000, description="Delete these employees (UUIDs)")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if self.department is None and self.ids is None:
+            raise ValueError("Pass department, ids or both")
+        return self
+
+
+class EmployeeBulkDeleteResponse(BaseModel):
+    deleted: int
+    ids: list[str] = Field(..., description="UUIDs of the employees deleted")
+
+
 class EmployeeWithAttendance(EmployeeResponse):
     attendance: list[AttendanceResponse] = []
 
+
+
+class AttendanceBulkSkipped(BaseModel):
+    index: int = Field(..., description="Position of the record in the request payload")
+    employee_id: str
+    attendance_date: date
+    reason: str
+
+
+class AttendanceBulkResponse(BaseModel):
+    records: list[AttendanceResponse]
+    skipped: list[AttendanceBulkSkipped] = []
+
+
+class AttendanceMarkAll(BaseModel):
+    attendance_date: date
+    status: str = Field(..., description="Must be 'Present' or 'Absent'")
+    department: Optional[str] = Field(None, min_length=1, description="Only mark employees of this department")
+    except_ids: list[str] = Field([], max_length=10000, description="Employees (UUIDs) to leave unchanged")
+
+    @field_validator('status')
+    @classmethod
+    def validate_status(cls, v):
+        if v not in ['Present', 'Absent']:
+            raise ValueError("Status must be 'Present' or 'Absent'")
+        return v
+
+
+class AttendanceMarkAllResponse(BaseModel):
+    attendance_date: date
+    status: str
+    marked: int = Field(..., description="Employees whose attendance was written or changed; marks that already matched are not counted")
+
+
+class AttendanceSummaryRow(BaseModel):
+    id: Optional[str] = Field(None, description="Employee UUID (group_by=employee)")
+    employee_id: Optional[str] = Field(None, description="Employee ID (group_by=employee)")
+    full_name: Optional[str] = Field(None, description="Employee name (group_by=employee)")
+    department: str
+    present: int
+    absent: int
+    attendance_rate: float = Field(..., description="present / (present + absent)")
+
+
+class AttendanceSummary(BaseModel):
+    start_date: date
+    end_date: date
+    group_by: str
+    rows: list[AttendanceSummaryRow]
+
+
+class Tombstone(BaseModel):
+    table: str = Field(..., description="Table the row was deleted from")
+    id: str
+    deleted_at: datetime
+
+
+class SyncChanges(BaseModel):
+    employees: list[EmployeeResponse]
+    attendance: list[AttendanceResponse]
+    deleted: list[Tombstone]
+    next_token: str = Field(..., description="Pass as `token` on the next sync")
+    has_more: bool = Field(..., description="A limit was reached; sync again with next_token right away")
@@ -0,0 +1,186 @@
+"""
+Employee search across employee_id, full_name, email and department.
+
+Matches are looked up through indexes, so a search reads a few index pages
+instead of the whole employees table:
+
+- SQLite: an FTS5 table (employees_search) with the trigram tokenizer, kept
+  in sync with employees by triggers, so every write path (the API, imports,
+  deletes cascading from anywhere) updates it in the same transaction
+- PostgreSQL: pg_trgm GIN indexes on each column, which serve ILIKE
+
+Results are ranked in tiers: exact employee ID or email, then a prefix of
+the employee ID, name or email, then a word of the name, then a department
+prefix, then any substring. Each tier is its own query, limited to the rows
+still needed, so a common term like a department name stops after the first
+page of matches instead of ranking thousands of them. Within a tier rows
+come in index order. Every tier leaves out deleted employees, which stay in
+the index until the purge removes their row.
+
+Trigram indexes need at least three characters. Shorter queries match
+prefixes only (a single letter is a substring of nearly every employee) and
+scan the table, each tier stopping at the limit.
+"""
+import logging
+
+from sqlalchemy import column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ["employee_id", "full_name", "email", "department"]
+MIN_INDEXED_LENGTH = 3
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS employees_search USING fts5("
+    "id UNINDEXED, employee_id, full_name, email, department, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS employees_search_insert AFTER INSERT ON employees BEGIN
+        INSERT INTO employees_search (id, employee_id, full_name, email, department)
+        VALUES (new.id, new.employee_id, new.full_name, new.email, new.department);
+    END""",
+    # The id column is not indexed; the unique email (always 3+ characters)
+    # finds the row through the trigram index instead of a full scan
+    """CREATE TRIGGER IF NOT EXISTS employees_search_delete AFTER DELETE ON employees BEGIN
+        DELETE FROM employees_search WHERE rowid IN (
+            SELECT rowid FROM employees_search
+            WHERE employees_search MATCH '{email} : "' || replace(old.email, '"', '""') || '"'
+            AND id = old.id
+        );
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS employees_search_update
+    AFTER UPDATE OF id, employee_id, full_name, email, department ON employees BEGIN
+        DELETE FROM employees_search WHERE rowid IN (
+            SELECT rowid FROM employees_search
+            WHERE employees_search MATCH '{email} : "' || replace(old.email, '"', '""') || '"'
+            AND id = old.id
+        );
+        INSERT INTO employees_search (id, employee_id, full_name, email, department)
+        VALUES (new.id, new.employee_id, new.full_name, new.email, new.department);
+    END""",
+]
+
+POSTGRES_DDL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f"CREATE INDEX IF NOT EXISTS idx_employees_{name}_trgm ON employees USING gin ({name} gin_trgm_ops)"
+    for name in SEARCH_COLUMNS
+]
+
+EMPLOYEES_SEARCH = table("employees_search", column("id"))
+
+# SQLite engines (by URL) whose database has the FTS5 table
+_fts_urls = set()
+
+
+def create_index(connection):
+    """Create the search index if missing; on SQLite a new index is filled from employees"""
+    if connection.dialect.name == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+        return
+    exists = connection.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'employees_search'"))
+    try:
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+    except OperationalError as e:
+        # SQLite older than 3.34 or built without FTS5
+        logger.warning("Employee search will scan the employees table: %s", e.orig)
+        return
+    if not exists:
+        connection.execute(text(
+            "INSERT INTO employees_search (id, employee_id, full_name, email, department) "
+            "SELECT id, employee_id, full_name, email, department FROM employees"
+        ))
+    _fts_urls.add(str(connection.engine.url))
+
+
+def _has_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    url = str(bind.url)
+    if url not in _fts_urls and bind.dialect.name == "sqlite":
+        if db.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'employees_search'")):
+            _fts_urls.add(url)
+    return url in _fts_urls
+
+
+def _fts_tiers(query: str) -> list:
+    """Tier queries as FTS5 MATCH expressions; ^ anchors a phrase at the start of the column"""
+    phrase = '"' + query.replace('"', '""') + '"'
+    word = '" ' + query.replace('"', '""') + '"'
+    matches = [
+        "{employee_id full_name email} : ^ " + phrase,
+        "{full_name} : " + word,
+        "{department} : ^ " + phrase,
+        phrase,
+    ]
+    # Deleted employees stay in the index until the purge removes their row;
+    # the join by primary key leaves them out before they count toward the limit
+    employee = models.Employee
+    return [
+        select(EMPLOYEES_SEARCH.c.id)
+        .join(employee, employee.id == EMPLOYEES_SEARCH.c.id)
+        .where(text("employees_search MATCH :match").bindparams(match=match), employee.deleted_at.is_(None))
+        for match in matches
+    ]
+
+
+def _like(db: Session, column, pattern: str):
+    """Case-insensitive LIKE. SQLite's LIKE already ignores ASCII case, and the
+    lower() calls of ilike() make a scan about three times slower there."""
+    if db.get_bind().dialect.name == "sqlite":
+        return column.like(pattern)
+    return column.ilike(pattern)
+
+
+def _like_tiers(db: Session, query: str) -> list:
+    """Tier queries as (I)LIKE patterns on employees"""
+    employee = models.Employee
+    if any(char in query for char in "%_/"):
+        escaped = query.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+        def like(column, pattern):
+            return column.ilike(pattern.format(escaped), escape="/")
+    else:
+        def like(column, pattern):
+            return _like(db, column, pattern.format(query))
+
+    prefix_columns = [employee.employee_id, employee.full_name, employee.email]
+    predicates = [
+        or_(*(like(attr, "{}%") for attr in prefix_columns)),
+        like(employee.full_name, "% {}%"),
+        like(employee.department, "{}%"),
+    ]
+    if len(query) >= MIN_INDEXED_LENGTH:
+        predicates.append(or_(*(like(getattr(employee, name), "%{}%") for name in SEARCH_COLUMNS)))
+    return [select(employee.id).where(predicate, employee.deleted_at.is_(None)) for predicate in predicates]
+
+
+def search(db: Session, query: str, columns: list, limit: int) -> list:
+    """The best `limit` matches for query, as rows of the given columns (which must include id)"""
+    employee = models.Employee
+    # Exact matches are only sought among live employees, which the unique indexes cover
+    tiers = [select(employee.id).where(
+        or_(employee.employee_id == query, employee.email == query.lower()), employee.deleted_at.is_(None)
+    )]
+    if len(query) >= MIN_INDEXED_LENGTH and db.get_bind().dialect.name == "sqlite" and _has_fts(db):
+        tiers += _fts_tiers(query)
+    else:
+        tiers += _like_tiers(db, query)
+
+    # dict keeps the first (best) tier each id was found in
+    found = {}
+    for tier in tiers:
+        if len(found) >= limit:
+            break
+        # Rows found by earlier tiers come back again; fetch enough to skip them
+        for employee_id in db.scalars(tier.limit(limit + len(found))):
+            found.setdefault(employee_id, None)
+    ids = list(found)[:limit]
+    if not ids:
+        return []
+    rows = {
+        row.id: row
+        for row in db.execute(select(*columns).where(employee.id.in_(ids), employee.deleted_at.is_(None)))
+    }
+    return [rows[employee_id] for employee_id in ids if employee_id in rows]
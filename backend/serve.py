@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Production server: several uvicorn workers sharing one listening socket.
+
+Usage (from the backend directory):
+    python serve.py
+    python serve.py --workers 4 --port 8080
+
+- WEB_CONCURRENCY workers, by default one per CPU this process may use
+- uvloop and httptools (installed with uvicorn[standard]) when available
+- with more than one worker, the roster cache, the live feed and the
+  idempotency keys default to SQLite files shared by the workers
+- DB_MAX_CONNECTIONS, when set, is the PostgreSQL connection budget of the
+  whole server; each worker's pool gets an equal share of it
+- SIGTERM or Ctrl-C stops accepting connections and gives requests in
+  flight GRACEFUL_TIMEOUT_SECONDS to finish (open live-feed streams are
+  then closed); each worker closes its pooled connections on the way out
+
+Workers are spawned, not forked, so each builds its own engine; pools
+inherited through a fork (e.g. gunicorn --preload) are replaced in the child
+by database.py. For development with auto-reload, use run.py.
+"""
+import argparse
+import os
+import sys
+from importlib.util import find_spec
+
+import uvicorn
+
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def per_process_settings() -> list[str]:
+    """Settings that keep state in each worker's memory, which several workers do not share"""
+    return [
+        name for name in ("ROSTER_CACHE", "FEED_BACKEND", "IDEMPOTENCY_STORE")
+        if os.environ.get(name, "").lower() == "memory"
+    ]
+
+
+def pool_size(budget: int, workers: int) -> int:
+    """Connections each worker may hold so that workers together stay within budget"""
+    share = budget // workers
+    if share < 1:
+        raise SystemExit(f"DB_MAX_CONNECTIONS={budget} is less than one connection per worker ({workers} workers)")
+    return share
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_count())
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30")),
+        help="Seconds requests in flight get to finish on shutdown",
+    )
+    args = parser.parse_args()
+
+    # Workers inherit the environment, so settings made here reach database.py in each of them
+    budget = os.getenv("DB_MAX_CONNECTIONS")
+    if budget:
+        os.environ["DB_POOL_SIZE"] = str(pool_size(int(budget), args.workers))
+        os.environ["DB_MAX_OVERFLOW"] = "0"
+    if args.workers > 1:
+        # An in-process roster cache would miss invalidations made by the other workers
+        os.environ.setdefault("ROSTER_CACHE", "sqlite")
+        # Likewise live-feed subscribers would miss their writes, and idempotency
+        # keys would not be seen by them
+        os.environ.setdefault("FEED_BACKEND", "sqlite")
+        os.environ.setdefault("IDEMPOTENCY_STORE", "sqlite")
+        for name in per_process_settings():
+            print(
+                f"Warning: {name}=memory with {args.workers} workers; each worker only sees its own writes",
+                file=sys.stderr,
+            )
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
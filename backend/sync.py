@@ -0,0 +1,203 @@
+"""
+Delta sync: what changed since a token.
+
+GET /api/sync reads three change streams, each in (timestamp, key) order
+off an index, so a sync that finds ten changes reads ten rows:
+
+- employees by updated_at
+- attendance by updated_at; with ATTENDANCE_STORAGE=bitmap, the
+  employee-months whose bitmap changed, expanded into their records
+- tombstones by deleted_at, one per deleted employee
+
+Attendance rows get no tombstones of their own. An employees tombstone
+stands for every attendance record with that employee_id: the client drops
+them along with the employee, and the attendance stream leaves them out
+from the moment of the deletion. This keeps a deletion one row, however
+long the employee's history.
+
+The token holds each stream's position: the (timestamp, key) of the last
+row returned. updated_at is stamped when the statement runs (on PostgreSQL,
+when the transaction starts), so a row can commit after rows stamped later
+than it. Rows are therefore only returned once they are
+SYNC_SETTLE_SECONDS old, and a token never moves past a write that may
+still be in flight.
+"""
+import base64
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import String, select, tuple_, type_coerce
+from sqlalchemy.orm import Session
+
+from purge import not_deleted
+from serialization import field_names, object_dicts, row_dicts, schema_columns
+import bitmaps
+import models
+import schemas
+
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
+
+EMPLOYEE_FIELDS = field_names(schemas.EmployeeResponse)
+ATTENDANCE_FIELDS = field_names(schemas.AttendanceResponse)
+TOMBSTONE_FIELDS = field_names(schemas.Tombstone)
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class ChangeStream:
+    """One table's changes: what to select, the order to read it in, how to render it"""
+
+    def __init__(self, name: str, timestamp, keys: tuple, columns: list, render, where=None):
+        self.name = name
+        self.timestamp = timestamp
+        self.keys = keys
+        self.columns = columns
+        self.render = render
+        # Rows left out; deleted employees and their attendance are reported as tombstones
+        self.where = where
+
+
+def _bitmap_records(rows) -> list[dict]:
+    return object_dicts((record for row in rows for record in bitmaps.expand(row)), ATTENDANCE_FIELDS)
+
+
+def streams() -> list[ChangeStream]:
+    employees = ChangeStream(
+        "employees",
+        models.Employee.updated_at,
+        (models.Employee.id,),
+        schema_columns(models.Employee, schemas.EmployeeResponse),
+        lambda rows: row_dicts(rows, EMPLOYEE_FIELDS),
+        models.Employee.deleted_at.is_(None),
+    )
+    if bitmaps.ENABLED:
+        bitmap = models.AttendanceBitmap
+        attendance = ChangeStream(
+            "attendance",
+            bitmap.updated_at,
+            (bitmap.employee_id, bitmap.month),
+            [bitmap.employee_id, bitmap.month, bitmap.marked_mask, bitmap.present_mask,
+             bitmap.created_at, bitmap.updated_at],
+            _bitmap_records,
+            not_deleted(bitmap.employee_id),
+        )
+    else:
+        attendance = ChangeStream(
+            "attendance",
+            models.Attendance.updated_at,
+            (models.Attendance.id,),
+            schema_columns(models.Attendance, schemas.AttendanceResponse),
+            lambda rows: row_dicts(rows, ATTENDANCE_FIELDS),
+            not_deleted(models.Attendance.employee_id),
+        )
+    deleted = ChangeStream(
+        "deleted",
+        models.DeletedRecord.deleted_at,
+        (models.DeletedRecord.id,),
+        [models.DeletedRecord.table_name, models.DeletedRecord.record_id, models.DeletedRecord.deleted_at],
+        lambda rows: row_dicts(rows, TOMBSTONE_FIELDS),
+    )
+    return [employees, attendance, deleted]
+
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def sortable(db: Session, column):
+    # SQLite keeps timestamps as text, written both with and without
+    # microseconds; comparing the stored text keeps positions exact
+    return type_coerce(column, String) if _is_sqlite(db) else column
+
+
+def settled_before(db: Session):
+    moment = datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    # SQLite's CURRENT_TIMESTAMP is UTC text
+    return moment.strftime("%Y-%m-%d %H:%M:%S") if _is_sqlite(db) else moment
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def encode_token(positions: dict) -> str:
+    payload = {"storage": bitmaps.ATTENDANCE_STORAGE, **{
+        name: None if position is None else [_to_json(position[0]), [_to_json(key) for key in position[1]]]
+        for name, position in positions.items()
+    }}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_token(db: Session, token: str, change_streams: list[ChangeStream]) -> dict:
+    """Stream positions from a token made by encode_token"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if payload.get("storage") != bitmaps.ATTENDANCE_STORAGE:
+            raise InvalidToken("Attendance storage changed since this token was issued; sync from scratch")
+        positions = {}
+        for stream in change_streams:
+            position = payload[stream.name]
+            if position is None:
+                positions[stream.name] = None
+                continue
+            value, keys = position
+            if len(keys) != len(stream.keys):
+                raise InvalidToken("Invalid token")
+            if not _is_sqlite(db):
+                value = datetime.fromisoformat(value)
+            keys = [
+                column.type.python_type.fromisoformat(key) if column.type.python_type in (date, datetime) else key
+                for column, key in zip(stream.keys, keys)
+            ]
+            positions[stream.name] = (value, keys)
+        return positions
+    except InvalidToken:
+        raise
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidToken("Invalid token")
+
+
+def _read(db: Session, stream: ChangeStream, position: Optional[tuple], upper, limit: int):
+    """One page of a stream after position: (rendered rows, new position, more waiting)"""
+    timestamp = sortable(db, stream.timestamp)
+    key_labels = [f"sync_key{n}" for n in range(len(stream.keys))]
+    stmt = select(
+        *stream.columns,
+        timestamp.label("sync_timestamp"),
+        *(key.label(label) for key, label in zip(stream.keys, key_labels)),
+    ).where(timestamp < upper)
+    if stream.where is not None:
+        stmt = stmt.where(stream.where)
+    if position is not None:
+        value, keys = position
+        # A row-value comparison, which both databases turn into a seek on
+        # the (timestamp, key) index even when many rows share a timestamp
+        stmt = stmt.where(tuple_(timestamp, *stream.keys) > tuple_(value, *keys))
+    rows = db.execute(stmt.order_by(timestamp, *stream.keys).limit(limit + 1)).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last = rows[-1]._mapping
+        position = (last["sync_timestamp"], [last[label] for label in key_labels])
+    return stream.render(rows), position, more
+
+
+def changes(db: Session, token: Optional[str], limit: int) -> dict:
+    """Up to limit changes per stream after token, and the token to continue from"""
+    change_streams = streams()
+    positions = decode_token(db, token, change_streams) if token else {}
+    upper = settled_before(db)
+    result, next_positions, has_more = {}, {}, False
+    for stream in change_streams:
+        result[stream.name], next_positions[stream.name], more = _read(
+            db, stream, positions.get(stream.name), upper, limit
+        )
+        has_more = has_more or more
+    result["next_token"] = encode_token(next_positions)
+    result["has_more"] = has_more
+    return result
@@ -0,0 +1,153 @@
+"""
+Query-budget harness.
+
+Each test calls one endpoint against the seeded database at every size in
+SIZES while a listener on the engines from database.py records the SQL
+statements it sends. A test fails, listing the statements, when a call
+takes more queries than its budget or more queries with more employees (an
+N+1 pattern).
+
+Run from the backend directory:
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import os
+import re
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir.name}/test.db"
+# Count every query a request makes: no cached rosters, no background purge
+os.environ["ROSTER_CACHE"] = "off"
+os.environ["PURGE_IN_BACKGROUND"] = "false"
+os.environ["ATTENDANCE_COALESCE"] = "false"
+# Budgets are for the default row storage; bitmap storage reads differently
+os.environ["ATTENDANCE_STORAGE"] = "rows"
+# Every row counts as settled, so conditional GETs always run their validator queries
+os.environ["SYNC_SETTLE_SECONDS"] = "-3600"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, event, insert, select  # noqa: E402
+
+from benchmarks import datagen  # noqa: E402
+import database  # noqa: E402
+import models  # noqa: E402
+
+SIZES = (20, 200)
+DAYS = 14
+SEED = 42
+# Attendance for the employees added beyond SIZES[0] gets its own ids
+GROWTH_SEED = SEED + 1000
+
+# Multi-row VALUES and long IN lists, shortened so statements differing only in length group together
+_REPEATED_ROWS = re.compile(r"(\((?:\?, )*\?\))(?:, \1)+")
+_LONG_LISTS = re.compile(r"\?(?:, \?){2,}")
+
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    return _LONG_LISTS.sub("?, ?, ...", _REPEATED_ROWS.sub(r"\1, ...", statement))
+
+
+class QueryLog:
+    """Statements sent through the app's engines while the log is open"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(_shorten(statement))
+
+    def _engines(self):
+        engines = [database.get_engine()]
+        if database.DB_ASYNC:
+            engines.append(database.get_async_engine().sync_engine)
+        return engines
+
+    def __enter__(self):
+        for engine in self._engines():
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self._engines():
+            event.remove(engine, "before_cursor_execute", self._record)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def report(self) -> str:
+        """The statements, identical ones grouped with their count, most repeated first"""
+        return "\n".join(
+            f"  {count:>4} x {statement}" for statement, count in Counter(self.statements).most_common()
+        )
+
+
+def _seeded_employee_ids(db, count: int) -> list[str]:
+    return list(db.scalars(select(models.Employee.id).where(models.Employee.employee_id <= f"EMP{count:06d}")))
+
+
+def resize(employees: int):
+    """Grow or shrink the seeded employees (and their attendance) to the first `employees` of the dataset"""
+    with database.SessionLocal() as db:
+        current = len(_seeded_employee_ids(db, SIZES[-1]))
+        if employees > current:
+            added = datagen.employee_rows(employees, SEED)[current:]
+            db.execute(insert(models.Employee), added)
+            db.execute(insert(models.Attendance), list(
+                datagen.attendance_rows(added, datagen.workdays(DAYS), GROWTH_SEED + current)
+            ))
+        elif employees < current:
+            removed = select(models.Employee.id).where(models.Employee.employee_id > f"EMP{employees:06d}")
+            db.execute(delete(models.Attendance).where(models.Attendance.employee_id.in_(removed)))
+            db.execute(delete(models.Employee).where(models.Employee.employee_id > f"EMP{employees:06d}"))
+        db.commit()
+
+
+@pytest.fixture(scope="session")
+def client():
+    datagen.generate(SIZES[0], DAYS, SEED, log=lambda message: None)
+    from main import app
+    with TestClient(app) as test_client:
+        # Once-per-process checks (search.py's full-text probe) are not charged to a test
+        test_client.get("/api/employees/search", params={"q": "warm-up"})
+        yield test_client
+
+
+@pytest.fixture
+def measure(client):
+    """
+    measure(call, budget, setup=None): call(client, setup_result) at every
+    size, asserting it stays within budget queries and takes no more queries
+    at the largest size than at the smallest. setup(client) runs before each call, unmeasured.
+    """
+    def run(call, budget: int, setup=None):
+        logs = []
+        try:
+            for size in SIZES:
+                resize(size)
+                prepared = setup(client) if setup else None
+                with QueryLog() as log:
+                    response = call(client, prepared)
+                assert response.status_code < 400, response.text
+                logs.append(log)
+                assert len(log) <= budget, (
+                    f"{len(log)} queries with {size} employees, budget {budget}:\n{log.report()}"
+                )
+        finally:
+            resize(SIZES[0])
+        small, large = logs[0], logs[-1]
+        assert len(large) <= len(small), (
+            f"Query count grows with the data: {len(small)} with {SIZES[0]} employees, "
+            f"{len(large)} with {SIZES[-1]}:\n{large.report()}"
+        )
+        return logs
+    return run
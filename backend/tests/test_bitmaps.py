@@ -0,0 +1,145 @@
+"""Bitmap attendance storage against the same marks kept as rows (see bitmaps.py)"""
+import random
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database import Base
+import bitmaps
+import models
+import rollups
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A database of its own, so the bitmaps written here stay out of the API tests
+    engine = create_engine(f"sqlite:///{tmp_path}/bitmaps.db")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_employees(db, count: int) -> list[str]:
+    rows = [
+        {"id": str(uuid.uuid4()), "employee_id": f"BM{n:04d}", "full_name": f"Bitmap {n}",
+         "email": f"bm.{n}@example.com", "department": "Even" if n % 2 == 0 else "Odd"}
+        for n in range(count)
+    ]
+    db.execute(insert(models.Employee), rows)
+    return [row["id"] for row in rows]
+
+
+def random_marks(ids: list[str], first: date, last: date, seed: int = 7) -> dict:
+    """{(employee_id, date): status} for about two thirds of the days first..last"""
+    rng = random.Random(seed)
+    marks = {}
+    day = first
+    while day <= last:
+        for employee_id in ids:
+            if rng.random() < 0.66:
+                marks[(employee_id, day)] = rng.choice(["Present", "Absent"])
+        day += timedelta(days=1)
+    return marks
+
+
+def write(db, marks: dict):
+    bitmaps.write(db, [
+        models.Attendance(employee_id=employee_id, attendance_date=day, status=status)
+        for (employee_id, day), status in marks.items()
+    ])
+
+
+def stored(db) -> dict:
+    return {
+        (record.employee_id, record.attendance_date): record.status
+        for row in db.execute(select(models.AttendanceBitmap.__table__))
+        for record in bitmaps.expand(row)
+    }
+
+
+def test_popcount_counts_set_bits_in_sql(db):
+    rng = random.Random(1)
+    masks = [0, 1, 2, 3, 0x55555555 & 0x7FFFFFFF, 0x7FFFFFFF, 1 << 30] + [rng.getrandbits(31) for _ in range(50)]
+    for mask in masks:
+        assert db.scalar(select(bitmaps.popcount(literal(mask)))) == bin(mask).count("1"), mask
+
+
+def test_write_sets_and_overwrites_days(db):
+    [employee_id] = add_employees(db, 1)
+    first, last = date(2024, 1, 1), date(2024, 1, 31)
+    marks = {(employee_id, first): "Present", (employee_id, date(2024, 1, 5)): "Absent", (employee_id, last): "Present"}
+    write(db, marks)
+    assert stored(db) == marks
+    # Overwriting flips both ways and leaves the other days alone
+    changes = {(employee_id, first): "Absent", (employee_id, date(2024, 1, 5)): "Present"}
+    written = bitmaps.write(db, [
+        models.Attendance(employee_id=employee_id, attendance_date=day, status=status)
+        for (employee_id, day), status in changes.items()
+    ])
+    assert {key: record.status for key, record in written.items()} == changes
+    assert stored(db) == {**marks, **changes}
+    row = db.execute(select(models.AttendanceBitmap.__table__)).one()
+    assert row.marked_mask == 1 | 1 << 4 | 1 << 30
+    assert row.present_mask == 1 << 4 | 1 << 30
+
+
+def test_page_cursor_walks_across_months(db):
+    ids = add_employees(db, 3)
+    marks = random_marks(ids, date(2024, 1, 28), date(2024, 3, 2))
+    write(db, marks)
+    expected = sorted((day, employee_id) for employee_id, day in marks)
+
+    for filters in ({}, {"start_date": date(2024, 1, 30), "end_date": date(2024, 3, 1)}, {"employee_id": ids[1]}):
+        seen, cursor = [], None
+        while True:
+            records, cursor = bitmaps.page(db, limit=4, cursor=cursor, **filters)
+            seen += [(record.attendance_date, record.employee_id) for record in records]
+            assert all(marks[(record.employee_id, record.attendance_date)] == record.status for record in records)
+            if cursor is None:
+                break
+        assert seen == [
+            (day, employee_id) for day, employee_id in expected
+            if filters.get("start_date", date.min) <= day <= filters.get("end_date", date.max)
+            and filters.get("employee_id", employee_id) == employee_id
+        ], filters
+
+
+def test_summary_masks_partial_months(db):
+    ids = add_employees(db, 4)
+    marks = random_marks(ids, date(2024, 1, 1), date(2024, 4, 30))
+    write(db, marks)
+    # Starts and ends mid-month, with a whole month between
+    start, end = date(2024, 1, 17), date(2024, 3, 9)
+    counted = {}
+    for (employee_id, day), status in marks.items():
+        if start <= day <= end:
+            present, absent = counted.get(employee_id, (0, 0))
+            counted[employee_id] = (present + (status == "Present"), absent + (status == "Absent"))
+
+    rows = bitmaps.summarize(db, start, end)
+    assert {row["id"]: (row["present"], row["absent"]) for row in rows} == counted
+    by_department = {row["department"]: (row["present"], row["absent"]) for row in
+                     bitmaps.summarize(db, start, end, group_by="department")}
+    assert sum(present for present, _ in by_department.values()) == sum(p for p, _ in counted.values())
+    assert sum(absent for _, absent in by_department.values()) == sum(a for _, a in counted.values())
+
+
+def test_rows_to_bitmaps_and_back(db):
+    ids = add_employees(db, 5)
+    marks = random_marks(ids, date(2024, 1, 20), date(2024, 2, 29))
+    db.execute(insert(models.Attendance), [
+        {"id": str(uuid.uuid4()), "employee_id": employee_id, "attendance_date": day, "status": status}
+        for (employee_id, day), status in marks.items()
+    ])
+    months = {(employee_id, rollups.month_start(day)) for employee_id, day in marks}
+    assert bitmaps.rebuild_from_rows(db) == len(months)
+    assert stored(db) == marks
+
+    db.execute(delete(models.Attendance))
+    assert bitmaps.rebuild_rows(db) == len(marks)
+    rows = db.execute(select(models.Attendance.employee_id, models.Attendance.attendance_date, models.Attendance.status))
+    assert {(employee_id, day): status for employee_id, day, status in rows} == marks
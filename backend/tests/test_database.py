@@ -0,0 +1,22 @@
+"""Engine setup"""
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND
+
+
+def test_async_mode_opens_no_sync_pool(tmp_path):
+    # In a fresh process: this session's engines are already built
+    probe = (
+        "import database, models\n"
+        "from sqlalchemy import inspect\n"
+        "engine = database.get_async_engine()\n"
+        "assert database._engine is None, 'sync engine built'\n"
+        "assert [e for e in database._built_engines] == [engine], list(database._built_engines)\n"
+        "from sqlalchemy import create_engine\n"
+        "assert 'employees' in inspect(create_engine(database.DATABASE_URL)).get_table_names()\n"
+    )
+    env = {**os.environ, "DB_ASYNC": "true", "DB_AUTO_CREATE": "true", "DATABASE_URL": f"sqlite:///{tmp_path}/async.db"}
+    result = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,112 @@
+"""Employee endpoint behavior"""
+from sqlalchemy import select
+
+import database
+import models
+
+
+def test_list_rejects_unknown_order_by(client):
+    for order_by in ("deleted_at", "department", "updated_at", "nonsense"):
+        response = client.get("/api/employees", params={"order_by": order_by})
+        assert response.status_code == 422, response.text
+
+
+def test_list_orders_by_each_allowed_column(client):
+    for n in range(5):
+        response = client.post("/api/employees", json={
+            "employee_id": f"ORD{n}",
+            "full_name": f"Order Test {n}",
+            "email": f"order{n}@example.com",
+            "department": "Ordering",
+        })
+        assert response.status_code in (200, 201), response.text
+    for order_by in ("created_at", "full_name", "employee_id"):
+        response = client.get("/api/employees", params={"order_by": order_by, "order": "asc", "limit": 5})
+        assert response.status_code == 200, response.text
+        assert len(response.json()["items"]) == 5
+
+
+def _import_csv(client, lines: list[str]) -> dict:
+    body = "employee_id,full_name,email,department\r\n" + "".join(line + "\r\n" for line in lines)
+    response = client.post("/api/employees/import", params={"format": "csv"}, content=body.encode())
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _full_name(employee_id: str) -> str:
+    with database.SessionLocal() as db:
+        return db.scalar(select(models.Employee.full_name).where(models.Employee.employee_id == employee_id))
+
+
+def test_import_csv_with_a_stray_quote_reports_rows(client):
+    lines = [f"SQ{n:06d},Stray {n},stray.{n}@example.com,Quality" for n in range(300)]
+    # A literal quote inside an unquoted field, then malformed quoting
+    lines[10] = 'SQ000010,Bob "Bobby Smith,stray.10@example.com,Quality'
+    lines[20] = 'SQ000020,"Bad"x,stray.20@example.com,Quality'
+    report = _import_csv(client, lines)
+    assert (report["inserted"], report["failed"]) == (299, 1), report
+    assert report["errors"][0]["row"] == 21
+    assert "Invalid CSV" in report["errors"][0]["error"]
+    assert _full_name("SQ000010") == 'Bob "Bobby Smith'
+
+
+def test_import_csv_quoted_field_with_a_newline(client):
+    report = _import_csv(client, [
+        'NL000001,"Multi\r\nLine",nl.1@example.com,Quality',
+        "NL000002,After,nl.2@example.com,Quality",
+    ])
+    assert (report["inserted"], report["failed"]) == (2, 0), report
+    assert _full_name("NL000001") == "Multi\r\nLine"
+
+
+def _employee(employee_id: str) -> dict:
+    return {
+        "employee_id": employee_id, "full_name": "Recreated Employee",
+        "email": f"{employee_id.lower()}@example.com", "department": "Quality",
+    }
+
+
+def test_recreate_deleted_employee_before_purge(client):
+    # PURGE_IN_BACKGROUND is off here, so the deleted row stays until a purge
+    first = client.post("/api/employees", json=_employee("RC000001"))
+    assert first.status_code == 201, first.text
+    duplicate = client.post("/api/employees", json=_employee("RC000001"))
+    assert duplicate.status_code == 400
+    assert client.delete(f"/api/employees/{first.json()['id']}").status_code == 204
+
+    second = client.post("/api/employees", json=_employee("RC000001"))
+    assert second.status_code == 201, second.text
+    assert second.json()["id"] != first.json()["id"]
+    # The re-created employee holds the Employee ID and email again
+    assert client.post("/api/employees", json=_employee("RC000001")).status_code == 400
+
+
+def test_import_deleted_employee_before_purge(client):
+    created = client.post("/api/employees", json=_employee("RC000002"))
+    assert client.delete(f"/api/employees/{created.json()['id']}").status_code == 204
+
+    body = "employee_id,full_name,email,department\nRC000002,Recreated Employee,rc000002@example.com,Quality\n"
+    headers = {"Content-Type": "text/csv"}
+    report = client.post("/api/employees/import", content=body, headers=headers).json()
+    assert (report["inserted"], report["failed"]) == (1, 0), report
+    report = client.post("/api/employees/import", content=body, headers=headers).json()
+    assert (report["inserted"], report["failed"]) == (0, 1), report
+
+
+def test_search_skips_deleted_employees_before_the_limit(client):
+    # Deleted employees awaiting their purge must not use up the limit
+    for n in range(30):
+        client.post("/api/employees", json={
+            "employee_id": f"ZD{n:06d}", "full_name": f"Zed {n}",
+            "email": f"zd.{n}@example.com", "department": "Zyxology",
+        })
+    live = client.post("/api/employees", json={
+        "employee_id": "ZL000001", "full_name": "Live Zed",
+        "email": "zl.1@example.com", "department": "Zyxologists",
+    }).json()
+    deleted = client.post("/api/employees/bulk-delete", json={"department": "Zyxology"}).json()
+    assert len(deleted["ids"]) == 30, deleted
+    # Indexed (3+ characters) and prefix-only (shorter) searches
+    for q in ("Zyx", "Zy"):
+        found = client.get("/api/employees/search", params={"q": q, "limit": 10}).json()
+        assert [employee["id"] for employee in found] == [live["id"]], q
@@ -0,0 +1,27 @@
+"""Per-route request metrics (see metrics.py)"""
+import re
+
+
+def serialization(client, route: str) -> tuple[int, float]:
+    """Count and sum of the serialization histogram of GET route"""
+    text = client.get("/metrics").text
+    labels = re.escape(f'{{method="GET",route="{route}"}}')
+    count = re.search(rf"^hrms_http_request_serialization_seconds_count{labels} (\S+)$", text, re.M)
+    total = re.search(rf"^hrms_http_request_serialization_seconds_sum{labels} (\S+)$", text, re.M)
+    if count is None:
+        return 0, 0.0
+    return int(count.group(1)), float(total.group(1))
+
+
+def test_serialization_time_is_recorded_per_route(client):
+    before = serialization(client, "/api/employees")
+    for _ in range(3):
+        client.get("/api/employees", params={"limit": 200})
+    count, total = serialization(client, "/api/employees")
+    assert count == before[0] + 3
+    assert total > before[1]
+
+    # Routes that return plain values are encoded by FastAPI and timed too
+    client.get("/health")
+    count, total = serialization(client, "/health")
+    assert count >= 1 and total > 0
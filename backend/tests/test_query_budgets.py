@@ -0,0 +1,145 @@
+"""
+SQL query budgets per endpoint; see conftest.py for the harness.
+
+A budget is the number of statements the endpoint sends today. Lowering one
+after an optimization is welcome; raising one needs a reason in the commit.
+The live feed (GET /api/attendance/stream) runs no queries and is not listed.
+"""
+import itertools
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+import database
+import models
+
+DATE = "2025-12-31"
+PERIOD = {"start_date": "2025-12-01", "end_date": DATE}
+
+_numbers = itertools.count(1)
+
+
+def create_employee(client):
+    number = next(_numbers)
+    return client.post("/api/employees", json={
+        "employee_id": f"QB{number:06d}",
+        "full_name": f"Budget Test {number}",
+        "email": f"budget.test.{number}@example.com",
+        "department": "Quality",
+    })
+
+
+def new_employee(client) -> dict:
+    response = create_employee(client)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def seeded_ids(client) -> list[str]:
+    with database.SessionLocal() as db:
+        return list(db.scalars(
+            select(models.Employee.id).where(models.Employee.employee_id.like("EMP%")).order_by(models.Employee.employee_id)
+        ))
+
+
+def test_list_employees(measure):
+    measure(lambda client, _: client.get("/api/employees", params={"limit": 1000}), budget=2)
+
+
+def test_search_employees(measure):
+    # Up to one query per ranking tier until the limit is filled, then the final load (see search.py)
+    measure(lambda client, _: client.get("/api/employees/search", params={"q": "chen"}), budget=6)
+
+
+def test_get_employee(measure):
+    measure(lambda client, ids: client.get(f"/api/employees/{ids[0]}"), budget=1, setup=seeded_ids)
+
+
+def test_create_employee(measure):
+    # The uniqueness check (employee ID and email at once), then INSERT ... RETURNING
+    measure(lambda client, _: create_employee(client), budget=2)
+
+
+def test_import_employees(measure):
+    def call(client, _):
+        start = next(_numbers) * 100
+        body = "employee_id,full_name,email,department\n" + "".join(
+            f"QB{n:06d},Imported {n},imported.{n}@example.com,Quality\n" for n in range(start, start + 50)
+        )
+        return client.post("/api/employees/import", content=body, headers={"Content-Type": "text/csv"})
+    measure(call, budget=3)
+
+
+def test_delete_employee(measure):
+    measure(
+        lambda client, employee: client.delete(f"/api/employees/{employee['id']}"),
+        budget=2, setup=new_employee,
+    )
+
+
+def test_bulk_delete_employees(measure):
+    measure(
+        lambda client, employees: client.post("/api/employees/bulk-delete", json={"ids": [e["id"] for e in employees]}),
+        budget=2, setup=lambda client: [new_employee(client) for _ in range(5)],
+    )
+
+
+def test_list_attendance(measure):
+    measure(lambda client, _: client.get("/api/attendance", params={"attendance_date": DATE, "limit": 1000}), budget=1)
+
+
+def test_roster(measure):
+    # Validators for employees and the date's attendance, then both loads
+    measure(
+        lambda client, _: client.get("/api/attendance/employees-with-attendance", params={"attendance_date": DATE}),
+        budget=4,
+    )
+
+
+def test_summary(measure):
+    measure(lambda client, _: client.get("/api/attendance/summary", params=PERIOD), budget=1)
+
+
+def test_export(measure):
+    measure(lambda client, _: client.get("/api/attendance/export", params={**PERIOD, "format": "csv"}), budget=1)
+
+
+def fresh_day(client) -> tuple[list[str], str]:
+    """The seeded employees and a day outside their history, so every call writes new marks"""
+    return seeded_ids(client), (date(2026, 1, 1) + timedelta(days=next(_numbers))).isoformat()
+
+
+def test_mark_attendance(measure):
+    measure(
+        lambda client, day: client.post("/api/attendance", json={
+            "employee_id": day[0][0], "attendance_date": day[1], "status": "Present",
+        }),
+        # Employee, rollup lock, existing mark, upsert, rollups
+        budget=5, setup=fresh_day,
+    )
+
+
+def test_bulk_mark_whole_roster(measure):
+    # The payload grows with the data: every employee is marked
+    measure(
+        lambda client, day: client.post("/api/attendance/bulk", json={"records": [
+            {"employee_id": employee_id, "attendance_date": day[1], "status": "Present"} for employee_id in day[0]
+        ]}),
+        # Employees, rollup locks, existing marks, upsert, rollups
+        budget=5, setup=fresh_day,
+    )
+
+
+def test_sync(measure):
+    measure(lambda client, _: client.get("/api/sync", params={"limit": 10000}), budget=3)
+
+
+def test_mark_all(measure):
+    # The payload stays the same size: the server selects the employees
+    measure(
+        lambda client, day: client.post("/api/attendance/mark-all", json={
+            "attendance_date": day[1], "status": "Present", "except_ids": day[0][:1],
+        }),
+        # Rollup locks, rollup adjustment, then INSERT ... SELECT (PostgreSQL does the last two in one)
+        budget=3, setup=fresh_day,
+    )
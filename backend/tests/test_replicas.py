@@ -0,0 +1,45 @@
+"""Read-your-writes routing (see replicas.py)"""
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import replicas
+
+
+def recording_app():
+    app = FastAPI()
+
+    @app.post("/write")
+    def write():
+        return {}
+
+    @app.get("/read")
+    def read(request: Request):
+        return {"primary": replicas.wrote_recently(request)}
+
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+    return TestClient(app, base_url="https://api.example.com")
+
+
+def test_cross_site_write_sets_a_cookie_sent_on_cross_site_requests():
+    client = recording_app()
+    cookie = client.post("/write", headers={"Origin": "https://app.example.net"}).headers["set-cookie"]
+    assert "SameSite=None" in cookie and "Secure" in cookie
+
+
+def test_same_site_write_keeps_a_lax_cookie():
+    client = recording_app()
+    for headers in ({}, {"Origin": "https://api.example.com:8443"}):
+        assert "SameSite=Lax" in client.post("/write", headers=headers).headers["set-cookie"]
+
+
+def test_echoed_header_routes_reads_to_the_primary():
+    client = recording_app()
+    until = client.post("/write").headers[replicas.RECENT_WRITE_HEADER]
+    assert float(until) > time.time()
+    client.cookies.clear()
+    assert client.get("/read", headers={replicas.RECENT_WRITE_HEADER: until}).json() == {"primary": True}
+    assert client.get("/read", headers={replicas.RECENT_WRITE_HEADER: str(int(time.time()) - 1)}).json() == {"primary": False}
+    assert client.get("/read", headers={replicas.RECENT_WRITE_HEADER: "garbage"}).json() == {"primary": False}
+    assert client.get("/read").json() == {"primary": False}
@@ -0,0 +1,118 @@
+"""
+Monthly rollups stay equal to the attendance rows they count, after every
+kind of write and under concurrent writers (see rollups.py).
+"""
+import itertools
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+import database
+import models
+import rollups
+import schemas
+import upsert
+
+_days = itertools.count()
+
+
+def new_employees(client, count: int) -> list[str]:
+    ids = []
+    for _ in range(count):
+        number = next(_days)
+        response = client.post("/api/employees", json={
+            "employee_id": f"RU{number:06d}",
+            "full_name": f"Rollup Test {number}",
+            "email": f"rollup.test.{number}@example.com",
+            "department": "Rollups",
+        })
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def fresh_day(client) -> tuple[list[str], str]:
+    """New employees and a day no one has marks for"""
+    return new_employees(client, 8), (date(2026, 1, 1) + timedelta(days=next(_days))).isoformat()
+
+
+def assert_rollups_match():
+    with database.SessionLocal() as db:
+        attendance = models.Attendance
+        counted = Counter(
+            (employee_id, str(rollups.month_start(attendance_date)), status)
+            for employee_id, attendance_date, status in db.execute(
+                select(attendance.employee_id, attendance.attendance_date, attendance.status)
+            )
+        )
+        rolled = Counter()
+        for row in db.scalars(select(models.AttendanceMonthlyRollup)):
+            for status, column in rollups.STATUS_COLUMNS.items():
+                if getattr(row, column):
+                    rolled[(row.employee_id, str(row.month), status)] = getattr(row, column)
+    assert rolled == counted
+
+
+def mark(client, records):
+    response = client.post("/api/attendance/bulk", json={"records": [
+        {"employee_id": employee_id, "attendance_date": day, "status": status} for employee_id, day, status in records
+    ]})
+    assert response.status_code == 201, response.text
+
+
+def test_rollups_follow_inserts_and_overwrites(client):
+    ids, day = fresh_day(client)
+    mark(client, [(employee_id, day, "Present") for employee_id in ids[:5]])
+    assert_rollups_match()
+    mark(client, [(ids[0], day, "Absent"), (ids[1], day, "Present"), (ids[5], day, "Absent")])
+    assert_rollups_match()
+    # The later record for the same employee and date wins, and is counted once
+    mark(client, [(ids[2], day, "Absent"), (ids[2], day, "Present"), (ids[6], day, "Present"), (ids[6], day, "Absent")])
+    assert_rollups_match()
+
+
+def test_rollups_follow_mark_all(client):
+    ids, day = fresh_day(client)
+    mark(client, [(ids[0], day, "Absent"), (ids[1], day, "Present")])
+    for status, except_ids in (("Present", ids[:1]), ("Absent", []), ("Absent", []), ("Present", ids[2:4])):
+        response = client.post("/api/attendance/mark-all", json={
+            "attendance_date": day, "status": status, "except_ids": except_ids,
+        })
+        assert response.status_code == 200, response.text
+        assert_rollups_match()
+
+
+def test_rollups_under_concurrent_marks_of_a_new_day(client):
+    ids, _ = fresh_day(client)
+    writers = 8
+    for round_number in range(5):
+        day = date(2027, 1, 1) + timedelta(days=round_number)
+        barrier = threading.Barrier(writers)
+        errors = []
+
+        def write(status):
+            db = database.SessionLocal()
+            try:
+                barrier.wait()
+                upsert.upsert_attendance(db, [
+                    schemas.AttendanceCreate(employee_id=employee_id, attendance_date=day, status=status)
+                    for employee_id in ids[:3]
+                ])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                errors.append(e)
+            finally:
+                db.close()
+
+        threads = [
+            threading.Thread(target=write, args=("Present" if n % 2 else "Absent",)) for n in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors
+        assert_rollups_match()
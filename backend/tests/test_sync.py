@@ -0,0 +1,54 @@
+"""Delta sync across writes and deletions (see sync.py)"""
+import time
+
+import sync
+
+
+def sync_all(client, token=None) -> tuple[dict, str]:
+    """Every change after token, merged over pages, and the token to continue from"""
+    merged = {"employees": [], "attendance": [], "deleted": []}
+    while True:
+        page = client.get("/api/sync", params={"limit": 10000, **({"token": token} if token else {})}).json()
+        for name in merged:
+            merged[name] += page[name]
+        token = page["next_token"]
+        if not page["has_more"]:
+            return merged, token
+
+
+def settle():
+    # SQLite stamps whole seconds; with no settle window a sync returns the seconds already past
+    time.sleep(1.1)
+
+
+def test_sync_across_a_deletion(client, monkeypatch):
+    # conftest settles everything at once, which lets a token run into the current second
+    monkeypatch.setattr(sync, "SYNC_SETTLE_SECONDS", 0)
+    settle()
+    _, token = sync_all(client)
+    employee = client.post("/api/employees", json={
+        "employee_id": "SY000001", "full_name": "Synced Employee",
+        "email": "sy.1@example.com", "department": "Quality",
+    }).json()
+    for day in ("2025-11-03", "2025-11-04"):
+        client.post("/api/attendance", json={
+            "employee_id": employee["id"], "attendance_date": day, "status": "Present",
+        })
+
+    settle()
+    changes, token = sync_all(client, token)
+    assert [row["id"] for row in changes["employees"]] == [employee["id"]]
+    assert {row["employee_id"] for row in changes["attendance"]} == {employee["id"]}
+    assert len(changes["attendance"]) == 2
+    assert changes["deleted"] == []
+
+    assert client.delete(f"/api/employees/{employee['id']}").status_code == 204
+    settle()
+    changes, token = sync_all(client, token)
+    # One tombstone stands for the employee and all of their attendance
+    assert [(row["table"], row["id"]) for row in changes["deleted"]] == [("employees", employee["id"])]
+    assert changes["employees"] == [] and changes["attendance"] == []
+
+    # Nothing is repeated once applied
+    changes, _ = sync_all(client, token)
+    assert changes == {"employees": [], "attendance": [], "deleted": []}
@@ -0,0 +1,119 @@
+"""State shared by the worker processes of one host (see serve.py)"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+import feed
+from idempotency import SQLiteIdempotencyStore
+
+
+def two_workers_store(tmp_path):
+    # Two stores on one file stand for two workers
+    path = str(tmp_path / "idempotency.db")
+    return [SQLiteIdempotencyStore(path, ttl_seconds=60, max_keys=100, pending_seconds=60) for _ in range(2)]
+
+
+def test_idempotency_key_replays_across_workers(tmp_path):
+    first, second = two_workers_store(tmp_path)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return Response(b'{"ok": true}', status_code=201)
+
+    async def scenario():
+        await first.run("k1", "POST /x", b"body", handler)
+        replayed = await second.run("k1", "POST /x", b"body", handler)
+        assert replayed.status_code == 201 and replayed.body == b'{"ok": true}'
+        assert replayed.headers["Idempotent-Replayed"] == "true"
+        with pytest.raises(HTTPException) as mismatch:
+            await second.run("k1", "POST /x", b"other body", handler)
+        assert mismatch.value.status_code == 422
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_idempotency_key_in_flight_on_another_worker_conflicts(tmp_path):
+    first, second = two_workers_store(tmp_path)
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow():
+            started.set()
+            await release.wait()
+            return Response(b"{}", status_code=201)
+
+        running = asyncio.ensure_future(first.run("k2", "POST /x", b"body", slow))
+        await started.wait()
+        with pytest.raises(HTTPException) as conflict:
+            await second.run("k2", "POST /x", b"body", slow)
+        assert conflict.value.status_code == 409
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_idempotency_errors_replay_and_server_errors_release_the_key(tmp_path):
+    first, second = two_workers_store(tmp_path)
+
+    def failing(status_code):
+        async def handler():
+            raise HTTPException(status_code=status_code, detail={"reason": "nope"})
+        return handler
+
+    async def ok():
+        return Response(b"{}", status_code=201)
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await first.run("k3", "POST /x", b"body", failing(404))
+        with pytest.raises(HTTPException) as replayed:
+            await second.run("k3", "POST /x", b"body", ok)
+        assert (replayed.value.status_code, replayed.value.detail) == (404, {"reason": "nope"})
+
+        with pytest.raises(HTTPException):
+            await first.run("k4", "POST /x", b"body", failing(503))
+        assert (await second.run("k4", "POST /x", b"body", ok)).status_code == 201
+
+    asyncio.run(scenario())
+
+
+async def _next_event(stream) -> bytes:
+    while True:
+        chunk = await asyncio.wait_for(stream.__anext__(), 5)
+        if chunk != feed.KEEPALIVE:
+            return chunk
+
+
+def test_feed_relays_writes_made_by_another_worker(tmp_path, monkeypatch):
+    path = str(tmp_path / "feed.db")
+    subscriber_worker = feed.Broadcaster(feed.SQLiteRelay(path, poll_seconds=0.01))
+    writer_worker = feed.Broadcaster(feed.SQLiteRelay(path, poll_seconds=0.01))
+
+    async def scenario():
+        stream = subscriber_worker.stream("2024-01-01")
+        assert b"event: ready" in await _next_event(stream)
+        writer_worker.publish("2024-01-02", "attendance", {"records": ["other date"]})
+        writer_worker.publish("2024-01-01", "attendance", {"records": ["mark"]})
+        writer_worker.publish(None, "employee_deleted", {"id": "e1"})
+        events = b""
+        while b"employee_deleted" not in events:
+            events += await _next_event(stream)
+        assert b'"mark"' in events and b"other date" not in events
+
+        # A worker that falls behind the kept events resyncs its subscribers
+        monkeypatch.setattr(feed, "RELAY_KEEP_EVENTS", 2)
+        subscriber_worker.relay.poll_seconds = 0.5
+        await asyncio.sleep(0.1)
+        for n in range(5):
+            writer_worker.publish("2024-01-01", "attendance", {"records": [n]})
+        assert b"event: resync" in await _next_event(stream)
+        await stream.aclose()
+        await subscriber_worker.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,192 @@
+"""
+Set-based attendance upserts.
+
+Validates every employee ID with one query and writes all records with
+INSERT ... ON CONFLICT (employee_id, attendance_date) DO UPDATE ... RETURNING,
+so a payload of N records costs a handful of round-trips instead of ~3N.
+"""
+import uuid
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import Boolean, Date, String, func, literal, literal_column, select
+from sqlalchemy.orm import Session
+
+import bitmaps
+import models
+import rollups
+import schemas
+
+# Keep each statement well under SQLite's bound-parameter limit (4 per row)
+# and Postgres' 65535 parameter limit.
+CHUNK_SIZE = 500
+
+SKIP_EMPLOYEE_NOT_FOUND = "Employee not found"
+SKIP_DUPLICATE = "Superseded by a later record for the same employee and date"
+
+
+def _chunks(items: list, size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _dialect_insert(db: Session):
+    """Return the dialect-specific insert() that supports ON CONFLICT"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Attendance upsert is not supported on {dialect}")
+    return insert
+
+
+def existing_employee_ids(db: Session, employee_ids: Iterable[str]) -> set[str]:
+    """Return the subset of employee IDs that exist and are not deleted, using one query per chunk"""
+    found = set()
+    for chunk in _chunks(list(set(employee_ids))):
+        found.update(db.scalars(
+            select(models.Employee.id).where(models.Employee.id.in_(chunk), models.Employee.deleted_at.is_(None))
+        ))
+    return found
+
+
+def upsert_attendance(
+    db: Session, records: list[schemas.AttendanceCreate]
+) -> tuple[list, list[schemas.AttendanceBulkSkipped]]:
+    """
+    Insert or update attendance records without committing.
+
+    Monthly rollups are adjusted in the same transaction (with bitmap storage
+    the month's bitmap is written instead). Returns the written
+    rows (in payload order) and the records that were skipped, each with the
+    reason it was skipped.
+    """
+    skipped = []
+    valid_ids = existing_employee_ids(db, (r.employee_id for r in records))
+
+    # Postgres refuses to touch the same row twice in one statement, so the
+    # last record for an (employee, date) pair wins.
+    latest: dict[tuple[str, date], int] = {}
+    for index, record in enumerate(records):
+        if record.employee_id not in valid_ids:
+            skipped.append(schemas.AttendanceBulkSkipped(
+                index=index,
+                employee_id=record.employee_id,
+                attendance_date=record.attendance_date,
+                reason=SKIP_EMPLOYEE_NOT_FOUND,
+            ))
+            continue
+        key = (record.employee_id, record.attendance_date)
+        if key in latest:
+            previous = latest[key]
+            skipped.append(schemas.AttendanceBulkSkipped(
+                index=previous,
+                employee_id=records[previous].employee_id,
+                attendance_date=records[previous].attendance_date,
+                reason=SKIP_DUPLICATE,
+            ))
+        latest[key] = index
+
+    rows_by_key = {}
+    if latest and bitmaps.ENABLED:
+        for chunk in _chunks([records[index] for index in latest.values()]):
+            rows_by_key.update(bitmaps.write(db, chunk))
+    elif latest:
+        insert = _dialect_insert(db)
+        table = models.Attendance.__table__
+        values = [
+            {
+                "id": str(uuid.uuid4()),
+                "employee_id": records[index].employee_id,
+                "attendance_date": records[index].attendance_date,
+                "status": records[index].status,
+            }
+            # In key order, so concurrent writers take the rollup locks in the same order
+            for index in sorted(latest.values(), key=lambda index: (records[index].employee_id, records[index].attendance_date))
+        ]
+        for chunk in _chunks(values):
+            keys = [(value["employee_id"], value["attendance_date"]) for value in chunk]
+            rollups.lock(db, keys)
+            previous = rollups.previous_statuses(db, keys)
+            stmt = insert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.employee_id, table.c.attendance_date],
+                set_={"status": stmt.excluded.status, "updated_at": func.now()},
+            ).returning(*table.c)
+            for row in db.execute(stmt):
+                rows_by_key[(row.employee_id, row.attendance_date)] = row
+            rollups.apply_changes(db, [
+                (employee_id, attendance_date, previous.get((employee_id, attendance_date)), value["status"])
+                for (employee_id, attendance_date), value in zip(keys, chunk)
+            ])
+
+    skipped.sort(key=lambda s: s.index)
+    written = [rows_by_key[key] for key, _ in sorted(latest.items(), key=lambda kv: kv[1])]
+    return written, skipped
+
+
+def _random_uuid(db: Session):
+    """SQL expression generating a random UUID (as text) per row, for INSERT ... SELECT"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Assigned as is to a uuid column (Supabase) or as text to a varchar one
+        return func.gen_random_uuid()
+
+    def hex_digits(count: int):
+        return func.substr(func.lower(func.hex(func.randomblob(8))), 1, count, type_=String)
+
+    # Version 4 layout: xxxxxxxx-xxxx-4xxx-[89ab]xxx-xxxxxxxxxxxx
+    variant = func.substr("89ab", 1 + func.abs(func.random() % 4), 1, type_=String)
+    return (
+        hex_digits(8) + "-" + hex_digits(4) + "-4" + hex_digits(3) + "-"
+        + variant + hex_digits(3) + "-" + hex_digits(12)
+    )
+
+
+def mark_all(
+    db: Session,
+    attendance_date: date,
+    status: str,
+    department: Optional[str] = None,
+    except_ids: Iterable[str] = (),
+) -> int:
+    """
+    Mark every employee (optionally of one department, minus except_ids) with
+    status on attendance_date without committing, in one INSERT ... SELECT
+    FROM employees whatever their number. Marks that already have the status
+    are left untouched. Returns the number of marks written or changed.
+    """
+    employee = models.Employee
+    conditions = [employee.deleted_at.is_(None)]
+    if department is not None:
+        conditions.append(employee.department == department)
+    except_ids = list(set(except_ids))
+    if except_ids:
+        conditions.append(employee.id.not_in(except_ids))
+
+    if bitmaps.ENABLED:
+        return bitmaps.mark_all(db, conditions, attendance_date, status)
+
+    rollups.lock_mark_all(db, conditions, attendance_date)
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if not postgres:
+        # SQLite: the lock above holds the database's write lock, so the statuses read here stay current
+        rollups.apply_mark_all(db, conditions, attendance_date, status)
+    table = models.Attendance.__table__
+    stmt = _dialect_insert(db)(table).from_select(
+        ["id", "employee_id", "attendance_date", "status"],
+        select(_random_uuid(db), employee.id, literal(attendance_date, Date), literal(status)).where(*conditions),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.attendance_date],
+        set_={"status": stmt.excluded.status, "updated_at": func.now()},
+        where=table.c.status != stmt.excluded.status,
+    )
+    if not postgres:
+        return db.execute(stmt).rowcount
+    # The rollups are counted from what the upsert did, not from a read taken before it:
+    # employees created since the lock are covered too. xmax is 0 on freshly inserted rows.
+    written = stmt.returning(table.c.employee_id, literal_column("xmax = 0", Boolean).label("inserted")).cte("written")
+    # One rollup row per written mark: each employee has one mark on the date
+    return db.execute(rollups.add_written(db, written, attendance_date, status)).rowcount
@@ -0,0 +1,16 @@
+/*
+  # Composite index for date-range attendance queries
+
+  1. New Indexes
+    - `idx_attendance_date_employee` on `attendance (attendance_date, employee_id)`
+      INCLUDE (status), so date and date-range scans (optionally joined to
+      employees for a department filter) are served index-only
+
+  2. Removed Indexes
+    - `idx_attendance_date`, whose leading column is covered by the new index
+*/
+
+CREATE INDEX IF NOT EXISTS idx_attendance_date_employee
+  ON attendance (attendance_date, employee_id) INCLUDE (status);
+
+DROP INDEX IF EXISTS idx_attendance_date;
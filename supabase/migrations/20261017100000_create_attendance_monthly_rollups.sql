@@ -0,0 +1,42 @@
+/*
+  # Monthly attendance rollups
+
+  1. New Tables
+    - `attendance_monthly_rollups`
+      - `employee_id` (uuid, foreign key) - References employees table
+      - `month` (date) - First day of the month
+      - `present_count` (integer) - Present marks in the month
+      - `absent_count` (integer) - Absent marks in the month
+
+  2. Important Notes
+    - Maintained by the API in the same transaction as attendance writes
+    - Backfilled from existing attendance below; `backend/rebuild_rollups.py`
+      recomputes it at any time
+*/
+
+CREATE TABLE IF NOT EXISTS attendance_monthly_rollups (
+  employee_id uuid NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+  month date NOT NULL,
+  present_count integer NOT NULL DEFAULT 0,
+  absent_count integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (employee_id, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_month ON attendance_monthly_rollups(month);
+
+INSERT INTO attendance_monthly_rollups (employee_id, month, present_count, absent_count)
+SELECT
+  employee_id,
+  date_trunc('month', attendance_date)::date,
+  count(*) FILTER (WHERE status = 'Present'),
+  count(*) FILTER (WHERE status = 'Absent')
+FROM attendance
+GROUP BY employee_id, date_trunc('month', attendance_date)::date
+ON CONFLICT (employee_id, month) DO NOTHING;
+
+ALTER TABLE attendance_monthly_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow public read access to attendance_monthly_rollups"
+  ON attendance_monthly_rollups FOR SELECT
+  TO anon
+  USING (true);
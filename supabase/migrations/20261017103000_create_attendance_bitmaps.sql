@@ -0,0 +1,35 @@
+/*
+  # Bitmap attendance storage
+
+  1. New Tables
+    - `attendance_bitmaps`
+      - `employee_id` (uuid, foreign key) - References employees table
+      - `month` (date) - First day of the month
+      - `marked_mask` (integer) - Bit n set when day n + 1 of the month was marked
+      - `present_mask` (integer) - Bit n set when day n + 1 was marked Present
+      - `created_at`, `updated_at` (timestamptz)
+
+  2. Important Notes
+    - Only used when the API runs with ATTENDANCE_STORAGE=bitmap
+    - Left empty here; `backend/convert_attendance.py --to bitmap` fills it
+      from the attendance table (and `--to rows` converts back)
+*/
+
+CREATE TABLE IF NOT EXISTS attendance_bitmaps (
+  employee_id uuid NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+  month date NOT NULL,
+  marked_mask integer NOT NULL DEFAULT 0,
+  present_mask integer NOT NULL DEFAULT 0,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now(),
+  PRIMARY KEY (employee_id, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_attendance_bitmaps_month_employee ON attendance_bitmaps(month, employee_id);
+
+ALTER TABLE attendance_bitmaps ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow public read access to attendance_bitmaps"
+  ON attendance_bitmaps FOR SELECT
+  TO anon
+  USING (true);
@@ -0,0 +1,19 @@
+/*
+  # Employee search indexes
+
+  1. New Indexes
+    - Trigram GIN indexes on `employees.employee_id`, `full_name`, `email`
+      and `department`
+
+  2. Important Notes
+    - Serve `GET /api/employees/search`, whose prefix and substring matches
+      are ILIKE patterns; without these indexes every search scans employees
+    - Requires the `pg_trgm` extension, created here if missing
+*/
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_employees_employee_id_trgm ON employees USING gin (employee_id gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_employees_full_name_trgm ON employees USING gin (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_employees_email_trgm ON employees USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_employees_department_trgm ON employees USING gin (department gin_trgm_ops);
@@ -0,0 +1,40 @@
+/*
+  # Delta sync
+
+  1. New Tables
+    - `deleted_records`
+      - `id` (uuid, primary key)
+      - `table_name` (text) - Table the row was deleted from
+      - `record_id` (uuid) - Primary key of the deleted row
+      - `deleted_at` (timestamptz)
+
+  2. New Indexes
+    - `employees(updated_at, id)`, `attendance(updated_at, id)` and
+      `attendance_bitmaps(updated_at, employee_id, month)`
+    - `deleted_records(deleted_at, id)`
+
+  3. Important Notes
+    - Serve `GET /api/sync`, which reads the rows changed after a token in
+      (updated_at, key) order; without these indexes every sync scans both tables
+    - The API writes a tombstone when it deletes an employee; rows deleted
+      outside the API are not reported to sync clients
+*/
+
+CREATE TABLE IF NOT EXISTS deleted_records (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  table_name text NOT NULL,
+  record_id uuid NOT NULL,
+  deleted_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_employees_updated_at ON employees(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_attendance_updated_at ON attendance(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_attendance_bitmaps_updated_at ON attendance_bitmaps(updated_at, employee_id, month);
+CREATE INDEX IF NOT EXISTS idx_deleted_records_deleted_at ON deleted_records(deleted_at, id);
+
+ALTER TABLE deleted_records ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow public read access to deleted_records"
+  ON deleted_records FOR SELECT
+  TO anon
+  USING (true);
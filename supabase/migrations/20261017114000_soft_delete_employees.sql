@@ -0,0 +1,21 @@
+/*
+  # Soft deletion of employees
+
+  1. Modified Tables
+    - `employees`
+      - `deleted_at` (timestamptz, nullable) - Set when the employee is deleted
+
+  2. New Indexes
+    - Partial index on `employees(deleted_at)` covering only deleted employees
+
+  3. Important Notes
+    - Deleting an employee through the API only sets `deleted_at`; every
+      endpoint hides the employee and their attendance from then on
+    - The attendance, rollups and bitmaps are then deleted in small batches
+      (in the API process, or `backend/purge_deleted.py`), and the employee
+      row last
+*/
+
+ALTER TABLE employees ADD COLUMN IF NOT EXISTS deleted_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS idx_employees_deleted_at ON employees(deleted_at) WHERE deleted_at IS NOT NULL;
@@ -0,0 +1,25 @@
+/*
+  # Unique Employee IDs and emails among live employees only
+
+  1. Modified Tables
+    - `employees`
+      - The UNIQUE constraints on `employee_id` and `email` are dropped
+
+  2. New Indexes
+    - Partial unique index on `employees(employee_id)` covering employees not deleted
+    - Partial unique index on `employees(email)` covering employees not deleted
+
+  3. Important Notes
+    - A deleted employee keeps their row until the purge removes it; with these
+      indexes their Employee ID and email can be given to a new employee at once
+    - The indexes are created before the constraints are dropped, so uniqueness
+      among live employees holds throughout
+*/
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_employees_employee_id_live ON employees(employee_id) WHERE deleted_at IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_employees_email_live ON employees(email) WHERE deleted_at IS NULL;
+
+ALTER TABLE employees DROP CONSTRAINT IF EXISTS employees_employee_id_key;
+
+ALTER TABLE employees DROP CONSTRAINT IF EXISTS employees_email_key;